@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from recarga import fusionar_filas
+
+# ==========================================
+# ALMACÉN COLUMNAR DE JUGADORES
+# ==========================================
+
+class AlmacenJugadores:
+    """
+    Copia compacta de la tabla de jugadores para el camino caliente.
+
+    - `X`: matriz float32 contigua (n_jugadores x n_features) en el orden de
+      model_features.json, lista para el booster.
+    - Arrays laterales por fila: player, club, born, pos y los inputs del
+      contexto salarial (masa, tax_rate, cov_factor) en float64.
+
+    Las filas se direccionan por id entero (posición en el CSV), el mismo
+    id que devuelve IndiceJugadores.
+    """
+
+    def __init__(self, X, feature_columns, player, club, born, pos, masa, tax_rate, cov_factor):
+        self.X = X
+        self.feature_columns = list(feature_columns)
+        self.col = {c: j for j, c in enumerate(self.feature_columns)}
+        self.player = player
+        self.club = club
+        self.born = born
+        self.pos = pos
+        self.masa = masa
+        self.tax_rate = tax_rate
+        self.cov_factor = cov_factor
+
+    @classmethod
+    def desde_dataframe(cls, df, feature_columns):
+        n = len(df)
+        X = np.ascontiguousarray(
+            df[feature_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+        )
+        columna = lambda nombre, defecto: (
+            pd.to_numeric(df[nombre], errors='coerce').fillna(defecto).to_numpy(dtype=np.float64)
+            if nombre in df.columns else np.full(n, defecto, dtype=np.float64)
+        )
+        club_col = 'Club' if 'Club' in df.columns else 'Squad'
+        return cls(
+            X=X,
+            feature_columns=feature_columns,
+            player=df['Player'].astype(str).to_numpy(dtype=object),
+            club=(df[club_col].astype(str).to_numpy(dtype=object) if club_col in df.columns
+                  else np.full(n, 'Desconocido', dtype=object)),
+            born=pd.to_numeric(df['Born'], errors='coerce').fillna(0).to_numpy(dtype=np.int32),
+            pos=cls._posiciones(df, n),
+            masa=columna('Masa_Salarial_X', 0.0),
+            tax_rate=columna('Tax_Rate', 0.45),
+            cov_factor=columna('COV_Factor', 1.0),
+        )
+
+    @classmethod
+    def fusionar(cls, anterior, origen, nuevas):
+        """Almacén con las filas de `anterior` según `origen` (ver diferencia_csv) y `nuevas` en los -1."""
+        campos = ("X", "player", "club", "born", "pos", "masa", "tax_rate", "cov_factor")
+        return cls(feature_columns=anterior.feature_columns, **{
+            c: fusionar_filas(getattr(anterior, c), origen, getattr(nuevas, c)) for c in campos
+        })
+
+    @staticmethod
+    def _posiciones(df, n):
+        """Posición a partir de la columna Pos o de los one-hot Pos_* (DF = referencia)."""
+        if 'Pos' in df.columns:
+            return df['Pos'].fillna('N/A').astype(str).to_numpy(dtype=object)
+        pos = np.full(n, 'DF', dtype=object)
+        for etiqueta in ('MF', 'FW', 'GK'):
+            col = f"Pos_{etiqueta}"
+            if col in df.columns:
+                pos[df[col].to_numpy() == 1] = etiqueta
+        return pos
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    def valor(self, fila, columna, defecto=0.0):
+        """Valor escalar (float) de una feature para un id de fila."""
+        j = self.col.get(columna)
+        return defecto if j is None else float(self.X[fila, j])
@@ -0,0 +1,255 @@
+"""
+Paquete binario de artefactos para arranques en frío rápidos.
+
+Un único fichero versionado con el modelo (UBJSON), la matriz float32 de
+features, los arrays por jugador, los nombres normalizados, las tablas
+de referencias y las tablas derivadas de la carga (índice de nombres,
+percentiles, matriz de comparables). Se abre con mmap: los arrays
+numéricos son vistas de sólo lectura sobre el fichero, así que varios
+procesos trabajadores comparten las mismas páginas y no se reconstruye
+nada al arrancar. Si las fuentes (modelo, features, refs, CSV) cambian,
+la cabecera no cuadra con su checksum o el fichero está truncado, se
+reconstruye desde ellas.
+
+    python artefactos.py      # construye el paquete y las contribuciones (p.ej. al crear la imagen)
+"""
+import os
+import io
+import mmap
+import json
+import struct
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from almacen import AlmacenJugadores
+from cache import huella_archivos
+
+MAGIA = b"BRNPAQ"
+VERSION_FORMATO = 3
+ALINEACION = 64
+
+# Arrays del almacén que van en binario: nombre -> dtype en disco
+_ARRAYS = {"X": "<f4", "born": "<i4", "masa": "<f8", "tax_rate": "<f8", "cov_factor": "<f8"}
+_TEXTOS = ("player", "club", "pos", "nombres_busqueda")
+
+
+class Paquete:
+    """Artefactos cargados, vengan del paquete binario o de las fuentes."""
+
+    def __init__(self, model, feature_columns, refs, almacen, nombres_busqueda, origen, df=None, tablas=None):
+        self.model = model
+        self.feature_columns = feature_columns
+        self.refs = refs
+        self.almacen = almacen
+        self.nombres_busqueda = nombres_busqueda
+        self.origen = origen
+        self.df = df
+        # {grupo: (arrays, textos)} de los índices construidos sobre estos datos, o None
+        self.tablas = tablas
+
+
+def leer_jugadores_csv(ruta, normalizador):
+    """Lectura original del CSV con pandas (columna Club y nombres de búsqueda)."""
+    df = pd.read_csv(ruta)
+    if 'Squad' in df.columns and 'Club' not in df.columns:
+        df['Club'] = df['Squad']
+    df['Player_Search'] = df['Player'].apply(normalizador)
+    return df
+
+
+def leer_fuentes(model_file, features_file, refs_file, players_file, normalizador):
+    model = xgb.Booster()
+    model.load_model(model_file)
+    with open(features_file, "r") as f:
+        feature_columns = json.load(f)
+    with open(refs_file, "r") as f:
+        refs = json.load(f)
+    df = leer_jugadores_csv(players_file, normalizador)
+    almacen = AlmacenJugadores.desde_dataframe(df, feature_columns)
+    return Paquete(model, feature_columns, refs, almacen, df['Player_Search'].tolist(), "fuentes", df)
+
+# ==========================================
+# ESCRITURA
+# ==========================================
+
+def escribir_paquete(ruta, paquete, huella_fuentes):
+    """
+    Serializa `paquete` en `ruta` (reemplazo atómico).
+
+    Formato: MAGIA | u16 versión | u64 longitud cabecera | sha256 cabecera |
+    cabecera JSON | secciones alineadas a 64 bytes. La cabecera guarda
+    offsets, dtypes, shapes, la huella de las fuentes y el tamaño total de
+    las secciones (la escritura es atómica: basta con detectar truncados).
+    """
+    almacen = paquete.almacen
+    secciones = []  # (nombre, bytes, dtype, shape)
+    for nombre, dtype in _ARRAYS.items():
+        arr = np.ascontiguousarray(getattr(almacen, nombre), dtype=dtype)
+        secciones.append((nombre, arr.tobytes(), dtype, list(arr.shape)))
+    grupos = {}
+    for grupo, (arrays, _) in (paquete.tablas or {}).items():
+        grupos[grupo] = list(arrays)
+        for nombre, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            dtype = arr.dtype.newbyteorder("<").str
+            secciones.append((f"{grupo}.{nombre}", arr.astype(dtype, copy=False).tobytes(), dtype, list(arr.shape)))
+    textos = {"player": list(almacen.player), "club": list(almacen.club), "pos": list(almacen.pos),
+              "nombres_busqueda": list(paquete.nombres_busqueda),
+              "tablas": {grupo: meta for grupo, (_, meta) in (paquete.tablas or {}).items()}}
+    secciones.append(("textos", json.dumps(textos, ensure_ascii=False).encode("utf-8"), None, None))
+    secciones.append(("modelo", bytes(paquete.model.save_raw(raw_format="ubj")), None, None))
+
+    indice, offset, cuerpo = {}, 0, io.BytesIO()
+    for nombre, datos, dtype, shape in secciones:
+        relleno = (-offset) % ALINEACION
+        cuerpo.write(b"\0" * relleno)
+        offset += relleno
+        indice[nombre] = {"offset": offset, "nbytes": len(datos), "dtype": dtype, "shape": shape}
+        cuerpo.write(datos)
+        offset += len(datos)
+
+    cabecera = json.dumps({
+        "version": VERSION_FORMATO,
+        "fuentes": huella_fuentes,
+        "nbytes_secciones": offset,
+        "feature_columns": paquete.feature_columns,
+        "refs": paquete.refs,
+        "tablas": grupos,
+        "secciones": indice,
+    }, ensure_ascii=False).encode("utf-8")
+    prefijo = MAGIA + struct.pack("<HQ", VERSION_FORMATO, len(cabecera)) + hashlib.sha256(cabecera).digest() + cabecera
+    prefijo += b"\0" * ((-len(prefijo)) % ALINEACION)
+
+    # Temporal único en el mismo directorio: hilos y procesos no se pisan y os.replace es atómico
+    directorio = os.path.dirname(ruta) or "."
+    os.makedirs(directorio, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directorio, prefix=os.path.basename(ruta) + ".", suffix=".tmp", delete=False) as f:
+        temporal = f.name
+        try:
+            f.write(prefijo)
+            f.write(cuerpo.getbuffer())
+        except BaseException:
+            f.close()
+            os.unlink(temporal)
+            raise
+    os.replace(temporal, ruta)
+
+# ==========================================
+# LECTURA (MMAP)
+# ==========================================
+
+def abrir_paquete(ruta, huella_fuentes):
+    """Paquete mapeado en memoria, o None si falta, es de otras fuentes o está corrupto."""
+    try:
+        with open(ruta, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    paquete = None
+    try:
+        paquete = _leer_paquete(mm, huella_fuentes)
+    finally:
+        # Si no se usa, el mapeo se libera ya (las vistas de _leer_paquete no sobreviven a su marco)
+        if paquete is None:
+            try:
+                mm.close()
+            except BufferError:
+                pass
+    return paquete
+
+
+def _leer_paquete(mm, huella_fuentes):
+    try:
+        n_magia = len(MAGIA)
+        if mm[:n_magia] != MAGIA:
+            return None
+        version, largo = struct.unpack_from("<HQ", mm, n_magia)
+        if version != VERSION_FORMATO:
+            return None
+        inicio_sha = n_magia + struct.calcsize("<HQ")
+        inicio_cab = inicio_sha + hashlib.sha256().digest_size
+        bytes_cabecera = bytes(mm[inicio_cab:inicio_cab + largo])
+        if hashlib.sha256(bytes_cabecera).digest() != mm[inicio_sha:inicio_cab]:
+            return None
+        cabecera = json.loads(bytes_cabecera)
+        if cabecera["fuentes"] != huella_fuentes:
+            return None
+        base = inicio_cab + largo
+        base += (-base) % ALINEACION
+        if len(mm) != base + cabecera["nbytes_secciones"]:
+            return None
+
+        secciones = cabecera["secciones"]
+        def seccion(nombre):
+            s = secciones[nombre]
+            return base + s["offset"], s["nbytes"]
+        def vista(nombre):
+            # Vista de sólo lectura sobre el mmap (sin copia)
+            offset, nbytes = seccion(nombre)
+            dtype, shape = secciones[nombre]["dtype"], secciones[nombre]["shape"]
+            return np.frombuffer(mm, dtype=dtype, count=nbytes // np.dtype(dtype).itemsize, offset=offset).reshape(shape)
+        arrays = {nombre: vista(nombre) for nombre in _ARRAYS}
+        offset, nbytes = seccion("textos")
+        textos = json.loads(bytes(mm[offset:offset + nbytes]))
+        tablas = {grupo: ({nombre: vista(f"{grupo}.{nombre}") for nombre in nombres}, textos["tablas"][grupo])
+                  for grupo, nombres in cabecera["tablas"].items()}
+        offset, nbytes = seccion("modelo")
+        model = xgb.Booster()
+        model.load_model(bytearray(mm[offset:offset + nbytes]))
+
+        feature_columns = cabecera["feature_columns"]
+        almacen = AlmacenJugadores(
+            X=arrays["X"], feature_columns=feature_columns,
+            player=np.array(textos["player"], dtype=object), club=np.array(textos["club"], dtype=object),
+            born=arrays["born"], pos=np.array(textos["pos"], dtype=object),
+            masa=arrays["masa"], tax_rate=arrays["tax_rate"], cov_factor=arrays["cov_factor"],
+        )
+    except (KeyError, ValueError, struct.error, xgb.core.XGBoostError):
+        return None
+    return Paquete(model, feature_columns, cabecera["refs"], almacen, textos["nombres_busqueda"], "paquete",
+                   tablas=tablas or None)
+
+
+def cargar_artefactos(ruta, model_file, features_file, refs_file, players_file, normalizador, escribir=True):
+    """
+    Abre el paquete si está al día; si no, lee las fuentes y lo regenera.
+
+    Si el paquete no se puede escribir (disco de sólo lectura) se sigue
+    con lo leído de las fuentes. Con escribir=False no se regenera: quien
+    llama lo escribe después de añadirle las tablas derivadas.
+    """
+    huella = huella_archivos([model_file, features_file, refs_file, players_file])
+    paquete = abrir_paquete(ruta, huella)
+    if paquete is not None:
+        return paquete
+    paquete = leer_fuentes(model_file, features_file, refs_file, players_file, normalizador)
+    if not escribir:
+        return paquete
+    try:
+        escribir_paquete(ruta, paquete, huella)
+    except OSError:
+        pass
+    return paquete
+
+
+if __name__ == "__main__":
+    import time
+    import tools
+    inicio = time.perf_counter()
+    fuentes = (tools.MODEL_FILE, tools.FEATURES_FILE, tools.REFS_FILE, tools.PLAYERS_FILE)
+    paquete = leer_fuentes(*fuentes, tools.normalizar_texto)
+    r = tools.Recursos(paquete, None, {})
+    paquete.tablas = r.tablas()
+    escribir_paquete(tools.PAQUETE_FILE, paquete, huella_archivos(list(fuentes)))
+    print(f"📦 {tools.PAQUETE_FILE}: {os.path.getsize(tools.PAQUETE_FILE) / 1e6:.1f} MB "
+          f"en {time.perf_counter() - inicio:.2f}s")
+    if tools.PRECALCULAR_EXPLICACIONES:
+        # Contribuciones de la situación actual: el servicio sólo las lee al arrancar
+        inicio = time.perf_counter()
+        tools.precalcular_contribuciones(r)
+        print(f"🧮 {tools.CONTRIBUCIONES_FILE}: {len(r.contribuciones)} jugadores "
+              f"en {time.perf_counter() - inicio:.2f}s")
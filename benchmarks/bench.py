@@ -0,0 +1,339 @@
+"""
+Benchmarks offline de Braniac (sin red ni API real).
+
+Uso, desde la raíz del repo:
+    python -m benchmarks.bench                      # todos los casos, compara con la baseline
+    python -m benchmarks.bench --casos lote,busqueda_difusa
+    python -m benchmarks.bench --guardar-baseline   # reescribe benchmarks/baselines/local.json
+    python -m benchmarks.bench --latencia-llm 0.3   # turnos con latencias de API simuladas
+
+La baseline es de cada máquina (no se versiona): si no existe, la primera
+ejecución la guarda. Sale con código 1 si algún caso empeora más de
+--tolerancia respecto a ella.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.openai_falso import ClienteOpenAIFalso, LatenciasFalsas
+
+import tools
+from cache import CacheReportes
+from orquestador import ejecutar_tool_calls, PrimeraRespuesta, TTSPipeline, _texto_de
+
+RUTA_BASELINES = os.path.join(os.path.dirname(__file__), "baselines")
+SEMILLA = 1234
+
+# ==========================================
+# MEDICIÓN
+# ==========================================
+
+def medir(funcion, entradas, items_por_llamada=1, calentamiento=3):
+    """Ejecuta `funcion(entrada)` para cada entrada; devuelve percentiles y throughput."""
+    for entrada in entradas[:calentamiento]:
+        funcion(entrada)
+    tiempos = []
+    inicio = time.perf_counter()
+    for entrada in entradas:
+        t0 = time.perf_counter()
+        funcion(entrada)
+        tiempos.append(time.perf_counter() - t0)
+    total = time.perf_counter() - inicio
+    ms = np.array(tiempos) * 1000
+    return {
+        "n": len(tiempos),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "items_s": round(len(tiempos) * items_por_llamada / total, 1),
+    }
+
+
+def _con_errata(nombre, rng):
+    """Cambia una letra del nombre (simula errores de dictado/tecleo)."""
+    posiciones = [i for i, c in enumerate(nombre) if c.isalpha()]
+    if len(posiciones) < 4:
+        return nombre
+    i = rng.choice(posiciones)
+    return nombre[:i] + rng.choice("aeiourstln") + nombre[i + 1:]
+
+
+def _solicitudes(rng, n):
+    clubes = tools.LISTA_CLUBES or [None]
+    ligas = list(tools.NOMBRES_LIGA.values()) or [None]
+    return [(rng.randrange(len(tools.ALMACEN)), rng.choice(clubes), rng.choice(ligas)) for _ in range(n)]
+
+
+# ==========================================
+# CASOS
+# ==========================================
+
+def caso_prediccion_unitaria(rng, escala):
+    solicitudes = _solicitudes(rng, 200 * escala)
+    r = tools._recursos()
+    return medir(lambda s: tools.predecir_salario(r.df_players.iloc[s[0]], s[1], s[2], r=r), solicitudes)
+
+
+def caso_prediccion_id(rng, escala):
+    solicitudes = _solicitudes(rng, 500 * escala)
+    r = tools._recursos()
+    resultados = {}
+    def fria(s):
+        tools.CACHE_PREDICCIONES.limpiar()
+        tools.predecir_salario_id(r, *s)
+    resultados["prediccion_id_fria"] = medir(fria, solicitudes)
+    # Calentamiento completo: todas las claves quedan en caché antes de medir
+    resultados["prediccion_id_cacheada"] = medir(lambda s: tools.predecir_salario_id(r, *s), solicitudes,
+                                                 calentamiento=len(solicitudes))
+    return resultados
+
+
+def caso_lote(rng, escala):
+    resultados = {}
+    r = tools._recursos()
+    for tam in (1, 16, 128, 1024):
+        lotes = [_solicitudes(rng, tam) for _ in range(max(5, 200 // tam) * escala)]
+        resultados[f"lote_{tam}"] = medir(lambda lote: tools.predecir_salarios_lote(r, lote), lotes, items_por_llamada=tam)
+    return resultados
+
+
+def caso_concurrencia(rng, escala):
+    """predecir_salario_id desde muchos hilos a la vez (pasa por el coalescedor)."""
+    resultados = {}
+    r = tools._recursos()
+    for hilos in (1, 16, 64):
+        solicitudes = _solicitudes(rng, 1000 * escala)
+        def rafaga(_):
+            tools.CACHE_PREDICCIONES.limpiar()
+            with ThreadPoolExecutor(hilos) as ex:
+                list(ex.map(lambda s: tools.predecir_salario_id(r, *s), solicitudes))
+        resultados[f"concurrencia_{hilos}_hilos"] = medir(rafaga, [None] * 3, items_por_llamada=len(solicitudes),
+                                                          calentamiento=1)
+    return resultados
+
+
+def caso_escenarios(rng, escala):
+    r = tools._recursos()
+    filas = [rng.randrange(len(r.almacen)) for _ in range(30 * escala)]
+    return medir(lambda fila: tools.simular_escenarios(r, fila), filas, items_por_llamada=len(r.lista_clubes) * len(r.nombres_liga))
+
+
+def caso_busqueda_difusa(rng, escala):
+    nombres = tools.df_players["Player"].astype(str).tolist()
+    consultas = [_con_errata(rng.choice(nombres), rng) for _ in range(500 * escala)]
+    r = tools._recursos()
+    return medir(lambda consulta: tools._buscar_jugador(r, consulta), consultas)
+
+
+def caso_lookup(rng, escala):
+    nombres = tools.df_players["Player"].astype(str).tolist()
+    consultas = []
+    for _ in range(300 * escala):
+        categoria = rng.choice(("club", "country", "rendimiento"))
+        if categoria == "club":
+            nombre = _con_errata(rng.choice(tools.LISTA_CLUBES), rng)
+        elif categoria == "country":
+            nombre = rng.choice(list(tools.MAPA_PAISES) + list(tools.NOMBRES_LIGA.values()))
+        else:
+            nombre = _con_errata(rng.choice(nombres), rng)
+        consultas.append((categoria, nombre))
+    def fria(c):
+        tools.CACHE_LOOKUP.limpiar()
+        tools.lookup_database_tool(*c)
+    return medir(fria, consultas)
+
+
+def caso_analisis(rng, escala, latencias):
+    nombres = tools.df_players["Player"].astype(str).tolist()
+    client = ClienteOpenAIFalso(latencias)
+    peticiones = [(rng.choice(nombres), rng.choice(tools.LISTA_CLUBES)) for _ in range(40 * escala)]
+    # Caché de reportes aislada en un directorio temporal: la 1ª pasada es fría, la 2ª acierta
+    original = tools.CACHE_REPORTES
+    with tempfile.TemporaryDirectory() as tmp:
+        tools.CACHE_REPORTES = CacheReportes(os.path.join(tmp, "reportes.sqlite"))
+        try:
+            tools.CACHE_PREDICCIONES.limpiar()
+            analizar = lambda p: tools.analyze_player_tool(p[0], client_openai=client, target_club=p[1])
+            return {
+                "analisis_frio": medir(analizar, peticiones, calentamiento=0),
+                "analisis_cacheado": medir(analizar, peticiones, calentamiento=0),
+            }
+        finally:
+            tools.CACHE_REPORTES = original
+
+
+# ==========================================
+# TURNO COMPLETO (FLUJO DE main6.py SIN STREAMLIT)
+# ==========================================
+
+def turno_sin_interfaz(client, prompt, tts=True, model_chat="gpt-5-mini"):
+    """
+    Reproduce un turno de main6.py: primera llamada en streaming, tools en
+    paralelo, segunda llamada y TTS por frases. Devuelve tiempos en segundos.
+    """
+    inicio = time.perf_counter()
+    marcas = {}
+    pipeline = TTSPipeline(client, "tts-1", "fable") if tts else None
+    def escribir(fragmentos):
+        texto = ""
+        for fragmento in (pipeline.envolver(fragmentos) if pipeline else fragmentos):
+            fragmento = _texto_de(fragmento)
+            if fragmento and "primer_texto" not in marcas:
+                marcas["primer_texto"] = time.perf_counter() - inicio
+            texto += fragmento
+        return texto
+
+    conversation = [{"role": "system", "content": "Eres Braniac."}, {"role": "user", "content": prompt}]
+    primera = PrimeraRespuesta(client.chat.completions.create(
+        model=model_chat, messages=conversation, tools=tools.tools_definition, tool_choice="auto", stream=True
+    ))
+    if primera.iniciar() == "texto":
+        escribir(primera.textos())
+    tool_calls = primera.tool_calls
+    if tool_calls:
+        conversation.append(primera.mensaje_asistente())
+        conversation.extend(ejecutar_tool_calls(tool_calls, client))
+        marcas["herramientas"] = time.perf_counter() - inicio
+        escribir(client.chat.completions.create(model=model_chat, messages=conversation, stream=True))
+    if pipeline:
+        futuros = list(pipeline._futuros)
+        if futuros:
+            futuros[0].result()
+            marcas["primer_audio"] = time.perf_counter() - inicio
+        pipeline.audio_completo()
+    marcas["total"] = time.perf_counter() - inicio
+    return marcas
+
+
+def caso_turno(rng, escala, latencias):
+    nombres = tools.df_players["Player"].astype(str).tolist()
+    def herramientas(mensajes):
+        jugador = rng.choice(nombres)
+        return [
+            ("analyze_player_tool", {"player_name": jugador, "target_club": rng.choice(tools.LISTA_CLUBES)}),
+            ("lookup_database_tool", {"category": "rendimiento", "name": jugador}),
+        ]
+    client = ClienteOpenAIFalso(latencias, herramientas=herramientas)
+    resultados = {}
+    marcas = []
+    def turno(prompt):
+        marcas.append(turno_sin_interfaz(client, prompt))
+    resultados["turno_herramientas"] = medir(turno, ["Analiza a este jugador"] * (10 * escala), calentamiento=1)
+    for etapa in ("primer_texto", "primer_audio"):
+        valores = [m[etapa] * 1000 for m in marcas if etapa in m]
+        if valores:
+            resultados["turno_herramientas"][f"{etapa}_p50_ms"] = round(float(np.percentile(valores, 50)), 2)
+    client_charla = ClienteOpenAIFalso(latencias)
+    resultados["turno_charla"] = medir(lambda p: turno_sin_interfaz(client_charla, p), ["Hola"] * (10 * escala), calentamiento=1)
+    return resultados
+
+
+CASOS = {
+    "prediccion_unitaria": caso_prediccion_unitaria,
+    "prediccion_id": caso_prediccion_id,
+    "lote": caso_lote,
+    "concurrencia": caso_concurrencia,
+    "escenarios": caso_escenarios,
+    "busqueda_difusa": caso_busqueda_difusa,
+    "lookup": caso_lookup,
+    "analisis": caso_analisis,
+    "turno": caso_turno,
+}
+CASOS_CON_LLM = {"analisis", "turno"}
+
+# ==========================================
+# BASELINES
+# ==========================================
+
+def comparar(resultados, baseline, tolerancia):
+    """Lista de (caso, métrica, actual, baseline) que empeoran más de `tolerancia`."""
+    regresiones = []
+    for caso, actual in resultados.items():
+        previo = baseline.get("casos", {}).get(caso)
+        if not previo:
+            continue
+        if actual["p50_ms"] > previo["p50_ms"] * (1 + tolerancia):
+            regresiones.append((caso, "p50_ms", actual["p50_ms"], previo["p50_ms"]))
+        if actual["items_s"] < previo["items_s"] / (1 + tolerancia):
+            regresiones.append((caso, "items_s", actual["items_s"], previo["items_s"]))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks offline de Braniac")
+    parser.add_argument("--casos", default=",".join(CASOS), help="lista separada por comas")
+    parser.add_argument("--escala", type=int, default=1, help="multiplica el nº de iteraciones")
+    parser.add_argument("--latencia-llm", type=float, default=0.0,
+                        help="segundos hasta el primer token / parse / TTS en el cliente falso")
+    parser.add_argument("--baseline", default=os.path.join(RUTA_BASELINES, "local.json"))
+    parser.add_argument("--guardar-baseline", action="store_true")
+    parser.add_argument("--tolerancia", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    if tools.ALMACEN is None:
+        print("❌ No se pudieron cargar los artefactos del modelo.")
+        return 2
+
+    latencias = LatenciasFalsas(
+        primer_token=args.latencia_llm, por_chunk=args.latencia_llm / 50, parse=args.latencia_llm * 4,
+        transcripcion=args.latencia_llm, tts_base=args.latencia_llm, tts_por_caracter=args.latencia_llm / 200,
+    )
+    resultados = {}
+    for nombre in args.casos.split(","):
+        nombre = nombre.strip()
+        if nombre not in CASOS:
+            print(f"⚠️ Caso desconocido: {nombre}")
+            continue
+        rng = random.Random(SEMILLA)
+        caso = CASOS[nombre]
+        salida = caso(rng, args.escala, latencias) if nombre in CASOS_CON_LLM else caso(rng, args.escala)
+        resultados.update(salida if "n" not in salida else {nombre: salida})
+
+    print(f"{'caso':<26}{'n':>6}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'items/s':>12}")
+    for caso, r in resultados.items():
+        print(f"{caso:<26}{r['n']:>6}{r['p50_ms']:>11.3f}{r['p95_ms']:>11.3f}{r['p99_ms']:>11.3f}{r['items_s']:>12.1f}")
+        extras = {k: v for k, v in r.items() if k.endswith("_p50_ms")}
+        if extras:
+            print(" " * 26 + "  ".join(f"{k}={v}" for k, v in extras.items()))
+
+    # Las baselines sólo son comparables con la misma latencia simulada
+    entorno = {"python": platform.python_version(), "maquina": platform.machine(),
+               "latencia_llm": args.latencia_llm, "escala": args.escala}
+    # Sin baseline en esta máquina, la primera ejecución pasa a ser la referencia
+    if args.guardar_baseline or not os.path.exists(args.baseline):
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"entorno": entorno, "casos": resultados}, f, indent=2, ensure_ascii=False)
+        print(f"💾 Baseline guardada en {args.baseline}")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("entorno", {}).get("latencia_llm") != args.latencia_llm:
+        print("ℹ️ La baseline se tomó con otra --latencia-llm; no se compara.")
+        return 0
+    regresiones = comparar(resultados, baseline, args.tolerancia)
+    # Casos que aún no tenían referencia (p.ej. la primera vez se corrió con --casos)
+    nuevos = {c: v for c, v in resultados.items() if c not in baseline.get("casos", {})}
+    if nuevos:
+        baseline.setdefault("casos", {}).update(nuevos)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+        print(f"💾 Añadidos a la baseline: {', '.join(nuevos)}")
+    for caso, metrica, actual, previo in regresiones:
+        print(f"❌ Regresión en {caso}: {metrica} {actual} (baseline {previo})")
+    if not regresiones:
+        print(f"✅ Sin regresiones (tolerancia {args.tolerancia:.0%})")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
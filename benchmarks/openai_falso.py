@@ -0,0 +1,145 @@
+import json
+import time
+import itertools
+from types import SimpleNamespace
+
+# ==========================================
+# CLIENTE OPENAI FALSO (SIN RED)
+# ==========================================
+
+TEXTO_RESPUESTA = (
+    "Según el modelo, el salario neto estimado se sitúa en la banda indicada. "
+    "El club destino tiene capacidad financiera suficiente para asumirlo. "
+    "La fiscalidad de la liga reduce el neto frente al bruto, pero el coste de vida lo compensa en parte. "
+    "Recomendación: negociar en la parte alta de la banda con variables por rendimiento."
+)
+
+
+class LatenciasFalsas:
+    """
+    Latencias inyectadas (segundos) para simular la API real.
+
+    primer_token: hasta el primer chunk de un stream de chat.
+    por_chunk: entre chunks de un stream.
+    parse / transcripcion: respuesta completa de esas llamadas.
+    tts_base + tts_por_caracter: síntesis de voz.
+    """
+
+    def __init__(self, primer_token=0.0, por_chunk=0.0, parse=0.0, transcripcion=0.0,
+                 tts_base=0.0, tts_por_caracter=0.0):
+        self.primer_token = primer_token
+        self.por_chunk = por_chunk
+        self.parse = parse
+        self.transcripcion = transcripcion
+        self.tts_base = tts_base
+        self.tts_por_caracter = tts_por_caracter
+
+
+def _uso(mensajes, completado):
+    prompt = sum(len(str(m.get("content") or "")) for m in mensajes) // 4
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=len(completado) // 4,
+                           total_tokens=prompt + len(completado) // 4)
+
+
+def _trozos(texto, tam=12):
+    return [texto[i:i + tam] for i in range(0, len(texto), tam)]
+
+
+class _Chat:
+    def __init__(self, cliente):
+        self._c = cliente
+
+    def create(self, model, messages, tools=None, tool_choice=None, stream=False, stream_options=None, **kwargs):
+        cliente = self._c
+        cliente.llamadas["chat"] += 1
+        llamadas = cliente.decidir_herramientas(messages) if tools and messages[-1]["role"] == "user" else []
+        texto = "" if llamadas else cliente.texto_respuesta
+        tool_calls = [
+            SimpleNamespace(id=f"call_{next(cliente._ids)}", type="function",
+                            function=SimpleNamespace(name=nombre, arguments=json.dumps(args)))
+            for nombre, args in llamadas
+        ]
+        uso = _uso(messages, texto + "".join(tc.function.arguments for tc in tool_calls))
+        if not stream:
+            time.sleep(cliente.latencias.primer_token + cliente.latencias.por_chunk * len(_trozos(texto)))
+            mensaje = SimpleNamespace(role="assistant", content=texto or None, tool_calls=tool_calls or None)
+            return SimpleNamespace(choices=[SimpleNamespace(index=0, message=mensaje, finish_reason="stop")], usage=uso)
+        incluir_uso = bool(stream_options and stream_options.get("include_usage"))
+        return self._stream(texto, tool_calls, uso if incluir_uso else None)
+
+    def _stream(self, texto, tool_calls, uso):
+        lat = self._c.latencias
+        chunk = lambda delta: SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta)], usage=None)
+        time.sleep(lat.primer_token)
+        yield chunk(SimpleNamespace(role="assistant", content=None, tool_calls=None))
+        for i, tc in enumerate(tool_calls):
+            # Como la API real: nombre e id en el primer delta, argumentos troceados después
+            yield chunk(SimpleNamespace(content=None, tool_calls=[SimpleNamespace(
+                index=i, id=tc.id, function=SimpleNamespace(name=tc.function.name, arguments=""))]))
+            for trozo in _trozos(tc.function.arguments):
+                time.sleep(lat.por_chunk)
+                yield chunk(SimpleNamespace(content=None, tool_calls=[SimpleNamespace(
+                    index=i, id=None, function=SimpleNamespace(name=None, arguments=trozo))]))
+        for trozo in _trozos(texto):
+            time.sleep(lat.por_chunk)
+            yield chunk(SimpleNamespace(content=trozo, tool_calls=None))
+        if uso is not None:
+            yield SimpleNamespace(choices=[], usage=uso)
+
+
+class _Parse:
+    def __init__(self, cliente):
+        self._c = cliente
+
+    def parse(self, model, messages, response_format, **kwargs):
+        self._c.llamadas["parse"] += 1
+        time.sleep(self._c.latencias.parse)
+        valores = {nombre: f"{nombre} (simulado)" for nombre in response_format.model_fields}
+        parsed = response_format(**valores)
+        mensaje = SimpleNamespace(role="assistant", content=parsed.model_dump_json(), parsed=parsed)
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=mensaje)], usage=_uso(messages, mensaje.content))
+
+
+class _Transcripciones:
+    def __init__(self, cliente):
+        self._c = cliente
+
+    def create(self, model, file, **kwargs):
+        self._c.llamadas["transcripcion"] += 1
+        time.sleep(self._c.latencias.transcripcion)
+        return SimpleNamespace(text=self._c.texto_transcripcion, usage=SimpleNamespace(type="duration", seconds=3))
+
+
+class _Voz:
+    def __init__(self, cliente):
+        self._c = cliente
+
+    def create(self, model, voice, input, response_format="mp3", **kwargs):
+        self._c.llamadas["tts"] += 1
+        lat = self._c.latencias
+        time.sleep(lat.tts_base + lat.tts_por_caracter * len(input))
+        # ~15 caracteres por segundo de voz; PCM 24 kHz 16 bits mono
+        return SimpleNamespace(content=b"\x00\x00" * int(24000 * len(input) / 15))
+
+
+class ClienteOpenAIFalso:
+    """
+    Sustituto local del cliente OpenAI para benchmarks (misma forma de uso).
+
+    Cubre chat.completions.create (con y sin stream, tool calls, usage),
+    beta.chat.completions.parse, audio.transcriptions y audio.speech.
+    `herramientas(mensajes)` decide qué tool calls devuelve la primera
+    llamada: lista de (nombre, args); vacía = charla directa.
+    """
+
+    def __init__(self, latencias=None, herramientas=None, texto_respuesta=TEXTO_RESPUESTA,
+                 texto_transcripcion="Analiza a Pedri en el Arsenal"):
+        self.latencias = latencias or LatenciasFalsas()
+        self.decidir_herramientas = herramientas or (lambda mensajes: [])
+        self.texto_respuesta = texto_respuesta
+        self.texto_transcripcion = texto_transcripcion
+        self.llamadas = {"chat": 0, "parse": 0, "transcripcion": 0, "tts": 0}
+        self._ids = itertools.count()
+        self.chat = SimpleNamespace(completions=_Chat(self))
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=_Parse(self)))
+        self.audio = SimpleNamespace(transcriptions=_Transcripciones(self), speech=_Voz(self))
@@ -0,0 +1,82 @@
+"""
+Coherencia de las features derivadas en las simulaciones.
+
+Uso, desde la raíz del repo:
+    python -m benchmarks.paridad_derivadas
+
+1. Las fórmulas de derivadas.py reproducen las columnas del CSV (se
+   informan las filas que difieren: métricas imputadas en origen).
+2. predecir_salario (pandas), predecir_salarios_lote, predecir_salario_id
+   y simular_escenarios dan el mismo neto para los mismos traspasos.
+3. Tiempo de valorar N traspasos hipotéticos en un solo lote.
+
+Sale con código 1 si algún camino difiere más de TOLERANCIA.
+"""
+import sys
+import time
+
+import numpy as np
+
+import tools
+from derivadas import MotorDerivadas
+
+TOLERANCIA = 1e-9  # relativa sobre neto_central
+TRASPASOS = 5000
+DESTINOS = [(None, None), ("arsenal", None), (None, "la liga"), ("real madrid", "premier league"),
+            ("bayern", "serie a"), ("brest", "bundesliga")]
+
+
+def main():
+    r = tools._recursos()
+    if r is None:
+        print("❌ No se pudieron cargar los artefactos del modelo.")
+        return 2
+
+    # --- 1. Fórmulas frente al CSV (todas, también las que las simulaciones no recalculan) ---
+    X = r.almacen.X
+    recalculada = X.copy()
+    todas = MotorDerivadas(r.feature_columns, ratio_salarial=True)
+    todas.recalcular(recalculada, r.feature_columns, salario=todas.salario(X))
+    print(f"{'derivada':<26}{'filas distintas':>16}")
+    for nombre, (j, _, _) in todas.derivadas.items():
+        distintas = int((np.abs(recalculada[:, j] - X[:, j]) > 1e-4 * np.maximum(1, np.abs(X[:, j]))).sum())
+        print(f"{nombre:<26}{distintas:>16}")
+
+    # --- 2. Mismo traspaso por todos los caminos ---
+    peor = 0.0
+    for fila in (0, 5, 77, 300, 1200, 2000):
+        serie = r.df_players.iloc[fila]
+        for club, liga in DESTINOS:
+            referencia = tools.predecir_salario(serie, club, liga, r=r)["neto_central"]
+            otros = [
+                tools.predecir_salarios_lote(r, [(fila, club, liga)])[0]["neto_central"],
+                tools.predecir_salarios_lote(r, [(serie, club, liga)])[0]["neto_central"],
+                tools.predecir_salario_id(r, fila, club, liga)["neto_central"],
+            ]
+            peor = max(peor, max(abs(o - referencia) / referencia for o in otros))
+    escenario = tools.simular_escenarios(r, 5)[0]
+    lote = tools.predecir_salarios_lote(r, [(5, escenario["club"], escenario["liga"])])[0]
+    peor = max(peor, abs(lote["neto_central"] - escenario["neto_central"]) / escenario["neto_central"])
+    print(f"\nMáx. diferencia relativa entre caminos: {peor:.2e}")
+
+    # --- 3. Miles de traspasos hipotéticos ---
+    rng = np.random.default_rng(0)
+    clubes, ligas = r.lista_clubes, list(r.socio_dict)
+    solicitudes = [(int(rng.integers(len(r.almacen))), clubes[rng.integers(len(clubes))], ligas[rng.integers(len(ligas))])
+                   for _ in range(TRASPASOS)]
+    for activar in (False, True):
+        tools.RECALCULAR_DERIVADAS = activar
+        inicio = time.perf_counter()
+        tools.predecir_salarios_lote(r, solicitudes)
+        ms = (time.perf_counter() - inicio) * 1000
+        print(f"{TRASPASOS} traspasos, derivadas {'recalculadas' if activar else 'del CSV':<13}: {ms:8.1f} ms")
+
+    if peor > TOLERANCIA:
+        print(f"\n❌ Caminos incoherentes (tolerancia {TOLERANCIA})")
+        return 1
+    print(f"\n✅ Caminos coherentes (tolerancia {TOLERANCIA})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Paridad y latencia de la inferencia rápida (inplace_predict) frente a DMatrix.
+
+Uso, desde la raíz del repo:
+    python -m benchmarks.paridad_inferencia
+
+Comprueba sobre todo el CSV que tools._predecir_log da el mismo log-salario
+que model.predict(DMatrix(DataFrame)) (el camino original) y mide los
+microsegundos por predicción de una fila con cada variante. Sale con
+código 1 si alguna fila difiere más de TOLERANCIA.
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+import tools
+
+TOLERANCIA = 1e-5  # sobre el log-salario; float32 da diferencias ~1e-7
+
+
+def microsegundos(funcion, repeticiones=2000):
+    funcion()
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+
+def main():
+    r = tools._recursos()
+    if r is None:
+        print("❌ No se pudieron cargar los artefactos del modelo.")
+        return 2
+    model, columnas = r.model, r.feature_columns
+
+    # --- Paridad sobre el CSV completo ---
+    frame = r.df_players[columnas].apply(pd.to_numeric, errors='coerce')
+    referencia = model.predict(xgb.DMatrix(frame, feature_names=columnas)).astype(np.float64)
+    rapido = tools._predecir_log(r.almacen.X, model)
+    por_fila = np.array([tools._predecir_log(r.almacen.X[i:i + 1], model)[0] for i in range(len(r.almacen))])
+    dif_lote = float(np.abs(rapido - referencia).max())
+    dif_fila = float(np.abs(por_fila - referencia).max())
+    print(f"Paridad sobre {len(referencia)} filas: máx |Δlog| lote={dif_lote:.2e} fila a fila={dif_fila:.2e}")
+
+    # --- Latencia de una fila ---
+    fila = 5
+    serie = r.df_players.iloc[fila]
+    x = r.almacen.X[fila:fila + 1]
+    variantes = {
+        "DMatrix desde DataFrame (original)": lambda: model.predict(
+            xgb.DMatrix(serie[columnas].to_frame().T.apply(pd.to_numeric, errors='coerce'), feature_names=columnas)),
+        "DMatrix desde float32": lambda: model.predict(xgb.DMatrix(x, feature_names=columnas)),
+        "inplace_predict float32 (_predecir_log)": lambda: tools._predecir_log(x, model),
+        "predecir_salarios_lote (1 fila, id)": lambda: tools.predecir_salarios_lote(r, [(fila, None, None)]),
+        "predecir_salario (pandas, completo)": lambda: tools.predecir_salario(serie, r=r),
+    }
+    print(f"\n{'variante':<42}{'µs/predicción':>15}")
+    for nombre, funcion in variantes.items():
+        print(f"{nombre:<42}{microsegundos(funcion, 300 if 'pandas' in nombre or 'DataFrame' in nombre else 2000):>15.1f}")
+
+    if max(dif_lote, dif_fila) > TOLERANCIA:
+        print(f"\n❌ Paridad rota (tolerancia {TOLERANCIA})")
+        return 1
+    print(f"\n✅ Paridad OK (tolerancia {TOLERANCIA})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
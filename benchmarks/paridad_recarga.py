@@ -0,0 +1,130 @@
+"""
+Recarga incremental del CSV frente a una carga completa.
+
+Uso, desde la raíz del repo:
+    python -m benchmarks.paridad_recarga
+
+Trabaja sobre una copia del CSV y una caché en un directorio temporal (no
+toca los ficheros del repo). Aplica cambios sucesivos (editar, añadir,
+sólo borrar, mezcla), recarga en caliente con tools.recargar y compara la
+foto con una carga completa de los mismos ficheros: almacén, nombres,
+búsqueda, percentiles y tabla de valoraciones. Sale con código 1 si algo
+difiere o si alguna recarga falla.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+import numpy as np
+
+import tools
+
+TOLERANCIA = 1e-12  # relativa sobre la tabla de valoraciones
+CAMPOS_ALMACEN = ("X", "player", "club", "pos", "born", "masa", "tax_rate", "cov_factor")
+
+
+def _redirigir(directorio_cache):
+    tools.CACHE_DIR = directorio_cache
+    tools.PAQUETE_FILE = os.path.join(directorio_cache, "artefactos.brn")
+    tools.CONTRIBUCIONES_FILE = os.path.join(directorio_cache, "contribuciones.npz")
+
+
+def carga_completa(directorio):
+    """Foto construida desde las fuentes, con una caché vacía propia."""
+    cache_previa = tools.CACHE_DIR
+    _redirigir(tempfile.mkdtemp(dir=directorio))
+    try:
+        return tools._cargar_recursos()
+    finally:
+        _redirigir(cache_previa)
+
+
+def diferencias(incremental, completa):
+    """Lista de descripciones de lo que no coincide entre las dos fotos."""
+    fallos = []
+    for campo in CAMPOS_ALMACEN:
+        if not np.array_equal(getattr(incremental.almacen, campo), getattr(completa.almacen, campo)):
+            fallos.append(f"almacén.{campo}")
+    if list(incremental.nombres_busqueda) != list(completa.nombres_busqueda):
+        fallos.append("nombres_busqueda")
+    filas = range(0, len(completa.almacen), 37)
+    for fila in filas:
+        consulta = completa.nombres_busqueda[fila][:-1]
+        if incremental.indice_jugadores.buscar(consulta) != completa.indice_jugadores.buscar(consulta):
+            fallos.append(f"búsqueda '{consulta}'")
+            break
+    for fila in filas:
+        liga, posicion = completa.liga_fila[fila], completa.almacen.pos[fila]
+        if (incremental.percentiles.percentiles(incremental.almacen, fila, liga, posicion)
+                != completa.percentiles.percentiles(completa.almacen, fila, liga, posicion)):
+            fallos.append(f"percentiles fila {fila}")
+            break
+    a, b = incremental.tabla_valoraciones, completa.tabla_valoraciones
+    if (a is None) != (b is None):
+        fallos.append("tabla de valoraciones")
+    elif a is not None:
+        for campo, valores in b.campos.items():
+            otros = a.campos[campo]
+            if otros.shape != valores.shape:
+                fallos.append(f"valoraciones.{campo} (forma)")
+            elif len(valores) and float(np.max(np.abs(otros - valores) / np.maximum(1e-9, np.abs(valores)))) > TOLERANCIA:
+                fallos.append(f"valoraciones.{campo}")
+    return fallos
+
+
+def main():
+    directorio = tempfile.mkdtemp(prefix="braniac-recarga-")
+    csv = os.path.join(directorio, os.path.basename(tools.PLAYERS_FILE))
+    shutil.copy(tools.PLAYERS_FILE, csv)
+    tools.PLAYERS_FILE = csv
+    tools.ARTEFACTOS = (tools.MODEL_FILE, tools.FEATURES_FILE, tools.REFS_FILE, csv)
+    tools.RECARGA_S = max(tools.RECARGA_S, 1)  # hacen falta las huellas por línea del CSV
+    tools.PRECALCULAR_EXPLICACIONES = False
+    _redirigir(os.path.join(directorio, "cache"))
+
+    def renombrar(linea):
+        campos = linea.split(b",")
+        campos[columna] = campos[columna] + b" II"
+        return b",".join(campos)
+
+    try:
+        if tools._recursos() is None:
+            print("❌ No se pudieron cargar los artefactos del modelo.")
+            return 2
+        with open(csv, "rb") as f:
+            cabecera, *filas = f.read().rstrip(b"\n").split(b"\n")
+        columna = cabecera.split(b",").index(b"Player")
+
+        cambios = [
+            ("editar", lambda filas: filas[:5] + [renombrar(filas[5])] + filas[6:]),
+            ("añadir", lambda filas: filas + [renombrar(filas[3])]),
+            ("sólo borrar", lambda filas: filas[:10] + filas[11:]),
+            ("mezcla", lambda filas: [renombrar(filas[0])] + filas[1:20] + filas[22:] + [renombrar(filas[40])]),
+        ]
+        peor = 0
+        print(f"{'cambio':<14}{'filas':>8}{'origen':>10}  resultado")
+        for nombre, cambiar in cambios:
+            filas = cambiar(filas)
+            with open(csv, "wb") as f:
+                f.write(b"\n".join([cabecera, *filas]) + b"\n")
+            try:
+                incremental = tools.recargar([csv])
+            except Exception as e:
+                print(f"{nombre:<14}{len(filas):>8}{'-':>10}  ❌ recarga fallida: {e!r}")
+                peor = 1
+                continue
+            fallos = diferencias(incremental, carga_completa(directorio))
+            print(f"{nombre:<14}{len(filas):>8}{incremental.origen:>10}  {'✅' if not fallos else '❌ ' + ', '.join(fallos)}")
+            if fallos or incremental.origen != "recarga":
+                peor = 1
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print("\n✅ Recarga incremental idéntica a la carga completa" if not peor
+          else "\n❌ La recarga incremental no coincide con la carga completa")
+    return peor
+
+
+if __name__ == "__main__":
+    sys.exit(main())
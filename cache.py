@@ -0,0 +1,217 @@
+import os
+import json
+import sqlite3
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# ==========================================
+# CACHÉ LRU + TTL EN PROCESO
+# ==========================================
+
+def huella_archivos(rutas):
+    """
+    Hash corto de (ruta, tamaño, mtime) de los artefactos.
+
+    Sólo hace os.stat, así que es barato de recalcular en cada consulta;
+    cambia en cuanto se reescribe el modelo, el CSV o las referencias.
+    """
+    h = hashlib.sha1()
+    for ruta in rutas:
+        try:
+            st = os.stat(ruta)
+            h.update(f"{ruta}:{st.st_size}:{st.st_mtime_ns};".encode())
+        except OSError:
+            h.update(f"{ruta}:-;".encode())
+    return h.hexdigest()[:12]
+
+
+def huella_contenido(rutas):
+    """
+    sha256 del contenido de los artefactos (para datos derivados en disco).
+
+    A diferencia de huella_archivos no depende de mtime: copiar o volver a
+    desplegar los mismos ficheros no invalida lo ya calculado.
+    """
+    h = hashlib.sha256()
+    for ruta in rutas:
+        h.update(f"{os.path.basename(ruta)};".encode())
+        try:
+            with open(ruta, "rb") as f:
+                for bloque in iter(lambda: f.read(1 << 20), b""):
+                    h.update(bloque)
+        except OSError:
+            h.update(b"-")
+    return h.hexdigest()[:16]
+
+
+class CacheLRU:
+    """
+    Caché acotada con expulsión LRU, caducidad TTL y contadores.
+
+    Es thread-safe: una única instancia a nivel de módulo se comparte entre
+    todas las sesiones de Streamlit del proceso. Si se pasa `version`
+    (callable), la caché se vacía sola cuando su valor cambia.
+    """
+
+    def __init__(self, max_items=1024, ttl_segundos=3600, version=None, nombre="cache"):
+        self.max_items = max_items
+        self.ttl_segundos = ttl_segundos
+        self.nombre = nombre
+        self._version = version
+        self._version_actual = version() if version else None
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.caducados = 0
+        self.invalidaciones = 0
+
+    def _comprobar_version(self):
+        if self._version is None:
+            return
+        version = self._version()
+        if version != self._version_actual:
+            self._datos.clear()
+            self._version_actual = version
+            self.invalidaciones += 1
+
+    @property
+    def version(self):
+        """Versión vigente de los datos (vacía la caché si ha cambiado)."""
+        with self._lock:
+            self._comprobar_version()
+            return self._version_actual
+
+    def get(self, clave, defecto=None):
+        with self._lock:
+            self._comprobar_version()
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return defecto
+            valor, expira = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                self.caducados += 1
+                self.fallos += 1
+                return defecto
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def set(self, clave, valor):
+        with self._lock:
+            self._comprobar_version()
+            self._datos[clave] = (valor, time.monotonic() + self.ttl_segundos)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+                self.expulsiones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos
+        return {
+            "nombre": self.nombre,
+            "entradas": len(self._datos),
+            "max_items": self.max_items,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "hit_ratio": round(self.aciertos / total, 4) if total else 0.0,
+            "expulsiones": self.expulsiones,
+            "caducados": self.caducados,
+            "invalidaciones": self.invalidaciones,
+            "version": self._version_actual,
+        }
+
+
+# ==========================================
+# CACHÉ PERSISTENTE DE REPORTES (SQLITE)
+# ==========================================
+
+class CacheReportes:
+    """
+    Caché en disco (SQLite) para los reportes estructurados del LLM.
+
+    Clave = sha256(modelo + payload). Cada entrada guarda el JSON del
+    reporte, su fecha de creación (TTL) y último uso (expulsión LRU cuando
+    se supera `max_items`). Sobrevive a reinicios y es compartida por todos
+    los hilos del proceso.
+    """
+
+    def __init__(self, ruta, max_items=5000, ttl_segundos=7 * 24 * 3600):
+        self.ruta = ruta
+        self.max_items = max_items
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reportes ("
+            "clave TEXT PRIMARY KEY, valor TEXT NOT NULL, creado REAL NOT NULL, usado REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reportes_usado ON reportes(usado)")
+        self._conn.commit()
+
+    @staticmethod
+    def clave(payload, modelo):
+        return hashlib.sha256(f"{modelo}\n{payload}".encode("utf-8")).hexdigest()
+
+    def get(self, clave):
+        ahora = time.time()
+        with self._lock:
+            fila = self._conn.execute("SELECT valor, creado FROM reportes WHERE clave = ?", (clave,)).fetchone()
+            if fila is None or fila[1] + self.ttl_segundos < ahora:
+                if fila is not None:
+                    self._conn.execute("DELETE FROM reportes WHERE clave = ?", (clave,))
+                    self._conn.commit()
+                self.fallos += 1
+                return None
+            self._conn.execute("UPDATE reportes SET usado = ? WHERE clave = ?", (ahora, clave))
+            self._conn.commit()
+            self.aciertos += 1
+        return json.loads(fila[0])
+
+    def set(self, clave, valor):
+        ahora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reportes (clave, valor, creado, usado) VALUES (?, ?, ?, ?)",
+                (clave, json.dumps(valor, ensure_ascii=False), ahora, ahora),
+            )
+            self._conn.execute("DELETE FROM reportes WHERE creado < ?", (ahora - self.ttl_segundos,))
+            sobrantes = self._conn.execute("SELECT COUNT(*) FROM reportes").fetchone()[0] - self.max_items
+            if sobrantes > 0:
+                self._conn.execute(
+                    "DELETE FROM reportes WHERE clave IN (SELECT clave FROM reportes ORDER BY usado LIMIT ?)",
+                    (sobrantes,),
+                )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reportes").fetchone()[0]
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos
+        return {
+            "nombre": "reportes",
+            "entradas": len(self),
+            "max_items": self.max_items,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "hit_ratio": round(self.aciertos / total, 4) if total else 0.0,
+        }
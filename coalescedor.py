@@ -0,0 +1,92 @@
+import time
+import threading
+from concurrent.futures import Future
+
+# ==========================================
+# MICRO-LOTES DE PREDICCIÓN
+# ==========================================
+
+class CoalescedorPredicciones:
+    """
+    Agrupa peticiones de predicción concurrentes en un solo model.predict.
+
+    Los hilos llamantes (sesiones de Streamlit, pool de la API) encolan su
+    solicitud y esperan. Un hilo despachador llama una vez a
+    `funcion_lote(solicitudes)` con todo lo encolado y reparte los
+    resultados; mientras predice, lo que llega forma el siguiente lote.
+    Si el último lote tuvo más de una solicitud (hay carga concurrente),
+    además espera hasta `ventana_ms` desde la primera (o `max_items`) para
+    llenarlo; en reposo despacha al instante y no añade latencia.
+    Solicitudes con la misma `clave` en vuelo comparten resultado.
+    """
+
+    def __init__(self, funcion_lote, ventana_ms=3.0, max_items=256, nombre="coalescedor"):
+        self.funcion_lote = funcion_lote
+        self.ventana = ventana_ms / 1000
+        self.max_items = max_items
+        self._cond = threading.Condition()
+        self._cola = []
+        self._en_vuelo = {}
+        self._ultimo_lote = 0
+        self.lotes = 0
+        self.solicitudes = 0
+        self.deduplicadas = 0
+        self._hilo = threading.Thread(target=self._despachar, name=f"braniac-{nombre}", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, clave, solicitud):
+        """Encola `solicitud` (o se une a una idéntica en vuelo); devuelve un Future."""
+        with self._cond:
+            self.solicitudes += 1
+            futuro = self._en_vuelo.get(clave)
+            if futuro is not None:
+                self.deduplicadas += 1
+                return futuro
+            futuro = self._en_vuelo[clave] = Future()
+            self._cola.append((clave, solicitud, futuro))
+            self._cond.notify()
+        return futuro
+
+    def predecir(self, clave, solicitud, timeout=None):
+        return self.enviar(clave, solicitud).result(timeout=timeout)
+
+    def _despachar(self):
+        while True:
+            with self._cond:
+                while not self._cola:
+                    self._cond.wait()
+                # Ventana desde la primera solicitud, sólo con carga: acota la espera añadida
+                limite = time.monotonic() + (self.ventana if self._ultimo_lote > 1 else 0)
+                while len(self._cola) < self.max_items:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._cond.wait(restante)
+                lote, self._cola = self._cola[:self.max_items], self._cola[self.max_items:]
+            self._ejecutar(lote)
+
+    def _ejecutar(self, lote):
+        self.lotes += 1
+        self._ultimo_lote = len(lote)
+        try:
+            resultados = self.funcion_lote([solicitud for _, solicitud, _ in lote])
+            error = None
+        except Exception as e:
+            resultados, error = None, e
+        with self._cond:
+            for clave, _, _ in lote:
+                self._en_vuelo.pop(clave, None)
+        for k, (_, _, futuro) in enumerate(lote):
+            if error is not None:
+                futuro.set_exception(error)
+            else:
+                futuro.set_result(resultados[k])
+
+    def estadisticas(self):
+        return {
+            "nombre": "coalescedor",
+            "solicitudes": self.solicitudes,
+            "lotes": self.lotes,
+            "deduplicadas": self.deduplicadas,
+            "media_por_lote": round((self.solicitudes - self.deduplicadas) / self.lotes, 2) if self.lotes else 0.0,
+        }
@@ -0,0 +1,85 @@
+import threading
+
+import numpy as np
+
+# ==========================================
+# JUGADORES COMPARABLES (VECINOS MÁS CERCANOS)
+# ==========================================
+
+# Métricas de rendimiento + flags de posición y edad; se estandarizan (z-score)
+FEATURES_COMPARABLES = (
+    "SCA_P90", "GCA_P90", "Def_P90", "Attack_Efficiency_Ratio", "Net_Creative_Impact",
+    "Pos_FW", "Pos_GK", "Pos_MF", "Age_Prime_Flag",
+)
+
+
+class MotorComparables:
+    """
+    Top-k jugadores más parecidos por métricas P90, filtrable por liga y posición.
+
+    La matriz estandarizada se construye al cargar los datos. Hay un KDTree
+    por combinación de filtros (liga, posición), creado la primera vez que
+    se pide y reutilizado después: cada consulta es un `query` sobre el
+    subconjunto ya filtrado, en lugar de buscar en todo y descartar. Ni
+    siquiera el árbol sin filtros se crea al cargar: sklearn.neighbors no
+    se importa hasta la primera consulta.
+    """
+
+    def __init__(self, almacen, ligas, hoja=16):
+        columnas = [c for c in FEATURES_COMPARABLES if c in almacen.col]
+        X = np.column_stack([almacen.X[:, almacen.col[c]] for c in columnas]).astype(np.float64)
+        X = np.nan_to_num(X)
+        media = X.mean(axis=0)
+        desviacion = X.std(axis=0)
+        desviacion = np.where(desviacion > 0, desviacion, 1.0)
+        self._abrir(columnas, media, desviacion, np.ascontiguousarray((X - media) / desviacion), almacen, ligas, hoja)
+
+    @classmethod
+    def desde_tablas(cls, almacen, ligas, tablas, textos, hoja=16):
+        """Motor sobre la matriz ya estandarizada (la de `tablas()`)."""
+        motor = cls.__new__(cls)
+        motor._abrir(textos["columnas"], tablas["media"], tablas["desviacion"], tablas["Z"], almacen, ligas, hoja)
+        return motor
+
+    def _abrir(self, columnas, media, desviacion, Z, almacen, ligas, hoja):
+        self.columnas = list(columnas)
+        self.media, self.desviacion, self.Z = media, desviacion, Z
+        self.ligas = np.asarray(ligas, dtype=object)
+        self.posiciones = np.asarray(almacen.pos, dtype=object)
+        self.hoja = hoja
+        self._arboles = {}
+        self._lock = threading.Lock()
+
+    def tablas(self):
+        """(arrays, textos) que reconstruyen el motor con desde_tablas."""
+        return {"Z": self.Z, "media": self.media, "desviacion": self.desviacion}, {"columnas": self.columnas}
+
+    def _arbol(self, liga, posicion):
+        """(KDTree, ids de fila) del subconjunto; None si está vacío."""
+        clave = (liga, posicion)
+        if clave not in self._arboles:
+            # Importación diferida: sklearn tarda en importarse y sólo se usa aquí
+            from sklearn.neighbors import KDTree
+            mascara = np.ones(len(self.Z), dtype=bool)
+            if liga is not None: mascara &= self.ligas == liga
+            if posicion is not None: mascara &= self.posiciones == posicion
+            filas = np.flatnonzero(mascara)
+            arbol = (KDTree(self.Z[filas], leaf_size=self.hoja), filas) if len(filas) else None
+            with self._lock:
+                self._arboles[clave] = arbol
+        return self._arboles[clave]
+
+    def similares(self, fila, k=5, liga=None, posicion=None, excluir=()):
+        """
+        [(id de fila, distancia)] de los k más parecidos a `fila`, sin él
+        mismo ni los ids de `excluir` (p.ej. sus otras filas de la temporada).
+        """
+        arbol = self._arbol(liga, posicion)
+        if arbol is None:
+            return []
+        arbol, filas = arbol
+        descartar = {int(fila), *map(int, excluir)}
+        n = min(k + len(descartar), len(filas))
+        distancias, posiciones = arbol.query(self.Z[fila:fila + 1], k=n)
+        vecinos = [(int(filas[p]), float(d)) for p, d in zip(posiciones[0], distancias[0]) if filas[p] not in descartar]
+        return vecinos[:k]
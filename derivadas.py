@@ -0,0 +1,100 @@
+import numpy as np
+
+# ==========================================
+# FEATURES DERIVADAS (RECÁLCULO VECTORIZADO)
+# ==========================================
+
+# Pseudo-columna: salario anual actual del jugador. No es una feature del
+# modelo; se reconstruye como Wage_Club_Ratio * Masa_Salarial_X antes de
+# simular el cambio de club.
+SALARIO = "Salario_Anual"
+
+# Sube si cambia alguna fórmula o qué se recalcula: invalida lo precalculado con las anteriores
+VERSION_DERIVADAS = 2
+
+
+def _cociente(a, b):
+    """a / b con divisor 0 sustituido por 1 (como en la preparación del CSV)."""
+    return a / np.where(b == 0, 1.0, b)
+
+
+# Columna derivada -> (columnas de las que depende, fórmula). Fórmulas
+# obtenidas del CSV de entrenamiento (coinciden salvo en las filas con
+# métricas imputadas).
+DERIVADAS = {
+    "Club_Purchasing_Power": (("Masa_Salarial_X", "COV_Factor"), lambda c: c("Masa_Salarial_X") * c("COV_Factor")),
+    "Wage_Club_Ratio": ((SALARIO, "Masa_Salarial_X"), lambda c: _cociente(c(SALARIO), c("Masa_Salarial_X"))),
+    "Viability_Score": (("Tax_Rate", "COV_Factor"), lambda c: (1 - c("Tax_Rate")) / c("COV_Factor")),
+    "Age_Sq": (("Age",), lambda c: c("Age") ** 2),
+    "Age_Prime_Flag": (("Age",), lambda c: ((c("Age") >= 25) & (c("Age") <= 30)).astype(np.float64)),
+    "Perf_Age_Interaction": (("GCA_P90", "Age"), lambda c: c("GCA_P90") * c("Age")),
+    "Attack_Efficiency_Ratio": (("GCA_P90", "SCA_P90"), lambda c: _cociente(c("GCA_P90"), c("SCA_P90"))),
+    "Foul_Prone_Ratio": (("Fld_P90", "Def_P90"), lambda c: _cociente(c("Fld_P90"), c("Def_P90"))),
+    "Net_Creative_Impact": (("GCA_P90", "TO_P90"), lambda c: c("GCA_P90") - c("TO_P90")),
+}
+
+
+class MotorDerivadas:
+    """
+    Recalcula sobre una matriz de features (n x feature_columns) las columnas
+    derivadas cuyas entradas se han modificado.
+
+    Sirve igual para una fila que para una rejilla de miles de escenarios:
+    cada fórmula es una expresión NumPy sobre columnas completas. Sólo se
+    tocan las derivadas afectadas por `cambiadas`, así que las filas sin
+    simulación conservan exactamente los valores del CSV.
+
+    Las derivadas que dependen del salario actual (Wage_Club_Ratio) sólo se
+    recalculan con `ratio_salarial=True`: el salario es el objetivo del
+    modelo, y reescalarlo con la masa del destino le filtra el objetivo
+    (el ratio sube en clubes pequeños e infla la predicción). Hasta
+    reentrenar sin esa feature se conserva su valor observado.
+    """
+
+    def __init__(self, feature_columns, ratio_salarial=False):
+        self.col = {c: j for j, c in enumerate(feature_columns)}
+        self.derivadas = {
+            nombre: (self.col[nombre], entradas, formula)
+            for nombre, (entradas, formula) in DERIVADAS.items()
+            if nombre in self.col and all(e in self.col or e == SALARIO for e in entradas)
+            and (ratio_salarial or SALARIO not in entradas)
+        }
+
+    def afectadas(self, cambiadas):
+        """Derivadas que dependen de alguna de las columnas `cambiadas`."""
+        cambiadas = set(cambiadas)
+        return [n for n, (_, entradas, _) in self.derivadas.items() if cambiadas.intersection(entradas)]
+
+    def salario(self, X):
+        """Salario actual por fila (hay que tomarlo antes de sobrescribir la masa); None si no hace falta."""
+        if not any(SALARIO in entradas for _, entradas, _ in self.derivadas.values()):
+            return None
+        return X[..., self.col["Wage_Club_Ratio"]].astype(np.float64) * X[..., self.col["Masa_Salarial_X"]]
+
+    def recalcular(self, X, cambiadas, filas=None, salario=None):
+        """
+        Sobrescribe en `X` (in situ) las derivadas afectadas por `cambiadas`.
+
+        `filas` (máscara o índices) limita el recálculo a esas filas;
+        `salario` es el de `salario(X)` tomado antes de los overrides.
+        """
+        afectadas = self.afectadas(cambiadas)
+        if not afectadas:
+            return X
+        sel = slice(None) if filas is None else filas
+        cache = {}
+
+        def columna(nombre):
+            if nombre not in cache:
+                if nombre == SALARIO:
+                    cache[nombre] = np.asarray(salario, dtype=np.float64)[sel]
+                else:
+                    cache[nombre] = X[sel, self.col[nombre]].astype(np.float64)
+            return cache[nombre]
+
+        for nombre in afectadas:
+            j, entradas, formula = self.derivadas[nombre]
+            if SALARIO in entradas and salario is None:
+                continue
+            X[sel, j] = formula(columna)
+        return X
@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import xgboost as xgb
+
+# ==========================================
+# EXPLICACIÓN DE VALORACIONES (CONTRIBUCIONES SHAP)
+# ==========================================
+
+# Grupo de cada feature para resumir "por qué" sale una cifra
+GRUPOS = {
+    "Club": ("Masa_Salarial_X", "Club_Purchasing_Power", "Wage_Club_Ratio"),
+    "Liga y fiscalidad": ("Tax_Rate", "COV_Factor", "Viability_Score"),
+    "Edad": ("Age", "Age_Sq", "Age_Prime_Flag"),
+}
+GRUPO_RENDIMIENTO = "Rendimiento"
+
+
+def grupo_feature(nombre):
+    if nombre.startswith("Comp_"): return "Liga y fiscalidad"
+    if nombre.startswith("Pos_"): return "Posición"
+    for grupo, columnas in GRUPOS.items():
+        if nombre in columnas: return grupo
+    return GRUPO_RENDIMIENTO
+
+
+def _efecto_pct(contribucion):
+    """Contribución en log-salario -> efecto multiplicativo sobre el bruto, en %."""
+    return round(float(np.expm1(contribucion)) * 100, 1)
+
+
+class Explicador:
+    """
+    Contribuciones TreeSHAP del booster (pred_contribs) y su resumen.
+
+    `contribuciones(X)` devuelve una fila por escenario con una columna por
+    feature más el sesgo al final; la suma es el log-salario predicho. Se
+    calcula en lote: una sola llamada para toda la tabla o todo el pedido.
+    """
+
+    def __init__(self, model, feature_columns):
+        self.model = model
+        self.feature_columns = list(feature_columns)
+        self.grupos = [grupo_feature(c) for c in self.feature_columns]
+
+    def contribuciones(self, X):
+        datos = xgb.DMatrix(np.ascontiguousarray(X, dtype=np.float32))
+        return self.model.predict(datos, pred_contribs=True, validate_features=False).astype(np.float64)
+
+    def resumen(self, contribucion, x, top=5):
+        """Factores principales (por |efecto|) y efecto agregado por grupo."""
+        por_feature = contribucion[:-1]
+        orden = np.argsort(-np.abs(por_feature), kind="stable")[:top]
+        por_grupo = {}
+        for grupo, c in zip(self.grupos, por_feature):
+            por_grupo[grupo] = por_grupo.get(grupo, 0.0) + c
+        return {
+            "factores_principales": [
+                {
+                    "feature": self.feature_columns[j],
+                    "grupo": self.grupos[j],
+                    "valor": round(float(x[j]), 4),
+                    "efecto_pct": _efecto_pct(por_feature[j]),
+                }
+                for j in orden
+            ],
+            "efecto_por_grupo_pct": {
+                g: _efecto_pct(c) for g, c in sorted(por_grupo.items(), key=lambda kv: -abs(kv[1]))
+            },
+        }
+
+
+def guardar_contribuciones(ruta, contribuciones, huella):
+    """npz atómico con la huella de los artefactos con que se calcularon."""
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    temporal = f"{ruta}.tmp.npz"
+    np.savez(temporal, huella=np.array(huella), contribuciones=contribuciones)
+    os.replace(temporal, ruta)
+
+
+def cargar_contribuciones(ruta, huella):
+    """Contribuciones guardadas si existen y corresponden a `huella`; si no, None."""
+    try:
+        with np.load(ruta, allow_pickle=False) as datos:
+            if str(datos["huella"]) != huella:
+                return None
+            return datos["contribuciones"]
+    except (OSError, KeyError, ValueError):
+        return None
@@ -0,0 +1,315 @@
+import re
+import bisect
+import difflib
+from collections import defaultdict
+
+import numpy as np
+
+# ==========================================
+# ÍNDICE DE NOMBRES DE JUGADORES
+# ==========================================
+
+_PATRON_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Pesos por tipo de coincidencia de un token de la consulta
+PESO_EXACTO = 1.0
+PESO_PREFIJO = 0.85
+PESO_SUBCADENA = 0.7
+PESO_DIFUSO = 0.65
+
+def tokenizar(texto_normalizado):
+    return _PATRON_TOKEN.findall(texto_normalizado)
+
+def trigramas(token):
+    """Trigramas de un token con marcas de inicio y fin (^token$)."""
+    t = f"^{token}$"
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+def _posicion(ordenada, clave):
+    """Posición de `clave` en la lista ordenada o -1."""
+    i = bisect.bisect_left(ordenada, clave)
+    return i if i < len(ordenada) and ordenada[i] == clave else -1
+
+def _csr(listas):
+    """Lista de listas de enteros -> (punteros, valores) int32 (formato CSR)."""
+    punteros = np.zeros(len(listas) + 1, dtype=np.int32)
+    punteros[1:] = np.cumsum([len(l) for l in listas])
+    valores = np.fromiter((v for l in listas for v in l), dtype=np.int32, count=int(punteros[-1]))
+    return punteros, valores
+
+
+class IndiceJugadores:
+    """
+    Índice invertido sobre nombres de jugador normalizados.
+
+    Se construye una vez al cargar la tabla. Cada token del nombre apunta a
+    las filas que lo contienen; sobre el vocabulario de tokens hay además
+    una lista ordenada (búsqueda por prefijo) y postings de trigramas
+    (subcadenas y errores tipográficos). `buscar` devuelve candidatos
+    ordenados por puntuación en lugar de la primera coincidencia.
+
+    Las postings se guardan como arrays CSR (punteros + valores) y listas
+    ordenadas: `tablas()` las exporta y `desde_tablas()` reabre el índice
+    sobre ellas sin reconstruirlo (p.ej. vistas mmap del paquete binario).
+    """
+
+    def __init__(self, nombres, nacimientos=None, normalizador=str.lower, umbral_difuso=0.6):
+        nombres = [normalizador(n) for n in nombres]
+        tokens_por_fila = [tokenizar(nombre) for nombre in nombres]
+
+        filas_por_nombre = defaultdict(list)
+        filas_por_token = defaultdict(list)
+        for fila, tokens in enumerate(tokens_por_fila):
+            filas_por_nombre[" ".join(tokens)].append(fila)
+            for token in set(tokens):
+                filas_por_token[token].append(fila)
+
+        vocabulario = sorted(filas_por_token)
+        id_token = {t: i for i, t in enumerate(vocabulario)}
+        tokens_por_trigrama = defaultdict(list)
+        for token in vocabulario:
+            for tri in trigramas(token):
+                tokens_por_trigrama[tri].append(id_token[token])
+        lista_trigramas = sorted(tokens_por_trigrama)
+        nombres_completos = sorted(filas_por_nombre)
+
+        tablas = {"n_tokens": np.array([len(t) for t in tokens_por_fila], dtype=np.int16)}
+        tablas["token_ptr"], tablas["token_filas"] = _csr([filas_por_token[t] for t in vocabulario])
+        tablas["tri_ptr"], tablas["tri_tokens"] = _csr([tokens_por_trigrama[t] for t in lista_trigramas])
+        tablas["nombre_ptr"], tablas["nombre_filas"] = _csr([filas_por_nombre[n] for n in nombres_completos])
+        textos = {"nombres": nombres, "vocabulario": vocabulario, "trigramas": lista_trigramas,
+                  "nombres_completos": nombres_completos}
+        self._abrir(tablas, textos, nacimientos, normalizador, umbral_difuso)
+
+    @classmethod
+    def desde_tablas(cls, tablas, textos, nacimientos=None, normalizador=str.lower, umbral_difuso=0.6):
+        """Índice sobre tablas ya construidas (las de `tablas()`), sin recalcular nada."""
+        indice = cls.__new__(cls)
+        indice._abrir(tablas, textos, nacimientos, normalizador, umbral_difuso)
+        return indice
+
+    def _abrir(self, tablas, textos, nacimientos, normalizador, umbral_difuso):
+        self.normalizador = normalizador
+        self.umbral_difuso = umbral_difuso
+        self.nombres = textos["nombres"]
+        self.nacimientos = list(nacimientos) if nacimientos is not None else [None] * len(self.nombres)
+        self._vocabulario = textos["vocabulario"]
+        self._trigramas = textos["trigramas"]
+        self._nombres_completos = textos["nombres_completos"]
+        self._n_tokens = tablas["n_tokens"]
+        self._token_ptr, self._token_filas = tablas["token_ptr"], tablas["token_filas"]
+        self._tri_ptr, self._tri_tokens = tablas["tri_ptr"], tablas["tri_tokens"]
+        self._nombre_ptr, self._nombre_filas = tablas["nombre_ptr"], tablas["nombre_filas"]
+
+    def tablas(self):
+        """(arrays, textos) que reconstruyen el índice con desde_tablas."""
+        tablas = {
+            "n_tokens": self._n_tokens, "token_ptr": self._token_ptr, "token_filas": self._token_filas,
+            "tri_ptr": self._tri_ptr, "tri_tokens": self._tri_tokens,
+            "nombre_ptr": self._nombre_ptr, "nombre_filas": self._nombre_filas,
+        }
+        textos = {"nombres": self.nombres, "vocabulario": self._vocabulario, "trigramas": self._trigramas,
+                  "nombres_completos": self._nombres_completos}
+        return tablas, textos
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def _filas_token(self, t):
+        return self._token_filas[self._token_ptr[t]:self._token_ptr[t + 1]].tolist()
+
+    def _candidatos_token(self, q):
+        """Ids de tokens del vocabulario parecidos a `q` con su peso."""
+        vocabulario = self._vocabulario
+        candidatos = {}
+        i = _posicion(vocabulario, q)
+        if i >= 0:
+            candidatos[i] = PESO_EXACTO
+
+        # Prefijo: rango contiguo en el vocabulario ordenado
+        if len(q) >= 2:
+            i = bisect.bisect_left(vocabulario, q)
+            while i < len(vocabulario) and vocabulario[i].startswith(q):
+                candidatos.setdefault(i, PESO_PREFIJO * (0.5 + 0.5 * len(q) / len(vocabulario[i])))
+                i += 1
+
+        # Subcadena y difuso: filtrado por trigramas compartidos, luego scoring
+        tris_q = trigramas(q)
+        compartidos = defaultdict(int)
+        for tri in tris_q:
+            j = _posicion(self._trigramas, tri)
+            if j < 0:
+                continue
+            for t in self._tri_tokens[self._tri_ptr[j]:self._tri_ptr[j + 1]].tolist():
+                compartidos[t] += 1
+        for t, n in compartidos.items():
+            if t in candidatos:
+                continue
+            token = vocabulario[t]
+            if len(q) >= 3 and q in token:
+                candidatos[t] = PESO_SUBCADENA * len(q) / len(token)
+                continue
+            # Longitud y Dice sobre trigramas como filtros baratos antes de la distancia de edición
+            if abs(len(token) - len(q)) > 3 or 2 * n / (len(tris_q) + len(token)) < 0.3:
+                continue
+            ratio = difflib.SequenceMatcher(None, q, token).ratio()
+            if ratio >= self.umbral_difuso:
+                candidatos[t] = PESO_DIFUSO * ratio
+        return candidatos
+
+    def buscar(self, consulta, birth_year=None, limite=5, umbral=0.5):
+        """
+        Devuelve [(fila, puntuación), ...] ordenado de mejor a peor.
+
+        La puntuación es la media de la mejor coincidencia de cada token de
+        la consulta (exacto > prefijo > subcadena > difuso), con bonus si el
+        nombre completo coincide y si `birth_year` está a ±1 año.
+        """
+        q_tokens = tokenizar(self.normalizador(consulta))
+        if not q_tokens:
+            return []
+
+        puntos = defaultdict(lambda: [0.0] * len(q_tokens))
+        for k, q in enumerate(q_tokens):
+            for t, peso in self._candidatos_token(q).items():
+                for fila in self._filas_token(t):
+                    if peso > puntos[fila][k]:
+                        puntos[fila][k] = peso
+
+        j = _posicion(self._nombres_completos, " ".join(q_tokens))
+        exactos = set(self._nombre_filas[self._nombre_ptr[j]:self._nombre_ptr[j + 1]].tolist()) if j >= 0 else set()
+        anio = None
+        if birth_year:
+            try: anio = int(birth_year)
+            except (TypeError, ValueError): anio = None
+
+        resultados = []
+        for fila, por_token in puntos.items():
+            score = sum(por_token) / len(q_tokens)
+            if score < umbral:
+                continue
+            # Desempate: nombres más cortos cubren mejor la consulta
+            score += 0.05 * len(q_tokens) / max(int(self._n_tokens[fila]), len(q_tokens))
+            if fila in exactos:
+                score += 1.0
+            if anio is not None:
+                nacimiento = self.nacimientos[fila]
+                if nacimiento is not None and abs(nacimiento - anio) <= 1:
+                    score += 2.0
+            resultados.append((fila, score))
+
+        resultados.sort(key=lambda x: (-x[1], x[0]))
+        return resultados[:limite]
+
+
+# ==========================================
+# RESOLUCIÓN DE CLUBES Y LIGAS
+# ==========================================
+
+# Consultas más cortas no se resuelven por aproximación (sólo exactas)
+MIN_LONGITUD_DIFUSA = 4
+# Hasta esta longitud la coincidencia difusa exige UMBRAL_CORTO
+LONGITUD_CORTA = 6
+UMBRAL_CORTO = 0.8
+
+_PATRON_DIVISION = re.compile(r"^(?:[a-z]?\d+|i{1,3}|iv|[a-z])$")
+
+def marca_division(texto_normalizado):
+    """Número o sufijo de división al inicio o al final ('2', 'b', 'ii'...), o None."""
+    tokens = tokenizar(texto_normalizado)
+    if len(tokens) < 2:
+        return None
+    for token in (tokens[-1], tokens[0]):
+        if _PATRON_DIVISION.match(token):
+            return token
+    return None
+
+
+class TablaDifusa:
+    """
+    Tabla nombre -> entidad con búsqueda exacta O(1) y difusa por trigramas.
+
+    Sólo los nombres canónicos (`entidades`) entran en la búsqueda difusa;
+    los `alias` (apodos, países, siglas) se aceptan únicamente tal cual,
+    para que "psv" no acabe en 'psg' ni "bari" en 'barca'. Los trigramas
+    de la consulta seleccionan pocos candidatos y sólo esos se puntúan con
+    difflib (misma métrica que get_close_matches). Una consulta con marca
+    de división distinta a la del candidato ("Serie A2", "Bundesliga 2")
+    no se resuelve por aproximación.
+    """
+
+    def __init__(self, entidades, normalizador=str.lower, umbral=0.6, alias=None):
+        self.normalizador = normalizador
+        self.umbral = umbral
+        self._entidad_por_nombre = {}
+        for texto, entidad in entidades.items():
+            self._entidad_por_nombre.setdefault(normalizador(texto).strip(), entidad)
+        self._nombres_por_trigrama = defaultdict(list)
+        for texto in self._entidad_por_nombre:
+            for tri in trigramas(texto):
+                self._nombres_por_trigrama[tri].append(texto)
+        self._entidad_por_alias = dict(self._entidad_por_nombre)
+        for texto, entidad in (alias or {}).items():
+            self._entidad_por_alias.setdefault(normalizador(texto).strip(), entidad)
+
+    def resolver(self, nombre):
+        """Devuelve (entidad, confianza en [0, 1]) o None."""
+        if not isinstance(nombre, str) or not nombre.strip():
+            return None
+        q = self.normalizador(nombre).strip()
+        if q in self._entidad_por_alias:
+            return self._entidad_por_alias[q], 1.0
+        if len(q) < MIN_LONGITUD_DIFUSA:
+            return None
+
+        umbral = max(self.umbral, UMBRAL_CORTO) if len(q) <= LONGITUD_CORTA else self.umbral
+        marca = marca_division(q)
+        candidatos = {texto for tri in trigramas(q) for texto in self._nombres_por_trigrama.get(tri, ())}
+        mejor, mejor_ratio = None, 0.0
+        for texto in sorted(candidatos):
+            if marca is not None and marca != marca_division(texto):
+                continue
+            ratio = difflib.SequenceMatcher(None, q, texto).ratio()
+            if ratio > mejor_ratio:
+                mejor, mejor_ratio = texto, ratio
+        if mejor is None or mejor_ratio < umbral:
+            return None
+        return self._entidad_por_nombre[mejor], round(mejor_ratio, 3)
+
+
+class ResolverEntidades:
+    """
+    Resolución de clubes y ligas construida una vez al arrancar.
+
+    `clubes`: claves de CLUB_DICT. `ligas`: {clave socio -> nombre canónico}.
+    Los alias (apodos de club, países) apuntan a claves ya existentes y
+    sólo se aceptan como coincidencia exacta.
+    """
+
+    def __init__(self, clubes, ligas, alias_clubes=None, alias_ligas=None,
+                 normalizador=str.lower, umbral_club=0.6, umbral_liga=0.88):
+        tabla_clubes = {c: c for c in clubes}
+        alias_club = {a: c for a, c in (alias_clubes or {}).items() if c in tabla_clubes}
+        self.clubes = TablaDifusa(tabla_clubes, normalizador, umbral_club, alias=alias_club)
+
+        tabla_ligas = {}
+        for clave, nombre in ligas.items():
+            tabla_ligas[clave] = clave
+            tabla_ligas[nombre] = clave
+        por_nombre = {normalizador(n).strip(): c for c, n in ligas.items()}
+        alias_liga = {}
+        for alias, destino in (alias_ligas or {}).items():
+            clave = por_nombre.get(normalizador(destino).strip())
+            if clave is not None:
+                alias_liga[alias] = clave
+        self.ligas = TablaDifusa(tabla_ligas, normalizador, umbral_liga, alias=alias_liga)
+        self.nombres_liga = dict(ligas)
+
+    def resolver_club(self, nombre):
+        """(clave de CLUB_DICT, confianza) o None."""
+        return self.clubes.resolver(nombre)
+
+    def resolver_liga(self, nombre):
+        """(clave de SOCIO_DICT, confianza) o None."""
+        return self.ligas.resolver(nombre)
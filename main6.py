@@ -1,9 +1,10 @@
 import os
 import json
+import base64
+import inspect
 import streamlit as st
 from io import BytesIO
 from dotenv import load_dotenv
-from openai import OpenAI
 
 # ----------------------------------------------------
 # IMPORTACIONES LOCALES 
@@ -11,7 +12,11 @@ from openai import OpenAI
 # Importamos el prompt maestro
 from prompts import final_system_prompt 
 # Importamos la definición de herramientas y las funciones lógicas de tools
-from tools import tools_definition, analyze_player_tool, lookup_database_tool
+from tools import tools_definition, precalentar, salud
+from recursos import cliente_openai
+from orquestador import ejecutar_tool_calls, PrimeraRespuesta, TTSPipeline
+from observabilidad import peticion, span, nuevo_id_peticion
+from metricas import METRICAS, iniciar_exportador
 
 # ----------------------------------------------------
 # 0. CONFIGURACIÓN E INICIALIZACIÓN DE API
@@ -20,16 +25,57 @@ from tools import tools_definition, analyze_player_tool, lookup_database_tool
 load_dotenv(override=True)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-try:
-    client_openai = OpenAI(api_key=OPENAI_API_KEY)
-except Exception as e:
+# Cliente único por proceso (pool keep-alive) compartido por todas las sesiones
+client_openai = cliente_openai()
+if client_openai is None:
     st.error(f"Error")
-    client_openai = None
+# Modelo y base de datos se cargan en segundo plano mientras se pinta la página
+precalentar()
 
 MODEL_CHAT = "gpt-5-mini" 
 MODEL_TRANSCRIPT = "whisper-1" 
 MODEL_TTS = "tts-1" 
 VOICE_TTS = "fable" 
+# Voz por frases mientras se escribe la respuesta (False = un solo audio al final)
+TTS_EN_STREAMING = True
+# Panel de latencias/tokens/cachés en la barra lateral
+PANEL_METRICAS = True
+
+# Endpoint /metrics o volcado a fichero si hay BRANIAC_METRICS_PORT / BRANIAC_METRICS_FILE
+iniciar_exportador()
+
+# Cola de audio en el navegador: los segmentos del TTS suenan uno detrás de
+# otro sin que el servidor espere a que terminen. La cola vive en la
+# ventana de la app (st.html no usa iframe), así sobrevive a los reruns.
+# Las versiones de Streamlit sin unsafe_allow_javascript no ejecutan el
+# script: ahí se vuelve a un solo audio al final (st.audio).
+COLA_AUDIO_NAVEGADOR = "unsafe_allow_javascript" in inspect.signature(st.html).parameters
+_JS_COLA_AUDIO = """
+<script>
+(() => {
+  const c = window.__braniacColaAudio = window.__braniacColaAudio || {turno: null, clips: [], audio: null};
+  const turno = __TURNO__;
+  if (c.turno !== turno) {
+    if (c.audio) c.audio.pause();
+    Object.assign(c, {turno: turno, clips: [], audio: null});
+  }
+  c.clips.push(__URL__);
+  const siguiente = () => {
+    if (c.audio || !c.clips.length) return;
+    c.audio = new Audio(c.clips.shift());
+    c.audio.onended = c.audio.onerror = () => { c.audio = null; siguiente(); };
+    c.audio.play().catch(() => { c.audio = null; });
+  };
+  siguiente();
+})();
+</script>
+"""
+
+def encolar_audio(contenedor, wav_bytes, turno):
+    """Añade un segmento WAV a la cola de reproducción del navegador para este turno."""
+    url = "data:audio/wav;base64," + base64.b64encode(wav_bytes).decode("ascii")
+    contenedor.html(_JS_COLA_AUDIO.replace("__TURNO__", json.dumps(turno)).replace("__URL__", json.dumps(url)),
+                    unsafe_allow_javascript=True)
 
 # ----------------------------------------------------
 # 1. CONFIGURACIÓN DE PÁGINA Y TEMA 
@@ -111,6 +157,25 @@ with st.sidebar:
         st.rerun() 
         
     st.info(f"Modelo de Chat: {MODEL_CHAT}")
+    if not salud()["listo"]:
+        st.caption("⏳ Cargando modelo de valoración...")
+
+    if PANEL_METRICAS:
+        with st.expander("📈 Métricas del proceso"):
+            etapas = METRICAS.resumen_etapas()
+            if etapas:
+                st.dataframe(etapas, hide_index=True, use_container_width=True)
+            else:
+                st.caption("Aún no hay llamadas registradas.")
+            tokens = METRICAS.tokens()
+            if tokens:
+                st.dataframe([dict(et, tokens=v) for et, v in tokens.items()], hide_index=True, use_container_width=True)
+            caches = METRICAS.estadisticas_cache()
+            if caches:
+                st.dataframe(
+                    [{"cache": n, "hit_ratio": c.get("hit_ratio"), "entradas": c.get("entradas")} for n, c in caches.items()],
+                    hide_index=True, use_container_width=True
+                )
 
 # ----------------------------------------------------
 # 4. CONTENEDOR PRINCIPAL Y LÓGICA
@@ -123,10 +188,12 @@ for msg in st.session_state.messages:
     # Si el mensaje tiene audio mostrar el reproductor
     audio_payload = msg.get("audio")
     if audio_payload:
-         message_block.audio(audio_payload, format="audio/mp3", autoplay=False) 
+         message_block.audio(audio_payload, format=msg.get("audio_format", "audio/mp3"), autoplay=False) 
 
 user_prompt = None
 user_display_content = None
+# Mismo request id para la transcripción y el turno que provoca (trazas de latencia)
+id_turno = nuevo_id_peticion()
 
 #Logica de entrada de texto
 if text_prompt := st.chat_input(placeholder="Escribe aquí para condensar datos..."):
@@ -142,10 +209,12 @@ elif send_audio and client_openai:
         
         with st.spinner("Brainiac está transcribiendo el audio..."):
             try:
-                transcription = client_openai.audio.transcriptions.create(
-                    model=MODEL_TRANSCRIPT,
-                    file=audio_file,
-                )
+                with peticion("transcripcion", id_turno), span("transcripcion", modelo=MODEL_TRANSCRIPT):
+                    transcription = client_openai.audio.transcriptions.create(
+                        model=MODEL_TRANSCRIPT,
+                        file=audio_file,
+                    )
+                METRICAS.registrar_uso(MODEL_TRANSCRIPT, getattr(transcription, "usage", None))
                 user_prompt = transcription.text.strip()
                 if user_prompt:
                     user_display_content = f"**(Transcripción):** {user_prompt}"
@@ -162,138 +231,145 @@ elif send_audio and client_openai:
 # ----------------------------------------------------
 
 if user_prompt and client_openai:
+    with peticion("turno", id_turno):
     
-    # 1. Mostrar mensaje del usuario en el chat
-    st.session_state.messages.append({"role": "user", "content": user_prompt})
-    st.chat_message("user").write(user_display_content or user_prompt)
+        # 1. Mostrar mensaje del usuario en el chat
+        st.session_state.messages.append({"role": "user", "content": user_prompt})
+        st.chat_message("user").write(user_display_content or user_prompt)
     
-    # 2. Preparar contexto para la IA
-    # Inyectamos el prompt 
-    conversation = [{"role": "system", "content": final_system_prompt}] 
+        # 2. Preparar contexto para la IA
+        # Inyectamos el prompt 
+        conversation = [{"role": "system", "content": final_system_prompt}] 
     
-    # Añadimos el historial 
-    conversation.extend([{"role": m["role"], "content": m["content"]} for m in st.session_state.messages if m["role"] != "system"])
+        # Añadimos el historial 
+        conversation.extend([{"role": m["role"], "content": m["content"]} for m in st.session_state.messages if m["role"] != "system"])
 
-    full_response = ""
-    audio_bytes = None
+        full_response = ""
+        audio_bytes = None
+        tts = TTSPipeline(client_openai, MODEL_TTS, VOICE_TTS) if TTS_EN_STREAMING and COLA_AUDIO_NAVEGADOR else None
 
-    with st.chat_message("assistant"):
-        with st.spinner("Brainiac está analizando los datos..."):
-            try:
-                # -------------------------------------------------
-                # PASO A: Primera llamada (¿Necesito herramientas?)
-                # -------------------------------------------------
-                first_response = client_openai.chat.completions.create(
-                    model=MODEL_CHAT,
-                    messages=conversation,
-                    tools=tools_definition,
-                    tool_choice="auto"
-                )
+        with st.chat_message("assistant"):
+            # Los segmentos se encolan en el navegador; el hueco queda para el audio completo
+            audio_slot = st.empty()
+            cola_audio = st.container()
+            reproducir = lambda wav: encolar_audio(cola_audio, wav, id_turno)
+            # Con TTS en pipeline el texto pasa por la síntesis mientras se escribe
+            escribir = (lambda s: st.write_stream(tts.envolver(s, reproducir))) if tts else st.write_stream
+        
+            with st.spinner("Brainiac está analizando los datos..."):
+                try:
+                    # -------------------------------------------------
+                    # PASO A: Primera llamada en streaming (¿Necesito herramientas?)
+                    # -------------------------------------------------
+                    with span("chat_primera_llamada", modelo=MODEL_CHAT):
+                        primera = PrimeraRespuesta(METRICAS.con_uso(client_openai.chat.completions.create(
+                            model=MODEL_CHAT,
+                            messages=conversation,
+                            tools=tools_definition,
+                            tool_choice="auto",
+                            stream=True,
+                            stream_options={"include_usage": True}
+                        ), MODEL_CHAT))
+                        tipo_respuesta = primera.iniciar()
                 
-                msg = first_response.choices[0].message
+                    # -------------------------------------------------
+                    # PASO D: Si es charla normal, el texto sale directo de la primera llamada
+                    # -------------------------------------------------
+                    if tipo_respuesta == "texto":
+                        full_response = escribir(primera.textos())
 
-                # -------------------------------------------------
-                # PASO B: Si Braniac decide usar HERRAMIENTAS
-                # -------------------------------------------------
-                if msg.tool_calls:
-                    conversation.append(msg) 
-                    
-                    for tool_call in msg.tool_calls:
-                        args = json.loads(tool_call.function.arguments)
-                        tool_result = {}
-                        
-                        # --- CASO 1: ANÁLISIS DE JUGADOR (Predicción) ---
-                        if tool_call.function.name == "analyze_player_tool":
-                            p_name = args.get('player_name')
-                            # 1. CAPTURAR EL AÑO (Nuevo)
-                            p_year = args.get('birth_year') 
-                            
-                            # Actualizamos el mensaje visual
-                            st.toast(f"🔍 Analizando a: {p_name} ({p_year})...", icon="⚽")
-                            
-                            # 2. PASAR EL AÑO A LA FUNCIÓN 
-                            tool_result = analyze_player_tool(
-                                player_name=p_name,
-                                birth_year=p_year,  
-                                client_openai=client_openai,
-                                target_club=args.get('target_club'),
-                                target_league=args.get('target_league')
-                            )
-                        
-                        # --- CASO 2: CONSULTA DE DATOS  ---
-                        elif tool_call.function.name == "lookup_database_tool":
-                            target = args.get('name')
-                            cat = args.get('category')
-                            st.toast(f"📂 Consultando datos de {target}...", icon="🗃️")
-                            
-                            tool_result = lookup_database_tool(
-                                category=cat,
-                                name=target
-                            )
-                            
-                        # Guardar el resultado de la herramienta en la conversación
-                        conversation.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "content": json.dumps(tool_result)
-                        })
-                    
                     # -------------------------------------------------
-                    # PASO C: Segunda llamada (Generar respuesta final con datos)
+                    # PASO B: Si Braniac decide usar HERRAMIENTAS
                     # -------------------------------------------------
-                    stream = client_openai.chat.completions.create(
-                        model=MODEL_CHAT,
-                        messages=conversation,
-                        stream=True
-                    )
-                    full_response = st.write_stream(stream)
+                    tool_calls = primera.tool_calls
+                    if tool_calls:
+                        conversation.append(primera.mensaje_asistente()) 
                     
-                # -------------------------------------------------
-                # PASO D: Si es charla normal 
-                # -------------------------------------------------
-                else:
-                    stream = client_openai.chat.completions.create(
-                        model=MODEL_CHAT,
-                        messages=conversation,
-                        stream=True
-                    )
-                    full_response = st.write_stream(stream)
+                        # Avisos visuales en el hilo de Streamlit antes de lanzar cada herramienta
+                        def avisar_herramienta(nombre, args):
+                            if nombre == "analyze_player_tool":
+                                st.toast(f"🔍 Analizando a: {args.get('player_name')} ({args.get('birth_year')})...", icon="⚽")
+                            elif nombre == "lookup_database_tool":
+                                st.toast(f"📂 Consultando datos de {args.get('name')}...", icon="🗃️")
+                            elif nombre == "scenario_grid_tool":
+                                st.toast(f"🌍 Comparando destinos para {args.get('player_name')}...", icon="📊")
+                            elif nombre == "sensitivity_curve_tool":
+                                st.toast(f"📈 Calculando sensibilidad de {args.get('player_name')}...", icon="📉")
+                    
+                        # Las herramientas se ejecutan en paralelo; los resultados vuelven
+                        # en el orden de tool_call_id y se guardan en la conversación
+                        with span("ejecucion_herramientas", n=len(tool_calls)):
+                            conversation.extend(
+                                ejecutar_tool_calls(tool_calls, client_openai, al_lanzar=avisar_herramienta)
+                            )
+                    
+                        # -------------------------------------------------
+                        # PASO C: Segunda llamada (Generar respuesta final con datos)
+                        # -------------------------------------------------
+                        with span("chat_segunda_llamada", modelo=MODEL_CHAT):
+                            stream = METRICAS.con_uso(client_openai.chat.completions.create(
+                                model=MODEL_CHAT,
+                                messages=conversation,
+                                stream=True,
+                                stream_options={"include_usage": True}
+                            ), MODEL_CHAT)
+                            full_response = (full_response + "\n\n" if full_response else "") + escribir(stream)
 
-            except Exception as e:
-                full_response = f"⚠️ Error en el procesamiento: {e}"
-                st.error(full_response)
-
-    # -------------------------------------------------
-    # PASO E: Generar Audio (TTS)
-    # -------------------------------------------------
-    if full_response and not full_response.startswith("⚠️"):
-        # Limitamos por temas de tiempo
-        tts_input = full_response[:4096] 
-        
-        # Solo generamos audio si hay una respuesta válida
-        with st.spinner("Brainiac está sintetizando la voz..."):
-            try:
-                speech = client_openai.audio.speech.create(
-                    model=MODEL_TTS, 
-                    voice=VOICE_TTS, 
-                    input=tts_input
-                )
-                audio_bytes = speech.content
-                
-                # Reproducir automáticamente en la interfaz
-                st.audio(audio_bytes, format="audio/mp3", autoplay=True)
+                except Exception as e:
+                    full_response = f"⚠️ Error en el procesamiento: {e}"
+                    st.error(full_response)
+
+        # -------------------------------------------------
+        # PASO E: Guardar respuesta en historial
+        # -------------------------------------------------
+        # Antes del audio: si el usuario interactúa mientras suena, el rerun ya la tiene
+        mensaje = {
+            "role": "assistant", 
+            "content": full_response, 
+            "audio": None, # Se rellena al terminar la síntesis para poder reproducirlo después
+            "audio_format": "audio/mp3"
+        }
+        st.session_state.messages.append(mensaje)
 
+        # -------------------------------------------------
+        # PASO F: Generar Audio (TTS)
+        # -------------------------------------------------
+        if tts and full_response and not full_response.startswith("⚠️"):
+            # Los segmentos ya se están sintetizando: se encolan los que falten (sin esperar a que suenen)
+            try:
+                with span("tts", modelo=MODEL_TTS, modo="pipeline"):
+                    tts.entregar(reproducir, bloquear=True)
+                audio_bytes = tts.audio_completo()
+                if audio_bytes:
+                    mensaje.update(audio=audio_bytes, audio_format="audio/wav")
+                    audio_slot.audio(audio_bytes, format="audio/wav", autoplay=False)
+                if tts.errores:
+                    st.warning(f"No se pudo generar parte del audio: {tts.errores[0]}")
             except Exception as exc:
                 st.warning(f"No se pudo generar el audio: {exc}")
 
-    # -------------------------------------------------
-    # PASO F: Guardar respuesta en historial 
-    # -------------------------------------------------
-    st.session_state.messages.append({
-        "role": "assistant", 
-        "content": full_response, 
-        "audio": audio_bytes # Guardamos el audio para poder reproducirlo después
-    })
+        elif full_response and not full_response.startswith("⚠️"):
+            # Limitamos por temas de tiempo
+            tts_input = full_response[:4096] 
+        
+            # Solo generamos audio si hay una respuesta válida
+            with st.spinner("Brainiac está sintetizando la voz..."):
+                try:
+                    with span("tts", modelo=MODEL_TTS, modo="unico"):
+                        speech = client_openai.audio.speech.create(
+                            model=MODEL_TTS, 
+                            voice=VOICE_TTS, 
+                            input=tts_input
+                        )
+                    METRICAS.incrementar("braniac_tts_caracteres_total", len(tts_input), modelo=MODEL_TTS)
+                    audio_bytes = speech.content
+                    mensaje["audio"] = audio_bytes # Guardamos el audio para poder reproducirlo después
+                
+                    # Reproducir automáticamente en la interfaz
+                    st.audio(audio_bytes, format="audio/mp3", autoplay=True)
+
+                except Exception as exc:
+                    st.warning(f"No se pudo generar el audio: {exc}")
 
     
     
@@ -0,0 +1,280 @@
+import os
+import math
+import time
+import bisect
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from observabilidad import obtener_logger, registrar_oyente
+
+logger = obtener_logger("braniac.metricas")
+
+# ==========================================
+# REGISTRO DE MÉTRICAS EN PROCESO
+# ==========================================
+
+# Límites (segundos) de los buckets de latencia: de 1 ms a 1 min
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+VENTANA_PERCENTILES = 2048  # últimas muestras por serie para p50/p95/p99 exactos
+
+
+class Histograma:
+    """
+    Histograma acumulativo (formato Prometheus) más una ventana de muestras.
+
+    Los buckets se exportan tal cual, de modo que histogram_quantile puede
+    agregar entre despliegues; la ventana da percentiles exactos recientes
+    para el panel de la app.
+    """
+
+    def __init__(self, limites=BUCKETS_LATENCIA, ventana=VENTANA_PERCENTILES):
+        self.limites = tuple(limites)
+        self.cuentas = [0] * (len(self.limites) + 1)  # el último es +Inf
+        self.suma = 0.0
+        self.n = 0
+        self.recientes = deque(maxlen=ventana)
+
+    def observar(self, valor):
+        self.cuentas[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.n += 1
+        self.recientes.append(valor)
+
+    def percentiles(self, qs=(0.5, 0.95, 0.99)):
+        muestras = sorted(self.recientes)
+        if not muestras:
+            return {q: None for q in qs}
+        return {q: muestras[min(len(muestras) - 1, math.ceil(q * len(muestras)) - 1)] for q in qs}
+
+
+def _etiquetas(etiquetas):
+    return tuple(sorted((k, str(v)) for k, v in etiquetas.items() if v is not None))
+
+
+def _formato_etiquetas(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ""
+    escapar = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in pares) + "}"
+
+
+class RegistroMetricas:
+    """
+    Métricas del proceso: latencias por etapa, errores, tokens y cachés.
+
+    Las latencias y errores llegan solas desde los spans de observabilidad
+    (una serie por etapa y, en herramientas, por nombre de herramienta).
+    Los tokens se anotan con `registrar_uso` a partir del campo `usage` de
+    las respuestas de OpenAI. Las cachés se leen al exportar desde las
+    fuentes registradas con `registrar_fuente_cache`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencias = {}
+        self._contadores = {}
+        self._fuentes_cache = []
+        self.inicio = time.time()
+
+    # --- Escritura ---
+    def observar(self, nombre, valor, **etiquetas):
+        clave = (nombre, _etiquetas(etiquetas))
+        with self._lock:
+            histograma = self._latencias.get(clave)
+            if histograma is None:
+                histograma = self._latencias[clave] = Histograma()
+            histograma.observar(valor)
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = (nombre, _etiquetas(etiquetas))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar_span(self, nombre, duracion, error, atributos):
+        """Oyente de observabilidad.span: una serie por etapa."""
+        etiquetas = {"etapa": nombre, "herramienta": atributos.get("herramienta")}
+        self.observar("braniac_etapa_duracion_segundos", duracion, **etiquetas)
+        self.incrementar("braniac_etapa_llamadas_total", **etiquetas)
+        if error is not None:
+            self.incrementar("braniac_etapa_errores_total", tipo=type(error).__name__, **etiquetas)
+
+    def registrar_uso(self, modelo, usage):
+        """
+        Suma el `usage` de una respuesta de OpenAI (si viene).
+
+        Chat/parse traen prompt/completion tokens; las transcripciones,
+        input/output tokens o segundos de audio (whisper-1).
+        """
+        if usage is None:
+            return
+        for campo, tipo in (("prompt_tokens", "prompt"), ("completion_tokens", "completion"),
+                            ("input_tokens", "prompt"), ("output_tokens", "completion")):
+            valor = getattr(usage, campo, None)
+            if valor:
+                self.incrementar("braniac_tokens_total", valor, modelo=modelo, tipo=tipo)
+        segundos = getattr(usage, "seconds", None)
+        if segundos:
+            self.incrementar("braniac_audio_segundos_total", segundos, modelo=modelo)
+
+    def con_uso(self, stream, modelo):
+        """Reemite un stream de chat anotando el `usage` del último chunk."""
+        for chunk in stream:
+            self.registrar_uso(modelo, getattr(chunk, "usage", None))
+            yield chunk
+
+    def registrar_fuente_cache(self, funcion):
+        """`funcion()` -> {nombre: estadisticas()} de CacheLRU/CacheReportes."""
+        self._fuentes_cache.append(funcion)
+
+    # --- Lectura ---
+    def estadisticas_cache(self):
+        stats = {}
+        for funcion in self._fuentes_cache:
+            try:
+                stats.update(funcion())
+            except Exception as e:
+                logger.warning("Fuente de caché no disponible: %s", e)
+        return stats
+
+    def resumen_etapas(self):
+        """Filas {etapa, llamadas, errores, p50_ms, p95_ms, p99_ms} ordenadas por p95."""
+        with self._lock:
+            series = [(dict(et), h.n, h.percentiles()) for (nombre, et), h in self._latencias.items()
+                      if nombre == "braniac_etapa_duracion_segundos"]
+            errores = {}
+            for (nombre, et), valor in self._contadores.items():
+                if nombre == "braniac_etapa_errores_total":
+                    clave = tuple((k, v) for k, v in et if k != "tipo")
+                    errores[clave] = errores.get(clave, 0) + valor
+        filas = []
+        for et, n, pct in series:
+            etapa = et["etapa"] + (f":{et['herramienta']}" if "herramienta" in et else "")
+            filas.append({
+                "etapa": etapa,
+                "llamadas": n,
+                "errores": errores.get(_etiquetas(et), 0),
+                **{f"p{int(q * 100)}_ms": round(v * 1000, 1) for q, v in pct.items()},
+            })
+        return sorted(filas, key=lambda f: -f["p95_ms"])
+
+    def tokens(self):
+        with self._lock:
+            return {et: v for (nombre, et), v in self._contadores.items() if nombre == "braniac_tokens_total"}
+
+    def exportar_prometheus(self):
+        """Texto en formato de exposición de Prometheus (text/plain 0.0.4)."""
+        lineas = []
+        with self._lock:
+            # Copia bajo el lock: los hilos de herramientas siguen observando
+            latencias = sorted((k, (h.limites, list(h.cuentas), h.suma, h.n)) for k, h in self._latencias.items())
+            contadores = sorted(self._contadores.items())
+
+        declarados = set()
+        for (nombre, et), (limites, cuentas, suma, n) in latencias:
+            if nombre not in declarados:
+                lineas.append(f"# TYPE {nombre} histogram")
+                declarados.add(nombre)
+            acumulado = 0
+            for limite, cuenta in zip([f"{l:g}" for l in limites] + ["+Inf"], cuentas):
+                acumulado += cuenta
+                lineas.append(f"{nombre}_bucket{_formato_etiquetas(et, [('le', limite)])} {acumulado}")
+            lineas.append(f"{nombre}_sum{_formato_etiquetas(et)} {suma:.6f}")
+            lineas.append(f"{nombre}_count{_formato_etiquetas(et)} {n}")
+
+        for (nombre, et), valor in contadores:
+            if nombre not in declarados:
+                lineas.append(f"# TYPE {nombre} counter")
+                declarados.add(nombre)
+            lineas.append(f"{nombre}{_formato_etiquetas(et)} {valor}")
+
+        caches = self.estadisticas_cache()
+        for campo, tipo in (("aciertos", "counter"), ("fallos", "counter"), ("entradas", "gauge"), ("hit_ratio", "gauge")):
+            nombre = f"braniac_cache_{campo}" + ("_total" if tipo == "counter" else "")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for cache, stats in sorted(caches.items()):
+                if campo in stats:
+                    lineas.append(f"{nombre}{_formato_etiquetas([('cache', cache)])} {stats[campo]}")
+
+        lineas.append("# TYPE braniac_inicio_segundos gauge")
+        lineas.append(f"braniac_inicio_segundos {self.inicio:.0f}")
+        return "\n".join(lineas) + "\n"
+
+    def volcar(self, ruta):
+        """Escribe el texto Prometheus en `ruta` (reemplazo atómico, apto para textfile collector)."""
+        temporal = f"{ruta}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(self.exportar_prometheus())
+        os.replace(temporal, ruta)
+
+
+METRICAS = RegistroMetricas()
+registrar_oyente(METRICAS.observar_span)
+
+# ==========================================
+# EXPORTACIÓN (HTTP /metrics Y FICHERO)
+# ==========================================
+
+# BRANIAC_METRICS_PORT=9108 sirve /metrics; BRANIAC_METRICS_FILE=ruta.prom vuelca
+# cada BRANIAC_METRICS_INTERVALO segundos. Sin variables no se arranca nada.
+METRICS_PORT = os.getenv("BRANIAC_METRICS_PORT")
+METRICS_FILE = os.getenv("BRANIAC_METRICS_FILE")
+METRICS_INTERVALO = float(os.getenv("BRANIAC_METRICS_INTERVALO", "15"))
+
+_EXPORTADOR_LOCK = threading.Lock()
+_EXPORTADOR_ACTIVO = False
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    registro = METRICAS
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        cuerpo = self.registro.exportar_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        logger.debug("metrics http: " + formato, *args)
+
+
+def _volcado_periodico(ruta, intervalo):
+    while True:
+        time.sleep(intervalo)
+        try:
+            METRICAS.volcar(ruta)
+        except OSError as e:
+            logger.warning("No se pudo volcar métricas en %s: %s", ruta, e)
+
+
+def iniciar_exportador(puerto=METRICS_PORT, ruta=METRICS_FILE, intervalo=METRICS_INTERVALO):
+    """
+    Arranca (una sola vez por proceso) el endpoint HTTP y/o el volcado a fichero.
+
+    Streamlit re-ejecuta el script en cada interacción, por eso la llamada
+    es idempotente. Devuelve True si hay algún exportador activo.
+    """
+    global _EXPORTADOR_ACTIVO
+    with _EXPORTADOR_LOCK:
+        if _EXPORTADOR_ACTIVO:
+            return True
+        if puerto:
+            try:
+                servidor = ThreadingHTTPServer(("0.0.0.0", int(puerto)), _ManejadorMetricas)
+                threading.Thread(target=servidor.serve_forever, name="braniac-metricas-http", daemon=True).start()
+                logger.info("📈 Métricas en http://0.0.0.0:%s/metrics", puerto)
+                _EXPORTADOR_ACTIVO = True
+            except OSError as e:
+                logger.warning("No se pudo abrir el puerto de métricas %s: %s", puerto, e)
+        if ruta:
+            threading.Thread(target=_volcado_periodico, args=(ruta, intervalo),
+                             name="braniac-metricas-fichero", daemon=True).start()
+            logger.info("📈 Métricas volcadas en %s cada %.0fs", ruta, intervalo)
+            _EXPORTADOR_ACTIVO = True
+        return _EXPORTADOR_ACTIVO
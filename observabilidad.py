@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import uuid
+import logging
+import contextvars
+from contextlib import contextmanager
+
+# ==========================================
+# LOGGING ESTRUCTURADO Y SPANS DE LATENCIA
+# ==========================================
+
+# Nivel y formato por entorno: BRANIAC_LOG_LEVEL=DEBUG muestra cada span,
+# BRANIAC_LOG_FORMAT=json emite una línea JSON por evento.
+LOG_LEVEL = os.getenv("BRANIAC_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("BRANIAC_LOG_FORMAT", "texto").lower()
+
+ID_PETICION = contextvars.ContextVar("braniac_id_peticion", default="-")
+_SPANS_PETICION = contextvars.ContextVar("braniac_spans_peticion", default=None)
+_OYENTES = []
+
+_CAMPOS_ESTANDAR = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+class _FiltroPeticion(logging.Filter):
+    def filter(self, record):
+        record.request_id = ID_PETICION.get()
+        return True
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record):
+        evento = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "mensaje": record.getMessage(),
+        }
+        evento.update({k: v for k, v in vars(record).items() if k not in _CAMPOS_ESTANDAR})
+        if record.exc_info:
+            evento["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+def obtener_logger(nombre="braniac"):
+    """Logger de la app; los hijos (braniac.tools, ...) heredan el handler."""
+    raiz = logging.getLogger("braniac")
+    if not raiz.handlers:
+        handler = logging.StreamHandler()
+        handler.addFilter(_FiltroPeticion())
+        if LOG_FORMAT == "json":
+            handler.setFormatter(FormatoJSON())
+        else:
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [req=%(request_id)s] %(message)s"))
+        raiz.addHandler(handler)
+        raiz.setLevel(LOG_LEVEL)
+        raiz.propagate = False
+    return logging.getLogger(nombre)
+
+
+logger = obtener_logger("braniac.spans")
+
+
+def nuevo_id_peticion():
+    return uuid.uuid4().hex[:12]
+
+
+def registrar_oyente(funcion):
+    """`funcion(nombre, duracion_s, error, atributos)` se llama al cerrar cada span."""
+    _OYENTES.append(funcion)
+
+
+@contextmanager
+def peticion(tipo="turno", id_peticion=None):
+    """
+    Abre una petición (turno de chat, llamada API...) con su request id.
+
+    Todos los spans dentro del contexto (también en hilos lanzados con
+    contextvars.copy_context) llevan ese id; al cerrar se emite una línea
+    INFO con la duración total y el desglose por etapa.
+    """
+    id_peticion = id_peticion or nuevo_id_peticion()
+    spans = []
+    token_id = ID_PETICION.set(id_peticion)
+    token_spans = _SPANS_PETICION.set(spans)
+    inicio = time.perf_counter()
+    try:
+        yield id_peticion
+    finally:
+        total_ms = (time.perf_counter() - inicio) * 1000
+        if logger.isEnabledFor(logging.INFO):
+            desglose = {}
+            for nombre, ms in spans:
+                desglose[nombre] = round(desglose.get(nombre, 0.0) + ms, 2)
+            logger.info(
+                "%s total=%.1fms %s", tipo, total_ms,
+                " ".join(f"{k}={v}ms" for k, v in desglose.items()),
+                extra={"tipo": tipo, "total_ms": round(total_ms, 2), "etapas": desglose},
+            )
+        _SPANS_PETICION.reset(token_spans)
+        ID_PETICION.reset(token_id)
+
+
+@contextmanager
+def span(nombre, **atributos):
+    """Mide una etapa; se registra en DEBUG y en el resumen de la petición."""
+    inicio = time.perf_counter()
+    error = None
+    try:
+        yield atributos
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        duracion = time.perf_counter() - inicio
+        spans = _SPANS_PETICION.get()
+        if spans is not None:
+            spans.append((nombre, duracion * 1000))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "span %s %.2fms%s", nombre, duracion * 1000, " ERROR" if error else "",
+                extra={"span": nombre, "duracion_ms": round(duracion * 1000, 3), "error": repr(error) if error else None, **atributos},
+            )
+        for oyente in _OYENTES:
+            oyente(nombre, duracion, error, atributos)
+
+
+def enviar_con_contexto(ejecutor, funcion, *args, **kwargs):
+    """executor.submit propagando request id y spans al hilo trabajador."""
+    return ejecutor.submit(contextvars.copy_context().run, funcion, *args, **kwargs)
@@ -0,0 +1,350 @@
+import re
+import json
+import wave
+import time
+from io import BytesIO
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+from tools import analyze_player_tool, lookup_database_tool, scenario_grid_tool, sensitivity_curve_tool
+from observabilidad import span, enviar_con_contexto
+from metricas import METRICAS
+
+# ==========================================
+# EJECUCIÓN DE HERRAMIENTAS (FUNCTION CALLING)
+# ==========================================
+
+MAX_WORKERS_TOOLS = 8
+TIMEOUT_TOOL = 90  # segundos por herramienta
+PUNTOS_SENSIBILIDAD_LLM = 10  # valores por curva: las curvas van enteras al contexto del modelo
+
+# Pool compartido por todas las sesiones; acota los hilos del proceso
+_EJECUTOR_TOOLS = ThreadPoolExecutor(max_workers=MAX_WORKERS_TOOLS, thread_name_prefix="braniac-tool")
+
+
+def ejecutar_herramienta(nombre, args, client_openai):
+    """Despacha una tool call del modelo a su función en tools.py."""
+    # --- CASO 1: ANÁLISIS DE JUGADOR (Predicción) ---
+    if nombre == "analyze_player_tool":
+        return analyze_player_tool(
+            player_name=args.get('player_name'),
+            birth_year=args.get('birth_year'),
+            client_openai=client_openai,
+            target_club=args.get('target_club'),
+            target_league=args.get('target_league')
+        )
+
+    # --- CASO 2: CONSULTA DE DATOS ---
+    if nombre == "lookup_database_tool":
+        return lookup_database_tool(
+            category=args.get('category'),
+            name=args.get('name'),
+            league=args.get('league'),
+            position=args.get('position'),
+            top_k=args.get('top_k', 5)
+        )
+
+    # --- CASO 3: MAPA DE ESCENARIOS (Club x Liga) ---
+    if nombre == "scenario_grid_tool":
+        return scenario_grid_tool(
+            player_name=args.get('player_name'),
+            birth_year=args.get('birth_year'),
+            top_n=args.get('top_n', 10)
+        )
+
+    # --- CASO 4: CURVAS DE SENSIBILIDAD (Masa, Impuestos, COV) ---
+    if nombre == "sensitivity_curve_tool":
+        return sensitivity_curve_tool(
+            player_name=args.get('player_name'),
+            birth_year=args.get('birth_year'),
+            rejillas=args.get('rejillas'),
+            puntos=args.get('puntos', PUNTOS_SENSIBILIDAD_LLM)
+        )
+
+    return {"error": f"Herramienta desconocida: {nombre}"}
+
+
+def _ejecutar_aislado(nombre, args, client_openai):
+    try:
+        with span("herramienta", herramienta=nombre):
+            return ejecutar_herramienta(nombre, args, client_openai)
+    except Exception as e:
+        return {"error": f"Error en {nombre}: {e}"}
+
+
+def ejecutar_tool_calls(tool_calls, client_openai, timeout=TIMEOUT_TOOL, al_lanzar=None):
+    """
+    Ejecuta en paralelo las tool calls de un mismo turno del modelo.
+
+    Devuelve los mensajes role="tool" en el mismo orden que `tool_calls`.
+    Cada llamada tiene su propio timeout (contado desde que se encola) y
+    sus errores quedan aislados en su propio resultado. `al_lanzar(nombre,
+    args)` se invoca en el hilo llamante antes de encolar cada una (p.ej.
+    para st.toast, que no puede usarse desde otros hilos).
+    """
+    pendientes = []
+    for tool_call in tool_calls:
+        nombre = tool_call.function.name
+        try:
+            args = json.loads(tool_call.function.arguments or "{}")
+        except json.JSONDecodeError as e:
+            pendientes.append((tool_call, None, None, {"error": f"Argumentos inválidos: {e}"}))
+            continue
+        if al_lanzar:
+            al_lanzar(nombre, args)
+        futuro = enviar_con_contexto(_EJECUTOR_TOOLS, _ejecutar_aislado, nombre, args, client_openai)
+        pendientes.append((tool_call, futuro, time.monotonic() + timeout, None))
+
+    mensajes = []
+    for tool_call, futuro, limite, resultado in pendientes:
+        if futuro is not None:
+            try:
+                resultado = futuro.result(timeout=max(0.0, limite - time.monotonic()))
+            except TimeoutError:
+                futuro.cancel()
+                resultado = {"error": f"Tiempo de espera agotado en {tool_call.function.name}."}
+        mensajes.append({
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "content": json.dumps(resultado)
+        })
+    return mensajes
+
+
+# ==========================================
+# PRIMERA LLAMADA EN STREAMING
+# ==========================================
+
+class PrimeraRespuesta:
+    """
+    Consume el stream de la primera llamada (con tools) sin bloquear.
+
+    `iniciar()` lee hasta el primer delta con texto o con tool call. Si
+    es texto, `textos()` lo sigue emitiendo tal cual llega (para
+    st.write_stream); los deltas de tool calls se acumulan por índice en
+    cualquier momento del stream. Así la charla normal sale en una sola
+    llamada y las herramientas sólo añaden la segunda.
+    """
+
+    def __init__(self, stream):
+        self._stream = iter(stream)
+        self._pendiente = []
+        self._terminado = False
+        self._acumulado = {}
+        self.texto = ""
+
+    def _siguiente_texto(self):
+        """Avanza el stream hasta el próximo fragmento de texto (o None al terminar)."""
+        for chunk in self._stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            for tc in (delta.tool_calls or []):
+                llamada = self._acumulado.setdefault(tc.index, {"id": None, "name": "", "arguments": ""})
+                if tc.id: llamada["id"] = tc.id
+                if tc.function:
+                    if tc.function.name: llamada["name"] += tc.function.name
+                    if tc.function.arguments: llamada["arguments"] += tc.function.arguments
+            if delta.content:
+                return delta.content
+            if self._acumulado and not self.texto and not self._pendiente:
+                # Primer delta de herramienta: ya sabemos que no hay charla directa
+                return ""
+        self._terminado = True
+        return None
+
+    def iniciar(self):
+        """Devuelve "texto", "herramientas" o "vacio" según el primer delta útil."""
+        fragmento = self._siguiente_texto()
+        if fragmento:
+            self._pendiente.append(fragmento)
+            return "texto"
+        if self._acumulado:
+            return "herramientas"
+        return "vacio"
+
+    def textos(self):
+        """Generador de fragmentos de texto (incluye los ya leídos en iniciar)."""
+        while self._pendiente:
+            fragmento = self._pendiente.pop(0)
+            self.texto += fragmento
+            yield fragmento
+        while not self._terminado:
+            fragmento = self._siguiente_texto()
+            if fragmento:
+                self.texto += fragmento
+                yield fragmento
+
+    def consumir(self):
+        """Lee el resto del stream (necesario para completar los argumentos)."""
+        for _ in self.textos():
+            pass
+
+    @property
+    def tool_calls(self):
+        self.consumir()
+        return [
+            SimpleNamespace(id=c["id"], type="function", function=SimpleNamespace(name=c["name"], arguments=c["arguments"]))
+            for _, c in sorted(self._acumulado.items())
+        ]
+
+    def mensaje_asistente(self):
+        """Mensaje role="assistant" con las tool calls, para la conversación."""
+        return {
+            "role": "assistant",
+            "content": self.texto or None,
+            "tool_calls": [
+                {"id": tc.id, "type": "function", "function": {"name": tc.function.name, "arguments": tc.function.arguments}}
+                for tc in self.tool_calls
+            ]
+        }
+
+
+# ==========================================
+# TTS EN PIPELINE POR FRASES
+# ==========================================
+
+MAX_WORKERS_TTS = 6
+TTS_SAMPLE_RATE = 24000  # formato "pcm" de la API: 24 kHz, 16 bits, mono
+TTS_MAX_CHARS = 4096     # límite de la API por petición
+
+_EJECUTOR_TTS = ThreadPoolExecutor(max_workers=MAX_WORKERS_TTS, thread_name_prefix="braniac-tts")
+_FIN_DE_FRASE = re.compile(r"(?<=[.!?…:])\s+|\n+")
+
+
+def _texto_de(fragmento):
+    """Texto de un fragmento de stream (str o ChatCompletionChunk)."""
+    if isinstance(fragmento, str):
+        return fragmento
+    choices = getattr(fragmento, "choices", None)
+    if choices:
+        return choices[0].delta.content or ""
+    return ""
+
+
+def pcm_a_wav(pcm, sample_rate=TTS_SAMPLE_RATE):
+    """Envuelve PCM 16-bit mono en un contenedor WAV reproducible por st.audio."""
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class TTSPipeline:
+    """
+    Síntesis de voz por frases solapada con el streaming del texto.
+
+    `envolver(stream)` deja pasar los fragmentos de texto (para
+    st.write_stream) y, cada vez que se completa una frase, encola su
+    síntesis en un pool acotado. La primera frase sale sola para que el
+    audio arranque cuanto antes; las siguientes se agrupan hasta
+    `chars_por_segmento`. Los segmentos se entregan en orden con
+    `entregar()` y cubren la respuesta completa (sin recorte a 4096);
+    el orden de reproducción lo garantiza la cola del cliente.
+    """
+
+    def __init__(self, client_openai, model, voice, chars_primer_segmento=20, chars_por_segmento=350):
+        self.client = client_openai
+        self.model = model
+        self.voice = voice
+        self.chars_primer_segmento = chars_primer_segmento
+        self.chars_por_segmento = chars_por_segmento
+        self._buffer = ""
+        self._frases = []
+        self._futuros = []
+        self._entregados = 0
+        self.errores = []
+
+    # --- Entrada de texto ---
+    def envolver(self, fragmentos, reproducir=None):
+        """
+        Generador que reemite el texto y alimenta la síntesis por frases.
+
+        Si se pasa `reproducir`, entre fragmento y fragmento se entregan los
+        segmentos de audio que ya estén listos.
+        """
+        try:
+            for fragmento in fragmentos:
+                texto = _texto_de(fragmento)
+                if texto:
+                    self.alimentar(texto)
+                    yield texto
+                if reproducir:
+                    self.entregar(reproducir)
+        finally:
+            self.cerrar()
+
+    def alimentar(self, texto):
+        self._buffer += texto
+        partes = _FIN_DE_FRASE.split(self._buffer)
+        # La última parte aún puede crecer: se queda en el buffer
+        self._buffer = partes.pop()
+        self._frases.extend(p.strip() for p in partes if p.strip())
+        minimo = self.chars_primer_segmento if not self._futuros else self.chars_por_segmento
+        if sum(len(f) + 1 for f in self._frases) >= minimo:
+            self._lanzar(" ".join(self._frases))
+            self._frases = []
+
+    def cerrar(self):
+        """Sintetiza lo que quede pendiente al terminar el stream."""
+        resto = " ".join(self._frases + [self._buffer.strip()]).strip()
+        self._frases, self._buffer = [], ""
+        if resto:
+            self._lanzar(resto)
+
+    def _lanzar(self, texto):
+        while texto:
+            if len(texto) <= TTS_MAX_CHARS:
+                trozo, texto = texto, ""
+            else:
+                corte = texto.rfind(" ", 0, TTS_MAX_CHARS)
+                corte = corte if corte > 0 else TTS_MAX_CHARS
+                trozo, texto = texto[:corte], texto[corte:].strip()
+            self._futuros.append(enviar_con_contexto(_EJECUTOR_TTS, self._sintetizar, trozo))
+
+    def _sintetizar(self, texto):
+        with span("tts_segmento", caracteres=len(texto)):
+            speech = self.client.audio.speech.create(
+                model=self.model,
+                voice=self.voice,
+                input=texto,
+                response_format="pcm"
+            )
+        METRICAS.incrementar("braniac_tts_caracteres_total", len(texto), modelo=self.model)
+        return speech.content
+
+    # --- Salida de audio ---
+    def entregar(self, reproducir, bloquear=False):
+        """
+        Pasa a `reproducir(wav_bytes)` los segmentos sintetizados, en orden.
+
+        No espera a que suenen: `reproducir` debe encolarlos en el cliente
+        (uno tras otro en el navegador). Sin bloquear, sólo entrega los que
+        ya están listos; con bloquear=True espera a que se sintetice el
+        último (latencia del TTS, no duración del audio).
+        """
+        while self._entregados < len(self._futuros):
+            futuro = self._futuros[self._entregados]
+            if not bloquear and not futuro.done():
+                return
+            try:
+                pcm = futuro.result()
+            except Exception as e:
+                self.errores.append(e)
+                pcm = b""
+            self._entregados += 1
+            if pcm:
+                reproducir(pcm_a_wav(pcm))
+
+    def audio_completo(self):
+        """WAV con todos los segmentos sintetizados (para el historial)."""
+        pcm = b""
+        for futuro in self._futuros:
+            try:
+                pcm += futuro.result()
+            except Exception:
+                continue
+        return pcm_a_wav(pcm) if pcm else None
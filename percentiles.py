@@ -0,0 +1,79 @@
+import numpy as np
+
+# ==========================================
+# PERCENTILES POR LIGA Y POSICIÓN
+# ==========================================
+
+METRICAS_PERCENTIL = ("GCA_P90", "SCA_P90", "Def_P90", "Attack_Efficiency_Ratio")
+
+
+class TablaPercentiles:
+    """
+    Arrays ordenados de cada métrica por (liga, posición) y por posición en
+    las cinco ligas (liga None).
+
+    Se construye con cada carga o recarga de datos. `percentil` es una
+    búsqueda binaria (searchsorted) sobre el grupo: exacto y O(log n). Con
+    empates cuenta la mitad de los iguales (rango medio), así un 0 muy
+    repetido no sale ni en el 0 ni en el 100.
+
+    Todos los grupos van seguidos en una matriz (métricas x filas) con un
+    puntero de inicio por grupo; `tablas()` / `desde_tablas()` la guardan
+    y reabren tal cual desde el paquete binario.
+    """
+
+    def __init__(self, almacen, ligas, metricas=METRICAS_PERCENTIL):
+        metricas = [m for m in metricas if m in almacen.col]
+        ligas = np.asarray(ligas, dtype=object)
+        posiciones = np.asarray(almacen.pos, dtype=object)
+        grupos, bloques = [], []
+        for posicion in np.unique(posiciones):
+            de_posicion = posiciones == posicion
+            subgrupos = [(None, de_posicion)] + [(liga, de_posicion & (ligas == liga)) for liga in np.unique(ligas[de_posicion])]
+            for liga, mascara in subgrupos:
+                grupos.append((liga, posicion))
+                bloques.append(np.sort(almacen.X[np.ix_(mascara, [almacen.col[m] for m in metricas])].astype(np.float64), axis=0).T)
+        puntero = np.zeros(len(grupos) + 1, dtype=np.int64)
+        puntero[1:] = np.cumsum([b.shape[1] for b in bloques])
+        valores = np.concatenate(bloques, axis=1) if bloques else np.empty((len(metricas), 0))
+        self._abrir(metricas, grupos, np.ascontiguousarray(valores), puntero)
+
+    @classmethod
+    def desde_tablas(cls, tablas, textos):
+        """Tabla sobre arrays ya construidos (los de `tablas()`)."""
+        tabla = cls.__new__(cls)
+        tabla._abrir(textos["metricas"], [tuple(g) for g in textos["grupos"]], tablas["valores"], tablas["puntero"])
+        return tabla
+
+    def _abrir(self, metricas, grupos, valores, puntero):
+        self.metricas = list(metricas)
+        self._fila_metrica = {m: i for i, m in enumerate(self.metricas)}
+        self._grupos = grupos
+        self._rango = {g: (int(puntero[i]), int(puntero[i + 1])) for i, g in enumerate(grupos)}
+        self._valores, self._puntero = valores, puntero
+
+    def tablas(self):
+        """(arrays, textos) que reconstruyen la tabla con desde_tablas."""
+        return ({"valores": self._valores, "puntero": self._puntero},
+                {"metricas": self.metricas, "grupos": [list(g) for g in self._grupos]})
+
+    def tamano(self, liga, posicion):
+        inicio, fin = self._rango.get((liga, posicion), (0, 0))
+        return fin - inicio
+
+    def percentil(self, metrica, valor, liga, posicion):
+        """Percentil (0-100) de `valor` dentro del grupo, o None si el grupo no existe."""
+        rango = self._rango.get((liga, posicion))
+        if rango is None or metrica not in self._fila_metrica:
+            return None
+        ordenado = self._valores[self._fila_metrica[metrica], rango[0]:rango[1]]
+        menores = np.searchsorted(ordenado, valor, side="left")
+        iguales = np.searchsorted(ordenado, valor, side="right") - menores
+        return 100.0 * (menores + 0.5 * iguales) / len(ordenado)
+
+    def percentiles(self, almacen, fila, liga, posicion):
+        """{métrica: percentil} de un jugador frente a su grupo."""
+        return {
+            m: round(self.percentil(m, almacen.valor(fila, m), liga, posicion), 1)
+            for m in self.metricas if self.tamano(liga, posicion)
+        }
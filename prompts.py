@@ -40,6 +40,15 @@ security_section = r"""
 **B. CONSULTAS SUELTAS (Tool: `lookup_database_tool`):**
 - Úsala SOLO si la pregunta es específica sobre un dato (ej. "¿Impuestos en España?").
 - NO la uses si la intención principal es analizar a un jugador.
+- Para justificar un salario con jugadores de perfil parecido usa `category="comparables"` (admite `league`, `position` y `top_k`).
+
+**B2. COMPARATIVA DE DESTINOS (Tool: `scenario_grid_tool`):**
+- Úsala cuando pregunten "¿dónde cobraría más?" o pidan comparar el salario del jugador en varios clubes/ligas.
+- Una sola llamada devuelve el ranking completo; NO llames a `analyze_player_tool` club por club.
+
+**B3. SENSIBILIDAD (Tool: `sensitivity_curve_tool`):**
+- Úsala cuando pregunten cómo cambiaría el salario si subieran o bajaran la masa salarial del club, los impuestos o el costo de vida (ej. "¿y si los impuestos bajaran al 30%?").
+- Para un valor concreto pásalo en `rejillas` (ej. `{"Tax_Rate": [0.30]}`); sin `rejillas` se varían los tres parámetros.
 
 **C. CERO TEXTO TÉCNICO:**
 - **NUNCA** escribas JSON o diccionarios en tu respuesta de texto (ej. `{"query":...}`). Si necesitas un dato, usa la herramienta silenciosamente.
@@ -74,7 +83,7 @@ Usa ESTRICTAMENTE este formato visual:
 * **Creación de Tiro (SCA90):** [SCA90]
 * **Acciones Defensivas (Def90):** [Def_P90]
 * **Eficiencia Ofensiva:** [Eficiencia]
-*(Aquí añade una breve frase interpretando si estos números son altos o bajos para su posición, de manera muy resumida y si un dato es cero da por hecho que no es el fuerte del jugador).*
+*(Aquí añade una breve frase interpretando si estos números son altos o bajos para su posición usando [percentiles_en_liga] y [percentiles_5_ligas] (percentil 0-100 frente a [grupo_liga]), de manera muy resumida y si un dato es cero da por hecho que no es el fuerte del jugador).*
 ---
 ### 3. 💰 VEREDICTO SALARIAL (Neto Anual)
 > 🎯 **Rango Recomendado:** [recommended_salary_range]
@@ -85,6 +94,7 @@ Usa ESTRICTAMENTE este formato visual:
 [Aquí escribe tu análisis experto(pero de manera muy resumida por favor). Conecta los puntos:
 - Si el rango es alto, menciona que el club tiene poder financiero.
 - Si los impuestos son altos, explica que eso afecta el neto.
+- Apóyate en [factores_clave] y [efecto_por_grupo_pct] (efecto % de cada factor sobre el bruto) para explicar qué pesa más en la cifra: club, liga y fiscalidad, rendimiento o edad. No inventes factores que no estén ahí.
 - Da una recomendación final: ¿Debería aceptar? ¿Pedir más?]
 ---
 **¿Te gustaría realizar otra valoración, simular un fichaje en otro país o consultar datos de rendimiento de algún jugador?**"
@@ -105,8 +115,17 @@ Usa ESTRICTAMENTE este formato visual (Solo las métricas):
     - **Ratio Salarial (Wage/Club):** [Wage/Club Ratio]
 
     📝 **Resumen de Desempeño:**
-    [Aquí escribe un párrafo de 2-3 líneas interpretando los números de arriba.
+    [Aquí escribe un párrafo de 2-3 líneas interpretando los números de arriba con sus percentiles ([percentiles_en_liga] frente a [grupo_liga]; [percentiles_5_ligas] frente a [grupo_5_ligas]). No inventes comparaciones que no estén en esos datos.
 ¿Quieres seguir consultando datos de rendimiento o prefieres hacer una valoración salarial?"
+O, para `comparables`, una tabla Markdown con Jugador, Equipo, Liga, Edad, GCA90, SCA90 y Neto estimado ([neto_central_real]) y 1-2 líneas situando al jugador frente a ellos.
+
+
+**CASO 3: Si usaste `scenario_grid_tool` (Comparativa de destinos):**
+Presenta una tabla Markdown con Posición, Club, Liga y Rango Neto ([neto_min_real] - [neto_max_real]) y cierra con 1-2 líneas destacando el mejor destino.
+
+
+**CASO 4: Si usaste `sensitivity_curve_tool` (Sensibilidad):**
+Parte de los valores de [actual] y resume en una tabla Markdown corta, por parámetro, unos pocos valores representativos de [curvas] con su Bruto y Rango Neto ([neto_min] - [neto_max]). Cierra con 1-2 líneas sobre qué parámetro mueve más el neto.
 """
 
 # ============================================
@@ -0,0 +1,141 @@
+"""
+Recarga en caliente de los ficheros de datos.
+
+Un hilo vigila (os.stat) los ficheros de datos y, cuando alguno cambia y
+se queda estable, llama a `al_cambiar(rutas_cambiadas)` desde ese mismo
+hilo. Quien recarga construye la nueva foto aparte y la publica de golpe
+(GestorRecursos.reemplazar), así que las predicciones en curso terminan
+con la foto anterior sin esperar a nadie.
+
+Para el CSV de jugadores, `diferencia_csv` compara línea a línea con la
+versión anterior y devuelve sólo las filas nuevas o modificadas, que son
+las únicas que hay que parsear y volver a predecir.
+"""
+import threading
+from collections import defaultdict, deque
+
+import numpy as np
+
+from cache import huella_archivos
+from observabilidad import obtener_logger
+
+logger = obtener_logger("braniac.recarga")
+
+# ==========================================
+# VIGILANTE DE FICHEROS
+# ==========================================
+
+class VigilanteArchivos:
+    """
+    Sondea `rutas` cada `intervalo_s` segundos.
+
+    `referencia()` devuelve {ruta: huella} de lo cargado ahora mismo (o
+    None si aún no hay nada cargado). Un cambio se notifica cuando la
+    huella en disco difiere de la referencia y es la misma en dos sondeos
+    seguidos: no se recarga un fichero a medio escribir.
+    """
+
+    def __init__(self, rutas, referencia, al_cambiar, intervalo_s=5.0, nombre="vigilante"):
+        self.rutas = list(rutas)
+        self.referencia = referencia
+        self.al_cambiar = al_cambiar
+        self.intervalo_s = intervalo_s
+        self._parar = threading.Event()
+        self._pendiente = None
+        self._fallida = None
+        self.recargas = 0
+        self.errores = 0
+        self._hilo = threading.Thread(target=self._bucle, name=f"braniac-{nombre}", daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+
+    def comprobar(self):
+        """Un sondeo; devuelve las rutas recargadas (vacío si no hubo cambio)."""
+        referencia = self.referencia()
+        if referencia is None:
+            return []
+        actual = {ruta: huella_archivos([ruta]) for ruta in self.rutas}
+        cambiadas = sorted(r for r in self.rutas if actual[r] != referencia.get(r))
+        if not cambiadas or actual == self._fallida:
+            self._pendiente = None
+            return []
+        if actual != self._pendiente:
+            # Primer sondeo con cambios: esperar al siguiente para confirmar que está estable
+            self._pendiente = actual
+            return []
+        self._pendiente = None
+        try:
+            self.al_cambiar(cambiadas)
+            self.recargas += 1
+            self._fallida = None
+        except Exception as e:
+            # No reintentar hasta que los ficheros vuelvan a cambiar
+            self.errores += 1
+            self._fallida = actual
+            logger.exception("❌ Recarga fallida (%s): %s", ", ".join(cambiadas), e)
+            return []
+        return cambiadas
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo_s):
+            try:
+                self.comprobar()
+            except Exception as e:
+                logger.warning("⚠️ Vigilante: %s", e)
+
+# ==========================================
+# DIFERENCIAS DEL CSV POR FILAS
+# ==========================================
+
+def lineas_csv(ruta):
+    """(cabecera, filas) en bytes crudos, sin líneas vacías (como pandas)."""
+    with open(ruta, "rb") as f:
+        lineas = [l for l in f.read().splitlines() if l.strip()]
+    return (lineas[0], lineas[1:]) if lineas else (b"", [])
+
+
+def huellas_lineas(filas):
+    # hash() de Python: sólo comparable dentro del mismo proceso, que es lo que hace falta
+    return np.fromiter((hash(l) for l in filas), dtype=np.int64, count=len(filas))
+
+
+def diferencia_csv(ruta, cabecera_previa, huellas_previas):
+    """
+    Compara el CSV en disco con la versión anterior fila a fila.
+
+    Devuelve (cabecera, huellas, origen, nuevas) donde `origen[k]` es el id
+    de la fila k en la versión anterior, o -1 si es nueva o ha cambiado,
+    y `nuevas` son las líneas crudas de esas filas -1, en orden. None si
+    cambió la cabecera (hay que releer entero).
+    """
+    cabecera, filas = lineas_csv(ruta)
+    if cabecera != cabecera_previa:
+        return None
+    previas = defaultdict(deque)
+    for fila, h in enumerate(huellas_previas.tolist()):
+        previas[h].append(fila)
+    huellas = huellas_lineas(filas)
+    origen = np.full(len(filas), -1, dtype=np.int64)
+    nuevas = []
+    for k, h in enumerate(huellas.tolist()):
+        cola = previas.get(h)
+        if cola:
+            origen[k] = cola.popleft()
+        else:
+            nuevas.append(filas[k])
+    return cabecera, huellas, origen, nuevas
+
+
+def fusionar_filas(anterior, origen, nuevas):
+    """Array con las filas de `anterior` según `origen` y `nuevas` en los huecos (-1)."""
+    anterior = np.asarray(anterior)
+    resultado = np.empty((len(origen),) + anterior.shape[1:], dtype=anterior.dtype)
+    reusadas = origen >= 0
+    resultado[reusadas] = anterior[origen[reusadas]]
+    resultado[~reusadas] = nuevas
+    return resultado
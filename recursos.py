@@ -0,0 +1,175 @@
+"""
+Recursos compartidos por todo el proceso: artefactos del modelo y cliente OpenAI.
+
+Los artefactos (booster, almacén de jugadores, referencias) se cargan la
+primera vez que alguien los pide, una sola vez aunque lleguen varias
+sesiones a la vez, y todas las sesiones de Streamlit y los hilos de la API
+comparten la misma foto. `precalentar()` lanza esa carga en segundo plano
+al arrancar para que no la pague la primera petición.
+"""
+import os
+import time
+import threading
+
+from observabilidad import obtener_logger, span
+
+logger = obtener_logger("braniac.recursos")
+
+
+class ErrorRecursos(Exception):
+    pass
+
+# ==========================================
+# CARGA PEREZOSA Y ÚNICA POR PROCESO
+# ==========================================
+
+class GestorRecursos:
+    """
+    Carga perezosa de `cargador()` compartida por todos los hilos.
+
+    La primera llamada a `obtener()` ejecuta el cargador bajo un lock; las
+    concurrentes esperan a esa misma carga en vez de repetirla. Si falla,
+    el error se recuerda y se relanza como ErrorRecursos durante
+    `reintento_s` segundos; después se vuelve a intentar.
+    """
+
+    def __init__(self, cargador, nombre="recursos", reintento_s=30.0):
+        self.cargador = cargador
+        self.nombre = nombre
+        self.reintento_s = reintento_s
+        self._lock = threading.Lock()
+        self._valor = None
+        self._error = None
+        self._fallo_en = 0.0
+        self._cargando = False
+        self._segundos_carga = None
+        self._hilo = None
+        self.recargas = 0
+
+    def obtener(self):
+        valor = self._valor
+        if valor is not None:
+            return valor
+        with self._lock:
+            if self._valor is not None:
+                return self._valor
+            if self._error is not None and time.monotonic() - self._fallo_en < self.reintento_s:
+                raise ErrorRecursos(str(self._error))
+            self._cargando = True
+            inicio = time.perf_counter()
+            try:
+                with span(f"carga_{self.nombre}"):
+                    self._valor = self.cargador()
+                self._error = None
+                self._segundos_carga = time.perf_counter() - inicio
+                logger.info("✅ %s cargado en %.2fs", self.nombre, self._segundos_carga)
+            except Exception as e:
+                self._error, self._fallo_en = e, time.monotonic()
+                logger.exception("❌ Error cargando %s: %s", self.nombre, e)
+                raise ErrorRecursos(str(e)) from e
+            finally:
+                self._cargando = False
+            return self._valor
+
+    def reemplazar(self, valor):
+        """Publica una foto nueva de golpe; quien ya tiene la anterior termina con ella."""
+        with self._lock:
+            self._valor = valor
+            self._error = None
+            self.recargas += 1
+
+    def disponible(self):
+        """La foto ya cargada, o None sin disparar la carga."""
+        return self._valor
+
+    def precalentar(self):
+        """Carga en un hilo de fondo (idempotente); devuelve el hilo."""
+        with self._lock:
+            if self._valor is not None or (self._hilo is not None and self._hilo.is_alive()):
+                return self._hilo
+            self._hilo = threading.Thread(target=self._precalentar, name=f"braniac-precalentar-{self.nombre}", daemon=True)
+            self._cargando = True
+            self._hilo.start()
+            return self._hilo
+
+    def _precalentar(self):
+        try:
+            self.obtener()
+        except ErrorRecursos:
+            pass  # ya registrado; salud() lo informa
+
+    def salud(self):
+        """Estado para sondas de readiness: frio | cargando | listo | error."""
+        if self._valor is not None:
+            estado = "listo"
+        elif self._cargando:
+            estado = "cargando"
+        elif self._error is not None:
+            estado = "error"
+        else:
+            estado = "frio"
+        return {
+            "estado": estado,
+            "listo": estado == "listo",
+            "error": str(self._error) if self._error is not None and estado != "listo" else None,
+            "segundos_carga": round(self._segundos_carga, 3) if self._segundos_carga is not None else None,
+            "recargas": self.recargas,
+        }
+
+# ==========================================
+# CLIENTE OPENAI COMPARTIDO (KEEP-ALIVE)
+# ==========================================
+
+OPENAI_MAX_CONEXIONES = int(os.getenv("BRANIAC_OPENAI_MAX_CONEXIONES", "32"))
+OPENAI_KEEPALIVE = int(os.getenv("BRANIAC_OPENAI_KEEPALIVE", "16"))
+OPENAI_KEEPALIVE_S = float(os.getenv("BRANIAC_OPENAI_KEEPALIVE_S", "120"))
+OPENAI_TIMEOUT_S = float(os.getenv("BRANIAC_OPENAI_TIMEOUT_S", "60"))
+OPENAI_REINTENTOS = int(os.getenv("BRANIAC_OPENAI_REINTENTOS", "2"))
+
+_CLIENTE_OPENAI = None
+_LOCK_CLIENTE = threading.Lock()
+
+
+def _cliente_http():
+    """Pool httpx con conexiones keep-alive, o None para usar el del SDK."""
+    from openai import DefaultHttpxClient
+    try:
+        import httpx
+    except ImportError:
+        try:
+            import httpx2 as httpx  # versiones del SDK basadas en httpx2
+        except ImportError:
+            return None
+    return DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONEXIONES,
+            max_keepalive_connections=OPENAI_KEEPALIVE,
+            keepalive_expiry=OPENAI_KEEPALIVE_S,
+        ),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT_S, connect=5.0),
+    )
+
+
+def cliente_openai():
+    """
+    Cliente OpenAI único por proceso (o None si no hay OPENAI_API_KEY).
+
+    Todas las sesiones reutilizan el mismo pool de conexiones, así que los
+    turnos siguientes no repiten el handshake TLS.
+    """
+    global _CLIENTE_OPENAI
+    if _CLIENTE_OPENAI is not None:
+        return _CLIENTE_OPENAI
+    with _LOCK_CLIENTE:
+        if _CLIENTE_OPENAI is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                return None
+            from openai import OpenAI
+            try:
+                _CLIENTE_OPENAI = OpenAI(api_key=api_key, http_client=_cliente_http(),
+                                         max_retries=OPENAI_REINTENTOS)
+            except Exception as e:
+                logger.warning("⚠️ Cliente OpenAI no disponible: %s", e)
+                return None
+        return _CLIENTE_OPENAI
@@ -0,0 +1,351 @@
+"""
+API HTTP de valoración sin Streamlit (para el CRM y otros clientes).
+
+Arranque:
+    python servicio.py                       # BRANIAC_API_HOST / BRANIAC_API_PORT / BRANIAC_API_PROCESOS
+    uvicorn servicio:app --workers 4         # equivalente con uvicorn directamente
+
+Cada proceso carga el modelo una vez, en segundo plano al arrancar; /salud
+responde 503 hasta que está listo (sonda de readiness). El trabajo del
+booster va a un pool de hilos acotado y las llamadas al LLM están
+limitadas por un semáforo, de modo que una ráfaga de análisis no bloquea
+las predicciones puras.
+"""
+import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+import tools
+from tools import (
+    analyze_player_tool, lookup_database_tool, scenario_grid_tool, sensitivity_curve_tool, obtener_reporte,
+    predecir_salario_id, predecir_salarios_lote, explicar_valoracion, explicar_salarios_lote,
+    _buscar_jugador, version_datos, precalentar,
+)
+from recursos import cliente_openai
+from observabilidad import obtener_logger, peticion, span, enviar_con_contexto
+from metricas import METRICAS
+
+logger = obtener_logger("braniac.servicio")
+
+# ==========================================
+# CONFIGURACIÓN
+# ==========================================
+
+load_dotenv(override=True)
+
+WORKERS_BOOSTER = int(os.getenv("BRANIAC_WORKERS_BOOSTER", str(min(8, os.cpu_count() or 2))))
+MAX_LLM_CONCURRENTES = int(os.getenv("BRANIAC_MAX_LLM", "8"))
+ESPERA_LLM = float(os.getenv("BRANIAC_ESPERA_LLM", "30"))  # segundos en cola antes de responder 503
+MAX_LOTE = int(os.getenv("BRANIAC_MAX_LOTE", "1000"))
+
+# Errores de tools que indican que el servicio no está listo (sin foto cargada
+# o recarga fallida): 503 para que el balanceador reintente en otra réplica
+ERRORES_NO_DISPONIBLE = {
+    "Modelo no cargado.", "Base de datos no disponible.",
+    "Datos de clubes o ligas no disponibles.", "Motor de comparables no disponible.",
+}
+
+_EJECUTOR_BOOSTER = ThreadPoolExecutor(max_workers=WORKERS_BOOSTER, thread_name_prefix="braniac-api")
+_EJECUTOR_LLM = ThreadPoolExecutor(max_workers=MAX_LLM_CONCURRENTES, thread_name_prefix="braniac-api-llm")
+
+CLIENT_OPENAI = cliente_openai()
+
+
+class ErrorPeticion(Exception):
+    def __init__(self, mensaje, estado=400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+async def _en_hilo(ejecutor, funcion, *args):
+    """Ejecuta `funcion` en el pool conservando request id y spans."""
+    return await asyncio.wrap_future(enviar_con_contexto(ejecutor, funcion, *args))
+
+
+async def _leer_json(request):
+    try:
+        cuerpo = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ErrorPeticion("Cuerpo JSON inválido.")
+    if not isinstance(cuerpo, dict):
+        raise ErrorPeticion("Se esperaba un objeto JSON.")
+    return cuerpo
+
+
+def _lista(cuerpo, campo):
+    elementos = cuerpo.get(campo)
+    if not isinstance(elementos, list) or not elementos:
+        raise ErrorPeticion(f"'{campo}' debe ser una lista no vacía.")
+    if len(elementos) > MAX_LOTE:
+        raise ErrorPeticion(f"Máximo {MAX_LOTE} elementos por lote.", 413)
+    if not all(isinstance(e, dict) for e in elementos):
+        raise ErrorPeticion(f"Cada elemento de '{campo}' debe ser un objeto.")
+    return elementos
+
+
+def _entero(cuerpo, campo, por_defecto, minimo=1):
+    """Campo entero opcional (>= minimo); un valor mal formado es un 400, no un 500."""
+    valor = cuerpo.get(campo)
+    if valor is None:
+        return por_defecto
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    if isinstance(valor, bool) or not isinstance(valor, int) or valor < minimo:
+        raise ErrorPeticion(f"'{campo}' debe ser un entero >= {minimo}.")
+    return valor
+
+
+def _texto(cuerpo, campo, por_defecto=None):
+    """Campo de texto opcional; un número, lista u objeto es un 400, no un 500."""
+    valor = cuerpo.get(campo)
+    if valor is None:
+        return por_defecto
+    if not isinstance(valor, str):
+        raise ErrorPeticion(f"'{campo}' debe ser un texto.")
+    return valor
+
+
+def endpoint(nombre):
+    """Envuelve un handler: request id, span de latencia y errores como JSON."""
+    def decorador(handler):
+        async def envoltorio(request):
+            with peticion(f"api_{nombre}") as id_peticion:
+                try:
+                    with span(f"api_{nombre}"):
+                        estado, cuerpo = await handler(request)
+                except ErrorPeticion as e:
+                    estado, cuerpo = e.estado, {"error": str(e)}
+                except Exception as e:
+                    logger.exception("Error no controlado en %s", nombre)
+                    estado, cuerpo = 500, {"error": f"Error interno: {e}"}
+            return JSONResponse(cuerpo, status_code=estado, headers={"X-Request-Id": id_peticion})
+        return envoltorio
+    return decorador
+
+# ==========================================
+# LÓGICA POR ELEMENTO (EN HILOS)
+# ==========================================
+
+def _predecir(solicitud):
+    # Una foto por petición: los ids de fila sólo valen en la foto que los resolvió
+    r = tools._recursos()
+    fila = _buscar_jugador(r, solicitud.get("player_name") or "", solicitud.get("birth_year"))
+    if isinstance(fila, dict): return fila
+    res = predecir_salario_id(r, fila, solicitud.get("target_club"), solicitud.get("target_league"))
+    res = {"jugador": r.almacen.player[fila], "club_actual": r.almacen.club[fila], **res}
+    if solicitud.get("explicar") and "error" not in res:
+        res["explicacion"] = explicar_valoracion(r, fila, solicitud.get("target_club"), solicitud.get("target_league"))
+    return res
+
+
+def _predecir_lote(solicitudes):
+    """Resuelve nombres y hace una sola predicción del booster para todo el lote."""
+    r = tools._recursos()
+    filas = [_buscar_jugador(r, s.get("player_name") or "", s.get("birth_year")) for s in solicitudes]
+    validos = [k for k, f in enumerate(filas) if not isinstance(f, dict)]
+    resultados = list(filas)
+    lote = [(filas[k], solicitudes[k].get("target_club"), solicitudes[k].get("target_league")) for k in validos]
+    predicciones = predecir_salarios_lote(r, lote)
+    # Explicaciones sólo de las que las piden, también en una sola llamada
+    con_explicacion = [j for j, k in enumerate(validos) if solicitudes[k].get("explicar")]
+    explicaciones = dict(zip(con_explicacion, explicar_salarios_lote(r, [lote[j] for j in con_explicacion])))
+    for j, (k, res) in enumerate(zip(validos, predicciones)):
+        fila = filas[k]
+        resultados[k] = res if "error" in res else {
+            "jugador": r.almacen.player[fila], "club_actual": r.almacen.club[fila], **res
+        }
+        if j in explicaciones and "error" not in res: resultados[k]["explicacion"] = explicaciones[j]
+    return resultados
+
+
+def _solicitud_valida(solicitud):
+    """Copia de la solicitud con nombre y destinos validados (en el hilo del event loop)."""
+    return dict(solicitud, **{campo: _texto(solicitud, campo) for campo in ("player_name", "target_club", "target_league")})
+
+
+def _consulta_valida(consulta):
+    """Copia de la consulta con top_k y textos validados (en el hilo del event loop)."""
+    return dict(consulta, top_k=_entero(consulta, "top_k", 5),
+                **{campo: _texto(consulta, campo) for campo in ("category", "name", "league", "position")})
+
+
+def _consultar(consulta):
+    return lookup_database_tool(
+        consulta.get("category"), consulta.get("name") or "",
+        consulta.get("league"), consulta.get("position"), consulta["top_k"],
+    )
+
+
+def _analizar(solicitud, client_openai):
+    return analyze_player_tool(
+        player_name=solicitud.get("player_name") or "",
+        client_openai=client_openai,
+        target_club=solicitud.get("target_club"),
+        target_league=solicitud.get("target_league"),
+        birth_year=solicitud.get("birth_year"),
+        reporte_async=bool(solicitud.get("reporte_async")),
+    )
+
+
+async def _analizar_limitado(app, solicitud):
+    """Análisis con el semáforo de LLM: como mucho MAX_LLM_CONCURRENTES a la vez."""
+    if CLIENT_OPENAI is None:
+        raise ErrorPeticion("OPENAI_API_KEY no configurada: análisis no disponible.", 503)
+    try:
+        await asyncio.wait_for(app.state.semaforo_llm.acquire(), timeout=ESPERA_LLM)
+    except asyncio.TimeoutError:
+        raise ErrorPeticion("Demasiados análisis en curso, reintenta más tarde.", 503)
+    try:
+        return await _en_hilo(_EJECUTOR_LLM, _analizar, solicitud, CLIENT_OPENAI)
+    finally:
+        app.state.semaforo_llm.release()
+
+
+def _estado(res):
+    if "error" not in res: return 200
+    return 503 if res["error"] in ERRORES_NO_DISPONIBLE else 404
+
+
+def _estado_lote(resultados):
+    """200 salvo que todo el lote falle porque el servicio no está listo (503)."""
+    no_disponible = all(r.get("error") in ERRORES_NO_DISPONIBLE for r in resultados)
+    return 503 if resultados and no_disponible else 200
+
+# ==========================================
+# ENDPOINTS
+# ==========================================
+
+@endpoint("salud")
+async def salud(request):
+    recursos = tools.salud()
+    return (200 if recursos["listo"] else 503), {
+        "estado": "ok" if recursos["listo"] else recursos["estado"],
+        "recursos": recursos,
+        "jugadores": recursos.get("jugadores", 0),
+        "version_datos": version_datos(),
+        "llm": CLIENT_OPENAI is not None,
+        "workers_booster": WORKERS_BOOSTER,
+        "max_llm_concurrentes": MAX_LLM_CONCURRENTES,
+    }
+
+
+@endpoint("prediccion")
+async def prediccion(request):
+    res = await _en_hilo(_EJECUTOR_BOOSTER, _predecir, _solicitud_valida(await _leer_json(request)))
+    return _estado(res), res
+
+
+@endpoint("prediccion_lote")
+async def prediccion_lote(request):
+    solicitudes = [_solicitud_valida(s) for s in _lista(await _leer_json(request), "solicitudes")]
+    resultados = await _en_hilo(_EJECUTOR_BOOSTER, _predecir_lote, solicitudes)
+    return _estado_lote(resultados), {"resultados": resultados}
+
+
+@endpoint("escenarios")
+async def escenarios(request):
+    cuerpo = await _leer_json(request)
+    res = await _en_hilo(_EJECUTOR_BOOSTER, scenario_grid_tool,
+                         _texto(cuerpo, "player_name", ""), cuerpo.get("birth_year"), _entero(cuerpo, "top_n", 10))
+    return _estado(res), res
+
+
+@endpoint("sensibilidad")
+async def sensibilidad(request):
+    cuerpo = await _leer_json(request)
+    rejillas = cuerpo.get("rejillas")
+    if rejillas is not None and not isinstance(rejillas, dict):
+        raise ErrorPeticion("'rejillas' debe ser un objeto {parámetro: valores | {min, max, puntos}}.")
+    res = await _en_hilo(_EJECUTOR_BOOSTER, sensitivity_curve_tool,
+                         _texto(cuerpo, "player_name", ""), cuerpo.get("birth_year"), rejillas,
+                         _entero(cuerpo, "puntos", tools.PUNTOS_SENSIBILIDAD))
+    return _estado(res), res
+
+
+@endpoint("lookup")
+async def lookup(request):
+    consulta = _consulta_valida(await _leer_json(request))
+    res = await _en_hilo(_EJECUTOR_BOOSTER, _consultar, consulta)
+    return _estado(res), res
+
+
+@endpoint("lookup_lote")
+async def lookup_lote(request):
+    consultas = [_consulta_valida(c) for c in _lista(await _leer_json(request), "consultas")]
+    lote = lambda: [_consultar(c) for c in consultas]
+    resultados = await _en_hilo(_EJECUTOR_BOOSTER, lote)
+    return _estado_lote(resultados), {"resultados": resultados}
+
+
+@endpoint("analisis")
+async def analisis(request):
+    res = await _analizar_limitado(request.app, _solicitud_valida(await _leer_json(request)))
+    return _estado(res), res
+
+
+@endpoint("analisis_lote")
+async def analisis_lote(request):
+    solicitudes = [_solicitud_valida(s) for s in _lista(await _leer_json(request), "solicitudes")]
+    resultados = await asyncio.gather(
+        *(_analizar_limitado(request.app, s) for s in solicitudes), return_exceptions=True
+    )
+    return 200, {"resultados": [
+        {"error": str(r)} if isinstance(r, Exception) else r for r in resultados
+    ]}
+
+
+@endpoint("reporte")
+async def reporte(request):
+    res = await _en_hilo(_EJECUTOR_BOOSTER, obtener_reporte, request.path_params["reporte_id"], 0)
+    if res.get("reporte_estado") == "pendiente": return 202, res
+    return _estado(res), res
+
+
+async def metrics(request):
+    return PlainTextResponse(METRICAS.exportar_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@asynccontextmanager
+async def _ciclo_vida(app):
+    # El semáforo se crea dentro del event loop del servidor
+    app.state.semaforo_llm = asyncio.Semaphore(MAX_LLM_CONCURRENTES)
+    precalentar()
+    logger.info("🚀 API Braniac lista (booster=%s hilos, LLM=%s concurrentes)", WORKERS_BOOSTER, MAX_LLM_CONCURRENTES)
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/salud", salud, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/v1/prediccion", prediccion, methods=["POST"]),
+        Route("/v1/prediccion/lote", prediccion_lote, methods=["POST"]),
+        Route("/v1/escenarios", escenarios, methods=["POST"]),
+        Route("/v1/sensibilidad", sensibilidad, methods=["POST"]),
+        Route("/v1/lookup", lookup, methods=["POST"]),
+        Route("/v1/lookup/lote", lookup_lote, methods=["POST"]),
+        Route("/v1/analisis", analisis, methods=["POST"]),
+        Route("/v1/analisis/lote", analisis_lote, methods=["POST"]),
+        Route("/v1/reportes/{reporte_id}", reporte, methods=["GET"]),
+    ],
+    lifespan=_ciclo_vida,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    procesos = int(os.getenv("BRANIAC_API_PROCESOS", "1"))
+    uvicorn.run(
+        "servicio:app" if procesos > 1 else app,
+        host=os.getenv("BRANIAC_API_HOST", "0.0.0.0"),
+        port=int(os.getenv("BRANIAC_API_PORT", "8000")),
+        workers=procesos,
+        log_level="warning",
+    )
@@ -1,13 +1,27 @@
 import pandas as pd
 import numpy as np
-import xgboost as xgb
-import json
 import os
+import io
+import json
 import unicodedata
-import difflib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
-from openai import OpenAI
 from pydantic import BaseModel, Field
+from indices import IndiceJugadores, ResolverEntidades
+from almacen import AlmacenJugadores
+from artefactos import Paquete, cargar_artefactos, escribir_paquete, leer_jugadores_csv
+from cache import CacheLRU, CacheReportes, huella_archivos, huella_contenido
+from coalescedor import CoalescedorPredicciones
+from valoraciones import TablaValoraciones
+from derivadas import MotorDerivadas, VERSION_DERIVADAS
+from comparables import MotorComparables, FEATURES_COMPARABLES
+from percentiles import TablaPercentiles, METRICAS_PERCENTIL
+from explicaciones import Explicador, guardar_contribuciones, cargar_contribuciones
+from observabilidad import obtener_logger, span, enviar_con_contexto
+from metricas import METRICAS
+from recursos import GestorRecursos, ErrorRecursos
+from recarga import VigilanteArchivos, lineas_csv, huellas_lineas, diferencia_csv, fusionar_filas
 
 # ==========================================
 # 0. UTILIDADES DE TEXTO
@@ -18,58 +32,372 @@ def normalizar_texto(texto):
     texto = texto.replace("Ø", "O").replace("ø", "o")
     return unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('utf-8').lower()
 
-def encontrar_coincidencia_difusa(nombre, lista_opciones, umbral=0.6):
-    """Encuentra el nombre más parecido en una lista."""
-    nombre_norm = normalizar_texto(nombre)
-    opciones_norm = [normalizar_texto(x) for x in lista_opciones]
-    
-    coincidencias = difflib.get_close_matches(nombre_norm, opciones_norm, n=1, cutoff=umbral)
-    
-    if coincidencias:
-        idx = opciones_norm.index(coincidencias[0])
-        return lista_opciones[idx]
-    return None
+# Alias de país -> liga aceptados en target_league / lookup
+MAPA_PAISES = {
+    'españa': 'La Liga', 'spain': 'La Liga', 'es': 'La Liga',
+    'inglaterra': 'Premier League', 'england': 'Premier League', 'uk': 'Premier League', 'premier': 'Premier League',
+    'italia': 'Serie A', 'italy': 'Serie A',
+    'alemania': 'Bundesliga', 'germany': 'Bundesliga',
+    'francia': 'Ligue 1', 'france': 'Ligue 1'
+}
+
+# Apodos habituales -> clave de club_finance
+ALIAS_CLUBES = {
+    'man city': 'manchester city', 'man utd': 'manchester utd', 'manchester united': 'manchester utd',
+    'man united': 'manchester utd', 'newcastle': 'newcastle utd', 'nottingham forest': "nott'ham forest",
+    'spurs': 'tottenham', 'tottenham hotspur': 'tottenham', 'west ham united': 'west ham',
+    'forest': "nott'ham forest", 'palace': 'crystal palace',
+    'wolverhampton': 'wolves', 'leeds': 'leeds united',
+    'barca': 'barcelona', 'atleti': 'atlético madrid', 'atletico de madrid': 'atlético madrid',
+    'athletic bilbao': 'athletic club', 'real betis': 'betis', 'celta': 'celta vigo',
+    'juve': 'juventus', 'inter milan': 'inter', 'internazionale': 'inter', 'ac milan': 'milan', 'verona': 'hellas verona',
+    'psg': 'paris s-g', 'paris saint-germain': 'paris s-g', 'paris saint germain': 'paris s-g',
+    'olympique de marseille': 'marseille', 'olympique lyonnais': 'lyon',
+    'bayern': 'bayern munich', 'bayern munchen': 'bayern munich', 'borussia dortmund': 'dortmund', 'bvb': 'dortmund',
+    'leipzig': 'rb leipzig', 'bayer leverkusen': 'leverkusen', 'eintracht frankfurt': 'eint frankfurt',
+    'frankfurt': 'eint frankfurt', 'borussia monchengladbach': 'gladbach', 'mainz': 'mainz 05',
+    'werder': 'werder bremen', 'bremen': 'werder bremen', 'hamburgo': 'hamburger sv', 'hsv': 'hamburger sv', 'colonia': 'köln', 'koln': 'köln', 'st pauli': 'st. pauli'
+}
 
 # ==========================================
 # 1. CARGA DE ARTEFACTOS
 # ==========================================
-print("⚙️ Cargando cerebro de Braniac...")
+logger = obtener_logger("braniac.tools")
 
 MODEL_FILE = "braniac_model.json"
 FEATURES_FILE = "model_features.json"
 REFS_FILE = "braniac_references.json"
 PLAYERS_FILE = "base_datos_jugadores.csv"
+CACHE_DIR = ".braniac_cache"
+# Paquete binario (mmap) con modelo, matriz de features, nombres y referencias
+PAQUETE_FILE = os.path.join(CACHE_DIR, "artefactos.brn")
+# Segundos entre sondeos de los ficheros para recargar en caliente (0 = desactivado)
+RECARGA_S = float(os.getenv("BRANIAC_RECARGA_S", "5"))
 
-try:
-    model = xgb.Booster()
-    model.load_model(MODEL_FILE)
+class Recursos:
+    """
+    Foto de los artefactos cargados; no se modifica una vez construida.
+    """
 
-    with open(FEATURES_FILE, "r") as f:
-        feature_columns = json.load(f)
+    def __init__(self, paquete, version, huellas):
+        # version: etiqueta de los datos (clave de las cachés); huellas: {fichero: huella} para el vigilante
+        self.version = version
+        self.huellas = huellas
+        self.origen = paquete.origen
+        self.model = paquete.model
+        self.feature_columns = paquete.feature_columns
+        self.refs = paquete.refs
+        self.nombres_busqueda = paquete.nombres_busqueda
+        self.club_dict = {k.lower().strip(): v for k, v in paquete.refs["club_finance"].items()}
+        self.socio_dict = paquete.refs["socio_data"]
+        self.almacen = paquete.almacen
+        # Tablas derivadas ya guardadas en el paquete binario (vistas mmap): no se reconstruyen
+        tablas = paquete.tablas or {}
+        if "indice" in tablas and len(tablas["indice"][1]["nombres"]) == len(self.almacen):
+            self.indice_jugadores = IndiceJugadores.desde_tablas(*tablas["indice"], self.almacen.born.tolist(), normalizador=normalizar_texto)
+        else:
+            self.indice_jugadores = IndiceJugadores(paquete.nombres_busqueda, self.almacen.born.tolist(), normalizador=normalizar_texto)
+        self.lista_clubes = list(self.club_dict.keys())
+        self.col_idx = {c: j for j, c in enumerate(self.feature_columns)}
+        self.derivadas = MotorDerivadas(self.feature_columns, ratio_salarial=RECALCULAR_RATIO_SALARIAL)
+        # Nombre canónico de liga = el de su columna Comp_ (Bundesliga es la referencia sin columna)
+        nombres_comp = {c[len("Comp_"):].lower(): c[len("Comp_"):] for c in self.feature_columns if c.startswith("Comp_")}
+        self.nombres_liga = {k: nombres_comp.get(k.lower(), k.title()) for k in self.socio_dict}
+        self.resolver = ResolverEntidades(self.lista_clubes, self.nombres_liga, ALIAS_CLUBES, MAPA_PAISES, normalizador=normalizar_texto)
+        self.liga_fila = self._ligas_por_fila()
+        try:
+            if "comparables" in tablas and tablas["comparables"][1]["columnas"] == [c for c in FEATURES_COMPARABLES if c in self.almacen.col]:
+                self.comparables = MotorComparables.desde_tablas(self.almacen, self.liga_fila, *tablas["comparables"])
+            else:
+                self.comparables = MotorComparables(self.almacen, self.liga_fila)
+        except Exception as e:
+            logger.warning("⚠️ Motor de comparables desactivado: %s", e)
+            self.comparables = None
+        if "percentiles" in tablas and tablas["percentiles"][1]["metricas"] == [m for m in METRICAS_PERCENTIL if m in self.almacen.col]:
+            self.percentiles = TablaPercentiles.desde_tablas(*tablas["percentiles"])
+        else:
+            self.percentiles = TablaPercentiles(self.almacen, self.liga_fila)
+        self.tabla_valoraciones = None
+        self.explicador = Explicador(self.model, self.feature_columns)
+        # Contribuciones SHAP de la situación actual (n_jugadores x features+1) o None
+        self.contribuciones = None
+        # Líneas del CSV ya cargadas (para recargar sólo las filas que cambien)
+        self.cabecera_csv, self.huellas_csv = None, None
+        # Con el paquete no se parsea el CSV: df_players se lee bajo demanda
+        self._df = paquete.df
+        self._lock_df = threading.Lock()
 
-    with open(REFS_FILE, "r") as f:
-        refs = json.load(f)
-        CLUB_DICT = {k.lower().strip(): v for k, v in refs["club_finance"].items()}
-        SOCIO_DICT = refs["socio_data"]
+    def tablas(self):
+        """Tablas derivadas de esta foto para guardarlas en el paquete binario."""
+        tablas = {"indice": self.indice_jugadores.tablas(), "percentiles": self.percentiles.tablas()}
+        if self.comparables is not None:
+            tablas["comparables"] = self.comparables.tablas()
+        return tablas
 
-    df_players = pd.read_csv(PLAYERS_FILE)
-    if 'Squad' in df_players.columns and 'Club' not in df_players.columns:
-        df_players['Club'] = df_players['Squad']
-    df_players['Player_Search'] = df_players['Player'].apply(normalizar_texto)
-    
-    LISTA_CLUBES = list(CLUB_DICT.keys())
-    print("✅ Braniac cargado y listo.")
+    def _ligas_por_fila(self):
+        """Nombre de liga de cada jugador a partir de los one-hot Comp_ (todo 0 = liga de referencia)."""
+        sin_columna = [n for n in self.nombres_liga.values() if f"Comp_{n}" not in self.col_idx]
+        ligas = np.full(len(self.almacen), sin_columna[0] if sin_columna else "Desconocida", dtype=object)
+        for nombre in self.nombres_liga.values():
+            j = self.col_idx.get(f"Comp_{nombre}")
+            if j is not None: ligas[self.almacen.X[:, j] == 1] = nombre
+        return ligas
 
-except Exception as e:
-    print(f"❌ Error crítico en tools.py: {e}")
-    model = None; df_players = pd.DataFrame(); CLUB_DICT = {}; SOCIO_DICT = {}; feature_columns = []; LISTA_CLUBES = []
+    @property
+    def df_players(self):
+        """DataFrame del CSV (sólo benchmarks y filas para predecir_salario)."""
+        with self._lock_df:
+            if self._df is None:
+                try:
+                    self._df = leer_jugadores_csv(PLAYERS_FILE, normalizar_texto)
+                except Exception as e:
+                    logger.warning("⚠️ No se pudo leer %s: %s", PLAYERS_FILE, e)
+                    self._df = pd.DataFrame()
+            return self._df
+
+ARTEFACTOS = (MODEL_FILE, FEATURES_FILE, REFS_FILE, PLAYERS_FILE)
+
+def _huellas_ficheros():
+    return {ruta: huella_archivos([ruta]) for ruta in ARTEFACTOS}
+
+def _leer_lineas(r):
+    """Guarda las huellas por línea del CSV si sigue siendo el que se cargó."""
+    try:
+        cabecera, filas = lineas_csv(PLAYERS_FILE)
+    except OSError:
+        return
+    if huella_archivos([PLAYERS_FILE]) == r.huellas[PLAYERS_FILE] and len(filas) == len(r.almacen):
+        r.cabecera_csv, r.huellas_csv = cabecera, huellas_lineas(filas)
+
+def _cargar_recursos():
+    logger.info("⚙️ Cargando cerebro de Braniac...")
+    # Huellas antes de leer: si algo cambia durante la carga, el vigilante lo verá
+    huellas, version = _huellas_ficheros(), version_datos()
+    paquete = cargar_artefactos(PAQUETE_FILE, MODEL_FILE, FEATURES_FILE, REFS_FILE, PLAYERS_FILE,
+                                normalizador=normalizar_texto, escribir=False)
+    logger.info("📦 Artefactos cargados desde %s", paquete.origen)
+    r = Recursos(paquete, version, huellas)
+    if paquete.origen != "paquete":
+        # El paquete se escribe ya con las tablas derivadas: el próximo arranque sólo las mapea
+        paquete.tablas = r.tablas()
+        try:
+            escribir_paquete(PAQUETE_FILE, paquete, version)
+        except OSError as e:
+            logger.warning("⚠️ No se pudo escribir %s: %s", PAQUETE_FILE, e)
+    if RECARGA_S > 0: _leer_lineas(r)
+    if PRECALCULAR_VALORACIONES:
+        try:
+            r.tabla_valoraciones = _cargar_tabla_valoraciones(r)
+        except Exception as e:
+            logger.warning("⚠️ Tabla de valoraciones desactivada: %s", e)
+    if PRECALCULAR_EXPLICACIONES: r.contribuciones = _cargar_contribuciones(r)
+    logger.info("✅ Braniac cargado y listo.")
+    return r
+
+def _recargar_incremental(anterior, cambiadas, huellas, version):
+    """
+    Nueva foto reutilizando lo que no ha cambiado: el booster siempre, y del
+    CSV sólo se parsean y valoran las filas nuevas o modificadas. None si
+    hace falta una carga completa (modelo, features o cabecera del CSV).
+    """
+    if MODEL_FILE in cambiadas or FEATURES_FILE in cambiadas:
+        return None
+    refs = anterior.refs
+    if REFS_FILE in cambiadas:
+        with open(REFS_FILE, "r") as f:
+            refs = json.load(f)
+    almacen, nombres, origen, cabecera, huellas_csv = anterior.almacen, anterior.nombres_busqueda, None, None, None
+    if PLAYERS_FILE in cambiadas:
+        if anterior.huellas_csv is None:
+            return None
+        diferencia = diferencia_csv(PLAYERS_FILE, anterior.cabecera_csv, anterior.huellas_csv)
+        if diferencia is None:
+            return None
+        cabecera, huellas_csv, origen, nuevas = diferencia
+        df = leer_jugadores_csv(io.BytesIO(b"\n".join([cabecera, *nuevas])), normalizar_texto)
+        almacen = AlmacenJugadores.fusionar(anterior.almacen, origen, AlmacenJugadores.desde_dataframe(df, anterior.feature_columns))
+        viejos = np.asarray(anterior.nombres_busqueda, dtype=object)
+        nombres = np.empty(len(origen), dtype=object)
+        nombres[origen >= 0] = viejos[origen[origen >= 0]]
+        nombres[origen < 0] = df['Player_Search'].to_numpy(dtype=object)
+        nombres = nombres.tolist()
+        logger.info("🔄 CSV: %s filas nuevas o modificadas de %s", len(nuevas), len(origen))
+
+    paquete = Paquete(anterior.model, anterior.feature_columns, refs, almacen, nombres, "recarga")
+    r = Recursos(paquete, version, huellas)
+    r.cabecera_csv, r.huellas_csv = (cabecera, huellas_csv) if origen is not None else (anterior.cabecera_csv, anterior.huellas_csv)
+
+    # Tabla de valoraciones: se recalcula entera si cambian las ligas, sólo las filas nuevas si cambia el CSV
+    tabla = anterior.tabla_valoraciones
+    if tabla is not None and PRECALCULAR_VALORACIONES:
+        huella = huella_artefactos()
+        if r.socio_dict != anterior.socio_dict:
+            tabla = precalcular_valoraciones(r, huella)
+        elif origen is not None:
+            parcial = precalcular_valoraciones(r, huella, filas=np.flatnonzero(origen < 0))
+            tabla = TablaValoraciones.fusionar(tabla, origen, parcial, huella)
+        else:
+            tabla = TablaValoraciones(tabla.ligas, huella, **tabla.campos)
+        try:
+            tabla.guardar(os.path.join(CACHE_DIR, "valoraciones.npz"))
+        except OSError as e:
+            logger.warning("⚠️ No se pudo guardar la tabla de valoraciones: %s", e)
+    r.tabla_valoraciones = tabla
+
+    # Contribuciones: el modelo no ha cambiado, sólo faltan las de las filas nuevas
+    contribuciones = anterior.contribuciones
+    if contribuciones is not None and PRECALCULAR_EXPLICACIONES:
+        if origen is not None:
+            nuevas = np.flatnonzero(origen < 0)
+            parcial = r.explicador.contribuciones(almacen.X[nuevas]) if len(nuevas) else contribuciones[:0]
+            contribuciones = fusionar_filas(contribuciones, origen, parcial)
+        r.contribuciones = contribuciones
+        _guardar_contribuciones(contribuciones, huella_artefactos())
+
+    # El paquete binario queda al día para el próximo arranque
+    paquete.tablas = r.tablas()
+    try:
+        escribir_paquete(PAQUETE_FILE, paquete, version)
+    except OSError as e:
+        logger.warning("⚠️ No se pudo reescribir %s: %s", PAQUETE_FILE, e)
+    return r
+
+def recargar(cambiadas=ARTEFACTOS):
+    """
+    Construye la foto nueva aparte y la publica de golpe en RECURSOS.
+
+    Las peticiones en curso terminan con la foto anterior; las cachés que
+    dependen de los datos se invalidan por su etiqueta de versión.
+    """
+    anterior = RECURSOS.disponible()
+    with span("recarga_artefactos", ficheros=len(cambiadas)):
+        huellas, version = _huellas_ficheros(), version_datos()
+        r = _recargar_incremental(anterior, set(cambiadas), huellas, version) if anterior is not None else None
+        if r is None:
+            r = _cargar_recursos()
+    RECURSOS.reemplazar(r)
+    logger.info("♻️ Datos recargados (%s): versión %s", ", ".join(cambiadas), r.version)
+    return r
+
+# Una sola carga por proceso, compartida por todas las sesiones y hilos
+RECURSOS = GestorRecursos(_cargar_recursos, nombre="artefactos")
+
+def _recursos():
+    """Foto actual de los artefactos (la primera llamada los carga) o None si no se pudieron cargar."""
+    try:
+        return RECURSOS.obtener()
+    except ErrorRecursos:
+        return None
+
+VIGILANTE = None
+_LOCK_VIGILANTE = threading.Lock()
+
+def vigilar_cambios(intervalo_s=RECARGA_S):
+    """Arranca (una vez) el hilo que recarga en caliente al cambiar los ficheros."""
+    global VIGILANTE
+    with _LOCK_VIGILANTE:
+        if VIGILANTE is None and intervalo_s > 0:
+            referencia = lambda: getattr(RECURSOS.disponible(), "huellas", None)
+            VIGILANTE = VigilanteArchivos(ARTEFACTOS, referencia, recargar, intervalo_s, nombre="recarga").iniciar()
+    return VIGILANTE
+
+def precalentar():
+    """Carga artefactos y tabla de valoraciones en segundo plano y vigila sus cambios."""
+    vigilar_cambios()
+    return RECURSOS.precalentar()
+
+def salud():
+    estado = RECURSOS.salud()
+    r = RECURSOS.disponible()
+    if r is not None:
+        estado.update(origen=r.origen, jugadores=len(r.almacen), version_datos=r.version)
+    return estado
+
+# Nombres de módulo de antes de la carga perezosa -> atributo de Recursos (y valor si falla la carga)
+_ATRIBUTOS_RECURSOS = {
+    "model": ("model", None), "feature_columns": ("feature_columns", []),
+    "CLUB_DICT": ("club_dict", {}), "SOCIO_DICT": ("socio_dict", {}), "ALMACEN": ("almacen", None),
+    "INDICE_JUGADORES": ("indice_jugadores", None), "LISTA_CLUBES": ("lista_clubes", []),
+    "NOMBRES_LIGA": ("nombres_liga", {}), "RESOLVER": ("resolver", None),
+    "TABLA_VALORACIONES": ("tabla_valoraciones", None), "df_players": ("df_players", None),
+}
+
+def __getattr__(nombre):
+    """tools.ALMACEN, tools.model, tools.df_players... leen la foto actual (y la cargan si hace falta)."""
+    if nombre in _ATRIBUTOS_RECURSOS:
+        atributo, por_defecto = _ATRIBUTOS_RECURSOS[nombre]
+        r = _recursos()
+        if r is None:
+            return pd.DataFrame() if nombre == "df_players" else por_defecto
+        return getattr(r, atributo)
+    raise AttributeError(f"module 'tools' has no attribute '{nombre}'")
+
+def version_datos():
+    return huella_archivos([MODEL_FILE, FEATURES_FILE, REFS_FILE, PLAYERS_FILE])
+
+def version_recursos():
+    """Etiqueta de versión de la foto publicada (None si aún no hay)."""
+    return getattr(RECURSOS.disponible(), "version", None)
+
+# Cachés compartidas por todas las sesiones del proceso; se vacían solas
+# cuando se publica una foto nueva de los artefactos (carga o recarga).
+CACHE_PREDICCIONES = CacheLRU(max_items=4096, ttl_segundos=3600, version=version_recursos, nombre="predicciones")
+CACHE_LOOKUP = CacheLRU(max_items=1024, ttl_segundos=3600, version=version_recursos, nombre="lookup")
+
+def estadisticas_cache():
+    stats = {c.nombre: c.estadisticas() for c in (CACHE_PREDICCIONES, CACHE_LOOKUP, CACHE_EXPLICACIONES)}
+    if CACHE_REPORTES is not None: stats["reportes"] = CACHE_REPORTES.estadisticas()
+    return stats
+
+METRICAS.registrar_fuente_cache(estadisticas_cache)
 
 # ==========================================
 # 2. MOTOR DE PREDICCIÓN
 # ==========================================
 
-def predecir_salario(jugador_row, target_club=None, target_league=None):
-    if model is None: return {"error": "Modelo no cargado."}
+# Factor de ajuste para alinear con valores esperados
+# Ratio calculado: 1,460,654 / 1,374,566 ≈ 1.0626
+FACTOR_AJUSTE = 1.0626
+# Banda de confianza del neto (log-RMSE del modelo)
+RMSE_LOG = 0.0569
+Z_BANDA = 1.645
+# Recalcular las features derivadas (Club_Purchasing_Power, Viability_Score...)
+# cuando una simulación cambia masa, impuestos o COV
+RECALCULAR_DERIVADAS = True
+# Wage_Club_Ratio (salario actual / masa) se deja en su valor observado: con la
+# masa del destino filtra el objetivo al modelo. Sólo para experimentar hasta reentrenar.
+RECALCULAR_RATIO_SALARIAL = False
+
+def _resolver_club_objetivo(r, target_club):
+    """Devuelve (masa salarial, nombre a mostrar) del club destino o None."""
+    club = r.resolver.resolver_club(target_club)
+    if club:
+        return r.club_dict[club[0]], club[0].title()
+    return None
+
+def _resolver_liga_objetivo(r, target_league):
+    """Devuelve (nombre de liga, datos socioeconómicos o None)."""
+    liga = r.resolver.resolver_liga(target_league)
+    if liga:
+        return r.nombres_liga[liga[0]], r.socio_dict[liga[0]]
+    return target_league, None
+
+
+def _predecir_log(X, model):
+    """
+    log-salario para una matriz float32 en el orden de feature_columns.
+
+    Usa inplace_predict sobre el array (sin construir DMatrix ni validar
+    nombres): mismo resultado que model.predict y ~3x menos latencia por
+    fila suelta. `model` es el booster de la foto con la que se construyó X.
+    """
+    return model.inplace_predict(np.ascontiguousarray(X, dtype=np.float32), validate_features=False).astype(np.float64)
+
+def predecir_salario(jugador_row, target_club=None, target_league=None, r=None):
+    # Firma pública de siempre; `r` opcional para reutilizar la foto del llamador
+    if r is None: r = _recursos()
+    if r is None: return {"error": "Modelo no cargado."}
+    feature_columns = r.feature_columns
 
     # Vector Base
     try:
@@ -81,53 +409,30 @@ def predecir_salario(jugador_row, target_club=None, target_league=None):
     
     club_actual = jugador_row.get('Club', 'Desconocido')
     contexto_msg = f"Situación Actual en {club_actual}"
+    salario = r.derivadas.salario(X_input.to_numpy(dtype=np.float32))
+    cambiadas = set()
     
     masa_usada = jugador_row.get('Masa_Salarial_X', 0)
     tax_rate = jugador_row.get('Tax_Rate', 0.45)
     cov_factor = jugador_row.get('COV_Factor', 1.0)
     
-    # DEBUG: Valores iniciales del jugador
-    print(f"[DEBUG predecir_salario] Valores iniciales del jugador:")
-    print(f"  - masa_usada (raw): {jugador_row.get('Masa_Salarial_X', 'N/A')}")
-    print(f"  - tax_rate (raw): {jugador_row.get('Tax_Rate', 'N/A')}")
-    print(f"  - cov_factor (raw): {jugador_row.get('COV_Factor', 'N/A')}")
-    print(f"  - masa_usada (usado): {masa_usada} (tipo: {type(masa_usada)})")
-    print(f"  - tax_rate (usado): {tax_rate} (tipo: {type(tax_rate)})")
-    print(f"  - cov_factor (usado): {cov_factor} (tipo: {type(cov_factor)})")
+    logger.debug("predecir_salario inicial: masa=%s tax_rate=%s cov_factor=%s", masa_usada, tax_rate, cov_factor)
 
     # A. Modificación Club
     if target_club:
-        club_encontrado = encontrar_coincidencia_difusa(target_club, LISTA_CLUBES)
-        if club_encontrado:
-            nueva_masa = CLUB_DICT[club_encontrado]
+        club_resuelto = _resolver_club_objetivo(r, target_club)
+        if club_resuelto:
+            nueva_masa, nombre_club = club_resuelto
             X_input['Masa_Salarial_X'] = nueva_masa
             masa_usada = nueva_masa
-            contexto_msg = f"Simulación: Fichaje por {club_encontrado.title()}"
+            cambiadas.add('Masa_Salarial_X')
+            contexto_msg = f"Simulación: Fichaje por {nombre_club}"
         else:
-            # Fallback directo
-            club_key = target_club.lower().strip()
-            nueva_masa = CLUB_DICT.get(club_key)
-            if nueva_masa:
-                X_input['Masa_Salarial_X'] = nueva_masa
-                masa_usada = nueva_masa
-                contexto_msg = f"Simulación: Fichaje por {target_club}"
-            else:
-                contexto_msg += f" (Club '{target_club}' no hallado, usando masa actual)"
+            contexto_msg += f" (Club '{target_club}' no hallado, usando masa actual)"
 
     # B. Modificación Liga para evitar errores de entrada
     if target_league:
-        mapa_paises = {
-            'españa': 'La Liga', 'spain': 'La Liga', 'es': 'La Liga',
-            'inglaterra': 'Premier League', 'uk': 'Premier League',
-            'italia': 'Serie A', 'italy': 'Serie A',
-            'alemania': 'Bundesliga', 'germany': 'Bundesliga',
-            'francia': 'Ligue 1', 'france': 'Ligue 1'
-        }
-        league_key = target_league.lower().strip()
-        nombre_liga = mapa_paises.get(league_key, target_league)
-        
-        socio_lower = {k.lower(): v for k, v in SOCIO_DICT.items()}
-        datos_socio = socio_lower.get(nombre_liga.lower())
+        nombre_liga, datos_socio = _resolver_liga_objetivo(r, target_league)
         
         if datos_socio:
             tax_rate = datos_socio['Tax_Rate']
@@ -135,6 +440,7 @@ def predecir_salario(jugador_row, target_club=None, target_league=None):
             
             if 'Tax_Rate' in X_input.columns: X_input['Tax_Rate'] = tax_rate
             if 'COV_Factor' in X_input.columns: X_input['COV_Factor'] = cov_factor
+            cambiadas.update(('Tax_Rate', 'COV_Factor'))
             
             col_liga_nueva = f"Comp_{nombre_liga}"
             for col in X_input.columns:
@@ -146,52 +452,20 @@ def predecir_salario(jugador_row, target_club=None, target_league=None):
         else:
             return {"error": f"No tengo datos fiscales para '{target_league}'."}
 
+    X = X_input.to_numpy(dtype=np.float32)
+    if RECALCULAR_DERIVADAS: r.derivadas.recalcular(X, cambiadas, salario=salario)
+
     # Predicción
     try:
-        dmatrix = xgb.DMatrix(X_input, feature_names=feature_columns)
-        log_pred = model.predict(dmatrix)[0]
-        salario_bruto = np.exp(log_pred)
+        log_pred = _predecir_log(X, r.model)[0]
     except Exception as e:
         return {"error": f"Error matemático: {e}"}
     
-    # Factor de ajuste para alinear con valores esperados
-    # Ratio calculado: 1,460,654 / 1,374,566 ≈ 1.0626
-    FACTOR_AJUSTE = 1.0626
-    
-    # Banda Neto
-    rmse_log = 0.0569; z = 1.645
-    
-    # DEBUG: Valores antes del cálculo
-    print(f"[DEBUG predecir_salario] log_pred: {log_pred}")
-    print(f"[DEBUG predecir_salario] salario_bruto (sin ajuste): {salario_bruto}")
-    print(f"[DEBUG predecir_salario] tax_rate: {tax_rate} (tipo: {type(tax_rate)})")
-    print(f"[DEBUG predecir_salario] cov_factor: {cov_factor} (tipo: {type(cov_factor)})")
-    print(f"[DEBUG predecir_salario] (1 - tax_rate): {(1 - tax_rate)}")
-    print(f"[DEBUG predecir_salario] (1 - tax_rate) * cov_factor: {(1 - tax_rate) * cov_factor}")
-    
-    # Aplicar factor de ajuste al bruto
-    salario_bruto = salario_bruto * FACTOR_AJUSTE
-    print(f"[DEBUG predecir_salario] salario_bruto (con ajuste): {salario_bruto}")
-    
-    neto_central = salario_bruto * (1 - tax_rate) * cov_factor
-    
-    exp_min = np.exp(log_pred - (rmse_log * z)) * FACTOR_AJUSTE
-    exp_max = np.exp(log_pred + (rmse_log * z)) * FACTOR_AJUSTE
-    
-    print(f"[DEBUG predecir_salario] exp(log_pred - rmse*z) * ajuste: {exp_min}")
-    print(f"[DEBUG predecir_salario] exp(log_pred + rmse*z) * ajuste: {exp_max}")
-    
-    neto_min = exp_min * (1 - tax_rate) * cov_factor
-    neto_max = exp_max * (1 - tax_rate) * cov_factor
-    
-    print(f"[DEBUG predecir_salario] neto_min (antes corrección): {neto_min}")
-    print(f"[DEBUG predecir_salario] neto_max: {neto_max}")
-    print(f"[DEBUG predecir_salario] neto_central: {neto_central}")
-    
-    if neto_min < 0: 
-        print(f"[DEBUG predecir_salario] ⚠️ neto_min era negativo ({neto_min}), corrigiendo...")
-        neto_min = neto_central * 0.85
-        print(f"[DEBUG predecir_salario] neto_min (después corrección): {neto_min}")
+    salario_bruto, neto_min, neto_central, neto_max = _bandas_neto(log_pred, tax_rate, cov_factor)
+    logger.debug(
+        "predecir_salario: log_pred=%s bruto=%s neto=[%s, %s, %s] tax_rate=%s cov_factor=%s",
+        log_pred, salario_bruto, neto_min, neto_central, neto_max, tax_rate, cov_factor
+    )
     
     return {
         "contexto": str(contexto_msg),
@@ -204,6 +478,551 @@ def predecir_salario(jugador_row, target_club=None, target_league=None):
         "cov_factor": float(cov_factor)
     }
 
+def _es_id_fila(jugador):
+    return isinstance(jugador, (int, np.integer)) and not isinstance(jugador, bool)
+
+def _bandas_neto(log_pred, tax_rate, cov_factor):
+    """Bruto ajustado y banda neta (min, central, max) vectorizados."""
+    salario_bruto = np.exp(log_pred) * FACTOR_AJUSTE
+    factor_neto = (1 - tax_rate) * cov_factor
+    neto_central = salario_bruto * factor_neto
+    neto_min = np.exp(log_pred - RMSE_LOG * Z_BANDA) * FACTOR_AJUSTE * factor_neto
+    neto_max = np.exp(log_pred + RMSE_LOG * Z_BANDA) * FACTOR_AJUSTE * factor_neto
+    neto_min = np.where(neto_min < 0, neto_central * 0.85, neto_min)
+    return salario_bruto, neto_min, neto_central, neto_max
+
+def _preparar_lote(r, solicitudes):
+    """
+    Resuelve las solicitudes (jugador, target_club, target_league) y
+    construye su matriz float32 de features con los overrides aplicados.
+
+    Devuelve (resultados, validos, contextos, masa_usada, tax_rate,
+    cov_factor, X): `resultados` trae ya los {"error": ...} y `X` tiene
+    una fila por cada índice de `validos` (None si no hay ninguno).
+    """
+    ALMACEN, feature_columns, _COL_IDX = r.almacen, r.feature_columns, r.col_idx
+
+    n = len(solicitudes)
+    resultados = [None] * n
+    validos, filas, contextos = [], [], []
+    masa_usada, tax_rate, cov_factor = [], [], []
+    nueva_masa, liga_col = [], []
+    clubes_vistos, ligas_vistas = {}, {}
+
+    for i, (jugador_row, target_club, target_league) in enumerate(solicitudes):
+        if _es_id_fila(jugador_row):
+            if not 0 <= jugador_row < len(ALMACEN):
+                resultados[i] = {"error": f"Jugador con id {jugador_row} no existe."}
+                continue
+            contexto_msg = f"Situación Actual en {ALMACEN.club[jugador_row]}"
+            masa = ALMACEN.masa[jugador_row]
+            tax = ALMACEN.tax_rate[jugador_row]
+            cov = ALMACEN.cov_factor[jugador_row]
+        else:
+            faltan = set(feature_columns) - set(jugador_row.index)
+            if faltan:
+                resultados[i] = {"error": f"Faltan columnas: {list(faltan)}"}
+                continue
+            contexto_msg = f"Situación Actual en {jugador_row.get('Club', 'Desconocido')}"
+            masa = jugador_row.get('Masa_Salarial_X', 0)
+            tax = jugador_row.get('Tax_Rate', 0.45)
+            cov = jugador_row.get('COV_Factor', 1.0)
+        masa_club = np.nan
+        col_liga = None
+
+        if target_club:
+            if target_club not in clubes_vistos:
+                clubes_vistos[target_club] = _resolver_club_objetivo(r, target_club)
+            club_resuelto = clubes_vistos[target_club]
+            if club_resuelto:
+                masa_club, nombre_club = club_resuelto
+                masa = masa_club
+                contexto_msg = f"Simulación: Fichaje por {nombre_club}"
+            else:
+                contexto_msg += f" (Club '{target_club}' no hallado, usando masa actual)"
+
+        if target_league:
+            if target_league not in ligas_vistas:
+                ligas_vistas[target_league] = _resolver_liga_objetivo(r, target_league)
+            nombre_liga, datos_socio = ligas_vistas[target_league]
+            if not datos_socio:
+                resultados[i] = {"error": f"No tengo datos fiscales para '{target_league}'."}
+                continue
+            tax = datos_socio['Tax_Rate']
+            cov = datos_socio['COV_Factor']
+            # -1 = liga de referencia sin columna Comp_ (todas a 0)
+            col_liga = _COL_IDX.get(f"Comp_{nombre_liga}", -1)
+            if "Simulación" not in contexto_msg: contexto_msg = f"Simulación: Cambio a {nombre_liga}"
+            else: contexto_msg += f" ({nombre_liga})"
+
+        validos.append(i); filas.append(jugador_row); contextos.append(contexto_msg)
+        masa_usada.append(masa); tax_rate.append(tax); cov_factor.append(cov)
+        nueva_masa.append(masa_club); liga_col.append(col_liga)
+
+    if not validos: return resultados, validos, contextos, masa_usada, tax_rate, cov_factor, None
+
+    with span("construccion_features", filas=len(filas)):
+        # Matriz única de features: ids directos del almacén, filas pandas convertidas en bloque
+        X = np.empty((len(filas), len(feature_columns)), dtype=np.float32)
+        pos_ids = [k for k, f in enumerate(filas) if _es_id_fila(f)]
+        if pos_ids:
+            X[pos_ids] = ALMACEN.X[[filas[k] for k in pos_ids]]
+        if len(pos_ids) < len(filas):
+            pos_series = [k for k, f in enumerate(filas) if not _es_id_fila(f)]
+            X[pos_series] = (pd.DataFrame([filas[k] for k in pos_series], columns=feature_columns)
+                             .apply(pd.to_numeric, errors='coerce')
+                             .to_numpy(dtype=np.float32))
+        tax_rate = np.asarray(tax_rate, dtype=np.float64)
+        cov_factor = np.asarray(cov_factor, dtype=np.float64)
+        nueva_masa = np.asarray(nueva_masa, dtype=np.float64)
+
+        # Overrides de club y liga por asignación vectorizada
+        con_club = ~np.isnan(nueva_masa)
+        salario = r.derivadas.salario(X) if RECALCULAR_DERIVADAS and con_club.any() else None
+        X[con_club, _COL_IDX['Masa_Salarial_X']] = nueva_masa[con_club]
+
+        con_liga = np.array([c is not None for c in liga_col])
+        if con_liga.any():
+            if 'Tax_Rate' in _COL_IDX: X[con_liga, _COL_IDX['Tax_Rate']] = tax_rate[con_liga]
+            if 'COV_Factor' in _COL_IDX: X[con_liga, _COL_IDX['COV_Factor']] = cov_factor[con_liga]
+            cols_comp = [j for c, j in _COL_IDX.items() if c.startswith("Comp_")]
+            X[np.ix_(con_liga, cols_comp)] = 0
+            filas_liga = np.array([k for k, c in enumerate(liga_col) if c is not None and c >= 0], dtype=int)
+            if len(filas_liga):
+                X[filas_liga, [liga_col[k] for k in filas_liga]] = 1
+
+        # Derivadas coherentes con la masa / impuestos / COV simulados
+        if RECALCULAR_DERIVADAS:
+            if con_club.any(): r.derivadas.recalcular(X, ('Masa_Salarial_X',), filas=con_club, salario=salario)
+            if con_liga.any(): r.derivadas.recalcular(X, ('Tax_Rate', 'COV_Factor'), filas=con_liga)
+    return resultados, validos, contextos, masa_usada, tax_rate, cov_factor, X
+
+def predecir_salarios_lote(r, solicitudes):
+    """
+    Versión vectorizada de predecir_salario para listas de jugadores.
+
+    Recibe la foto `r` y tuplas (jugador, target_club, target_league),
+    donde jugador es un id de fila de r.almacen o una fila de pandas,
+    construye una única matriz float32 con feature_columns y hace un solo
+    model.predict. Devuelve una lista alineada con la entrada: el mismo
+    dict que predecir_salario o {"error": ...} para cada elemento que falle.
+    """
+    if r is None: return [{"error": "Modelo no cargado."} for _ in solicitudes]
+    resultados, validos, contextos, masa_usada, tax_rate, cov_factor, X = _preparar_lote(r, solicitudes)
+    if not validos: return resultados
+
+    try:
+        with span("prediccion_booster", filas=len(X)):
+            log_pred = _predecir_log(X, r.model)
+    except Exception as e:
+        for i in validos: resultados[i] = {"error": f"Error matemático: {e}"}
+        return resultados
+
+    salario_bruto, neto_min, neto_central, neto_max = _bandas_neto(log_pred, tax_rate, cov_factor)
+
+    for k, i in enumerate(validos):
+        resultados[i] = {
+            "contexto": str(contextos[k]),
+            "masa_salarial": float(masa_usada[k]),
+            "bruto_predicho": float(salario_bruto[k]),
+            "neto_min": float(neto_min[k]),
+            "neto_central": float(neto_central[k]),
+            "neto_max": float(neto_max[k]),
+            "tax_rate": float(tax_rate[k]),
+            "cov_factor": float(cov_factor[k])
+        }
+    return resultados
+
+def _predecir_coalescido(solicitudes):
+    """
+    Función de lote del COALESCEDOR: solicitudes (foto, jugador, club, liga).
+
+    Cada una se predice con la foto con la que se resolvió su id; si una
+    recarga cae en medio del lote, hay un predict por foto.
+    """
+    resultados = [None] * len(solicitudes)
+    por_foto = {}
+    for i, (r, *_) in enumerate(solicitudes):
+        por_foto.setdefault(id(r), (r, []))[1].append(i)
+    for r, indices in por_foto.values():
+        for i, res in zip(indices, predecir_salarios_lote(r, [tuple(solicitudes[i][1:]) for i in indices])):
+            resultados[i] = res
+    return resultados
+
+# Predicciones individuales concurrentes (sesiones, API) se agrupan en un solo predict
+VENTANA_LOTE_MS = 3
+MAX_ITEMS_LOTE = 256
+COALESCEDOR = CoalescedorPredicciones(_predecir_coalescido, ventana_ms=VENTANA_LOTE_MS, max_items=MAX_ITEMS_LOTE)
+
+# Tabla precalculada (situación actual + cada liga) para todos los jugadores
+PRECALCULAR_VALORACIONES = True
+
+def huella_artefactos():
+    huella = huella_contenido([MODEL_FILE, FEATURES_FILE, REFS_FILE, PLAYERS_FILE])
+    # Las fórmulas de derivadas también determinan la tabla
+    if not RECALCULAR_DERIVADAS:
+        return huella
+    return f"{huella}-d{VERSION_DERIVADAS}{'s' if RECALCULAR_RATIO_SALARIAL else ''}"
+
+def precalcular_valoraciones(r, huella=None, filas=None):
+    """
+    Valora a todos los jugadores en su club actual y en cada liga de
+    SOCIO_DICT con una sola predicción (n_jugadores x (1 + n_ligas) filas).
+
+    Reproduce los overrides de predecir_salarios_lote para target_league
+    sin target_club, así que sus resultados son idénticos. Con `filas`
+    (ids del ALMACEN) sólo valora esas, en ese orden.
+    """
+    ALMACEN, SOCIO_DICT, _COL_IDX = r.almacen, r.socio_dict, r.col_idx
+    if filas is None: filas = slice(None)
+    base_X, base_masa = ALMACEN.X[filas], ALMACEN.masa[filas]
+    ligas = list(SOCIO_DICT.keys())
+    n, n_esc = len(base_X), 1 + len(ligas)
+    with span("precalculo_valoraciones", filas=n * n_esc):
+        X = np.repeat(base_X[None, :, :], n_esc, axis=0)
+        masa = np.repeat(base_masa[None, :], n_esc, axis=0)
+        tax_rate = np.empty((n_esc, n), dtype=np.float64)
+        cov_factor = np.empty((n_esc, n), dtype=np.float64)
+        tax_rate[0], cov_factor[0] = ALMACEN.tax_rate[filas], ALMACEN.cov_factor[filas]
+        cols_comp = [j for c, j in _COL_IDX.items() if c.startswith("Comp_")]
+        for k, liga in enumerate(ligas, start=1):
+            tax_rate[k] = SOCIO_DICT[liga]['Tax_Rate']
+            cov_factor[k] = SOCIO_DICT[liga]['COV_Factor']
+            if 'Tax_Rate' in _COL_IDX: X[k, :, _COL_IDX['Tax_Rate']] = tax_rate[k]
+            if 'COV_Factor' in _COL_IDX: X[k, :, _COL_IDX['COV_Factor']] = cov_factor[k]
+            X[k][:, cols_comp] = 0
+            col_liga = _COL_IDX.get(f"Comp_{r.nombres_liga[liga]}")
+            if col_liga is not None: X[k, :, col_liga] = 1
+            if RECALCULAR_DERIVADAS: r.derivadas.recalcular(X[k], ('Tax_Rate', 'COV_Factor'))
+
+        # Sin filas (p.ej. recarga que sólo borra jugadores) no hay nada que predecir
+        log_pred = _predecir_log(X.reshape(n * n_esc, -1), r.model).reshape(n_esc, n) if n else np.empty((n_esc, 0))
+        salario_bruto, neto_min, neto_central, neto_max = _bandas_neto(log_pred, tax_rate, cov_factor)
+
+    # Almacenado jugador x escenario para leer una fila contigua por jugador
+    return TablaValoraciones(
+        ligas, huella or huella_artefactos(),
+        masa_salarial=masa.T, bruto_predicho=salario_bruto.T, neto_min=neto_min.T,
+        neto_central=neto_central.T, neto_max=neto_max.T, tax_rate=tax_rate.T, cov_factor=cov_factor.T,
+    )
+
+def _cargar_tabla_valoraciones(r):
+    """Tabla de disco si corresponde al contenido actual de los artefactos; si no, se recalcula."""
+    ruta = os.path.join(CACHE_DIR, "valoraciones.npz")
+    huella = huella_artefactos()
+    tabla = TablaValoraciones.cargar(ruta, huella)
+    if tabla is None:
+        tabla = precalcular_valoraciones(r, huella)
+        try:
+            tabla.guardar(ruta)
+        except OSError as e:
+            logger.warning("⚠️ No se pudo guardar la tabla de valoraciones: %s", e)
+        logger.info("📊 Tabla de valoraciones recalculada (%s jugadores x %s escenarios)", len(tabla), 1 + len(tabla.ligas))
+    return tabla
+
+def _valoracion_precalculada(r, fila, clave_club, clave_liga, version):
+    """Resultado O(1) desde la tabla de valoraciones para 'actual' o 'cambio de liga'; si no aplica, None."""
+    # Versión (stat) con la que se cargó la foto: si los artefactos cambian en caliente, no se usa
+    tabla = r.tabla_valoraciones
+    if tabla is None or clave_club is not None or version != r.version:
+        return None
+    columna = tabla.columna(clave_liga)
+    if columna is None or not 0 <= fila < len(tabla):
+        return None
+    contexto = (f"Situación Actual en {r.almacen.club[fila]}" if clave_liga is None
+                else f"Simulación: Cambio a {r.nombres_liga[clave_liga]}")
+    return {"contexto": contexto, **tabla.valores(fila, columna)}
+
+def _clave_entidad(resolucion, texto):
+    """Clave de caché: entidad resuelta, o el texto crudo si no se resolvió."""
+    if not texto: return None
+    return resolucion[0] if resolucion else ('?', texto)
+
+def predecir_salario_id(r, fila, target_club=None, target_league=None):
+    """
+    predecir_salario indexando r.almacen por id de fila (sin pandas).
+
+    `fila` tiene que venir de la misma foto `r` (p.ej. de _buscar_jugador(r, ...)).
+    Situación actual y cambio de liga salen de TABLA_VALORACIONES. El
+    resto pasa por CACHE_PREDICCIONES con clave (jugador, club resuelto,
+    liga resuelta, versión de datos); los fallos se resuelven en el
+    COALESCEDOR, que deduplica claves idénticas en vuelo.
+    """
+    if r is None: return {"error": "Modelo no cargado."}
+    with span("resolucion_entidades"):
+        clave = (
+            int(fila),
+            _clave_entidad(target_club and r.resolver.resolver_club(target_club), target_club),
+            _clave_entidad(target_league and r.resolver.resolver_liga(target_league), target_league),
+            r.version,
+        )
+    precalculada = _valoracion_precalculada(r, *clave)
+    if precalculada is not None: return precalculada
+    res = CACHE_PREDICCIONES.get(clave)
+    if res is None:
+        with span("prediccion_coalescida"):
+            res = COALESCEDOR.predecir(clave, (r, fila, target_club, target_league))
+        if "error" not in res: CACHE_PREDICCIONES.set(clave, res)
+    return dict(res)
+
+def _vector_jugador(r, jugador_row):
+    """Vector float32 de features de un id del ALMACEN o una fila de pandas, o {"error": ...}."""
+    if _es_id_fila(jugador_row):
+        if not 0 <= jugador_row < len(r.almacen): return {"error": f"Jugador con id {jugador_row} no existe."}
+        return r.almacen.X[jugador_row]
+    faltan = set(r.feature_columns) - set(jugador_row.index)
+    if faltan: return {"error": f"Faltan columnas: {list(faltan)}"}
+    return pd.to_numeric(jugador_row[r.feature_columns], errors='coerce').to_numpy(dtype=np.float32)
+
+def simular_escenarios(r, jugador_row):
+    """
+    Valora a un jugador en todos los clubes de CLUB_DICT x ligas de SOCIO_DICT.
+
+    Acepta un id de fila del ALMACEN o una fila de pandas. El vector base se
+    construye una vez y se replica por escenario; se hace una sola
+    predicción. Devuelve una lista ordenada por neto_central descendente
+    con club, liga, masa y banda neta (en millones).
+    """
+    if r is None: return {"error": "Modelo no cargado."}
+    ALMACEN, CLUB_DICT, SOCIO_DICT, _COL_IDX = r.almacen, r.club_dict, r.socio_dict, r.col_idx
+    if not CLUB_DICT or not SOCIO_DICT: return {"error": "Datos de clubes o ligas no disponibles."}
+    base = _vector_jugador(r, jugador_row)
+    if isinstance(base, dict): return base
+    clubes = list(CLUB_DICT.keys())
+    ligas = list(SOCIO_DICT.keys())
+    n_clubes, n_ligas = len(clubes), len(ligas)
+
+    with span("construccion_features", filas=n_clubes * n_ligas):
+        # Fila k = club k // n_ligas en liga k % n_ligas
+        X = np.tile(base, (n_clubes * n_ligas, 1))
+        masas = np.repeat(np.array([CLUB_DICT[c] for c in clubes], dtype=np.float64), n_ligas)
+        tax_rate = np.tile(np.array([SOCIO_DICT[l]['Tax_Rate'] for l in ligas], dtype=np.float64), n_clubes)
+        cov_factor = np.tile(np.array([SOCIO_DICT[l]['COV_Factor'] for l in ligas], dtype=np.float64), n_clubes)
+
+        salario = np.repeat(r.derivadas.salario(base[None, :]), len(X)) if RECALCULAR_DERIVADAS else None
+        X[:, _COL_IDX['Masa_Salarial_X']] = masas
+        if 'Tax_Rate' in _COL_IDX: X[:, _COL_IDX['Tax_Rate']] = tax_rate
+        if 'COV_Factor' in _COL_IDX: X[:, _COL_IDX['COV_Factor']] = cov_factor
+        cols_comp = {c[len("Comp_"):].lower(): j for c, j in _COL_IDX.items() if c.startswith("Comp_")}
+        X[:, list(cols_comp.values())] = 0
+        for li, liga in enumerate(ligas):
+            if liga in cols_comp: X[li::n_ligas, cols_comp[liga]] = 1
+        if RECALCULAR_DERIVADAS:
+            r.derivadas.recalcular(X, ('Masa_Salarial_X', 'Tax_Rate', 'COV_Factor'), salario=salario)
+
+    try:
+        with span("prediccion_booster", filas=len(X)):
+            log_pred = _predecir_log(X, r.model)
+    except Exception as e:
+        return {"error": f"Error matemático: {e}"}
+
+    salario_bruto, neto_min, neto_central, neto_max = _bandas_neto(log_pred, tax_rate, cov_factor)
+
+    orden = np.argsort(-neto_central, kind='stable')
+    return [
+        {
+            "club": clubes[k // n_ligas].title(),
+            "liga": r.nombres_liga[ligas[k % n_ligas]],
+            "masa_salarial": float(masas[k]),
+            "bruto_predicho": float(salario_bruto[k]),
+            "neto_min": float(neto_min[k]),
+            "neto_central": float(neto_central[k]),
+            "neto_max": float(neto_max[k])
+        }
+        for k in orden
+    ]
+
+# Curvas de sensibilidad: puntos por curva si la rejilla es un rango y
+# tope de puntos por llamada (todas las curvas van en un solo predict)
+PUNTOS_SENSIBILIDAD = 200
+MAX_PUNTOS_SENSIBILIDAD = 5000
+PARAMETROS_SENSIBILIDAD = ('Masa_Salarial_X', 'Tax_Rate', 'COV_Factor')
+
+def _rangos_sensibilidad(r):
+    """Rango por defecto de cada parámetro: masas de los clubes y ligas de referencia (con margen)."""
+    masas = np.fromiter(r.club_dict.values(), dtype=np.float64)
+    tax = np.array([d['Tax_Rate'] for d in r.socio_dict.values()])
+    cov = np.array([d['COV_Factor'] for d in r.socio_dict.values()])
+    return {
+        'Masa_Salarial_X': (masas.min(), masas.max()),
+        'Tax_Rate': (max(0.0, tax.min() - 0.05), min(0.95, tax.max() + 0.05)),
+        'COV_Factor': (max(0.05, cov.min() - 0.05), cov.max() + 0.05),
+    }
+
+def _puntos_rejilla(spec, puntos):
+    """Nº de valores de una curva sin construirla (se valida antes de reservar memoria)."""
+    if spec is None or isinstance(spec, dict):
+        n = int((spec or {}).get('puntos', puntos))
+        if n < 1: raise ValueError(f"puntos debe ser >= 1 (recibido {n})")
+        return n
+    return int(np.size(spec))
+
+def _rejilla(spec, rango, puntos):
+    """Valores de una curva: lista explícita, dict {min, max, puntos} o None (rango por defecto; con 1 punto, sólo min)."""
+    if spec is None or isinstance(spec, dict):
+        spec = spec or {}
+        return np.linspace(float(spec.get('min', rango[0])), float(spec.get('max', rango[1])), int(spec.get('puntos', puntos)))
+    return np.asarray(spec, dtype=np.float64).ravel()
+
+def curvas_sensibilidad(r, jugador_row, rejillas=None, puntos=PUNTOS_SENSIBILIDAD):
+    """
+    Bruto y banda neta del jugador al variar Masa_Salarial_X, Tax_Rate y
+    COV_Factor, uno cada vez y el resto en sus valores actuales.
+
+    `rejillas` ({parámetro: valores | {min, max, puntos} | None}) elige qué
+    curvas y con qué valores; sin ella se barren los tres en su rango por
+    defecto. Todas las curvas se apilan en una matriz y se predicen con una
+    sola llamada al booster; las derivadas se recalculan como en
+    predecir_salarios_lote (Wage_Club_Ratio en su valor observado;
+    impuestos y COV sin tocar la liga del jugador).
+    """
+    if r is None: return {"error": "Modelo no cargado."}
+    _COL_IDX = r.col_idx
+    base = _vector_jugador(r, jugador_row)
+    if isinstance(base, dict): return base
+
+    if rejillas is None: rejillas = dict.fromkeys(PARAMETROS_SENSIBILIDAD)
+    desconocidos = set(rejillas) - set(PARAMETROS_SENSIBILIDAD)
+    if desconocidos: return {"error": f"Parámetros no soportados: {sorted(desconocidos)}"}
+    rangos = _rangos_sensibilidad(r)
+    try:
+        # El tope se comprueba antes de construir nada: puntos=10**9 no debe llegar a np.linspace
+        total = sum(_puntos_rejilla(rejillas[p], puntos) for p in PARAMETROS_SENSIBILIDAD if p in rejillas)
+        if total > MAX_PUNTOS_SENSIBILIDAD: return {"error": f"Demasiados puntos ({total} > {MAX_PUNTOS_SENSIBILIDAD})."}
+        valores = {p: _rejilla(rejillas[p], rangos[p], puntos) for p in PARAMETROS_SENSIBILIDAD if p in rejillas}
+    except (TypeError, ValueError, OverflowError) as e:
+        return {"error": f"Rejilla inválida: {e}"}
+    if not total: return {"error": "Rejillas vacías."}
+    for p, v in valores.items():
+        if not np.isfinite(v).all() or (v < 0).any() or (p == 'Tax_Rate' and (v >= 1).any()) or (p == 'COV_Factor' and (v <= 0).any()):
+            return {"error": f"Valores fuera de rango para {p}."}
+
+    # Valores actuales como en predecir_salarios_lote (mismo neto en el punto actual)
+    if _es_id_fila(jugador_row):
+        ALMACEN = r.almacen
+        masa_actual, tax_actual, cov_actual = ALMACEN.masa[jugador_row], ALMACEN.tax_rate[jugador_row], ALMACEN.cov_factor[jugador_row]
+    else:
+        masa_actual = jugador_row.get('Masa_Salarial_X', 0)
+        tax_actual, cov_actual = jugador_row.get('Tax_Rate', 0.45), jugador_row.get('COV_Factor', 1.0)
+    masa_actual, tax_actual, cov_actual = float(masa_actual), float(tax_actual), float(cov_actual)
+
+    with span("construccion_features", filas=total):
+        # Bloques contiguos, uno por curva, en el orden de `valores`
+        X = np.tile(base, (total, 1))
+        tax_rate = np.full(total, tax_actual)
+        cov_factor = np.full(total, cov_actual)
+        salario = np.repeat(r.derivadas.salario(base[None, :]), total) if RECALCULAR_DERIVADAS else None
+        tramos, inicio = {}, 0
+        for p, v in valores.items():
+            tramo = slice(inicio, inicio + len(v))
+            tramos[p], inicio = tramo, tramo.stop
+            if p in _COL_IDX: X[tramo, _COL_IDX[p]] = v
+            if p == 'Tax_Rate': tax_rate[tramo] = v
+            if p == 'COV_Factor': cov_factor[tramo] = v
+            if RECALCULAR_DERIVADAS: r.derivadas.recalcular(X, (p,), filas=tramo, salario=salario)
+
+    try:
+        with span("prediccion_booster", filas=total):
+            log_pred = _predecir_log(X, r.model)
+    except Exception as e:
+        return {"error": f"Error matemático: {e}"}
+
+    salario_bruto, neto_min, neto_central, neto_max = _bandas_neto(log_pred, tax_rate, cov_factor)
+    return {
+        "actual": {"masa_salarial": masa_actual, "tax_rate": tax_actual, "cov_factor": cov_actual},
+        "curvas": {
+            p: {
+                "valores": valores[p].tolist(),
+                "bruto_predicho": salario_bruto[t].tolist(),
+                "neto_min": neto_min[t].tolist(),
+                "neto_central": neto_central[t].tolist(),
+                "neto_max": neto_max[t].tolist(),
+            }
+            for p, t in tramos.items()
+        },
+    }
+
+# Explicación de valoraciones (contribuciones SHAP del booster): la
+# situación actual de toda la tabla se precalcula fuera de línea
+# (python artefactos.py) y se lee de disco al arrancar; sin ella, y para
+# los escenarios, se calculan por lote bajo demanda y se cachean por su
+# vector de features
+PRECALCULAR_EXPLICACIONES = True
+EXPLICAR_VALORACIONES = True
+TOP_FACTORES = 5
+CONTRIBUCIONES_FILE = os.path.join(CACHE_DIR, "contribuciones.npz")
+CACHE_EXPLICACIONES = CacheLRU(max_items=4096, ttl_segundos=3600, version=version_recursos, nombre="explicaciones")
+
+def _cargar_contribuciones(r, huella=None):
+    """Contribuciones de disco si corresponden a estos artefactos; si no, None (no se calculan al arrancar)."""
+    contribuciones = cargar_contribuciones(CONTRIBUCIONES_FILE, huella or huella_artefactos())
+    if contribuciones is None or len(contribuciones) != len(r.almacen):
+        return None
+    logger.info("🧮 Contribuciones precalculadas cargadas (%s jugadores)", len(contribuciones))
+    return contribuciones
+
+def precalcular_contribuciones(r, huella=None):
+    """Contribuciones de todos los jugadores (una sola llamada al booster) o las de disco si la huella coincide."""
+    huella = huella or huella_artefactos()
+    contribuciones = _cargar_contribuciones(r, huella)
+    if contribuciones is None:
+        with span("precalculo_contribuciones", filas=len(r.almacen)):
+            contribuciones = r.explicador.contribuciones(r.almacen.X)
+        _guardar_contribuciones(contribuciones, huella)
+        logger.info("🧮 Contribuciones recalculadas (%s jugadores)", len(contribuciones))
+    r.contribuciones = contribuciones
+    return contribuciones
+
+def _guardar_contribuciones(contribuciones, huella):
+    try:
+        guardar_contribuciones(CONTRIBUCIONES_FILE, contribuciones, huella)
+    except OSError as e:
+        logger.warning("⚠️ No se pudieron guardar las contribuciones: %s", e)
+
+def explicar_salarios_lote(r, solicitudes, top=TOP_FACTORES):
+    """
+    Principales factores de cada valoración de predecir_salarios_lote.
+
+    Misma entrada y mismos overrides (se comparte _preparar_lote). Un id
+    en su situación actual se lee de la tabla precalculada si la hay; el resto se
+    busca en CACHE_EXPLICACIONES por el vector de features y los que
+    faltan se calculan juntos en una sola llamada a pred_contribs.
+    """
+    if r is None: return [{"error": "Modelo no cargado."} for _ in solicitudes]
+    resultados, validos, contextos, _, _, _, X = _preparar_lote(r, solicitudes)
+    if not validos: return resultados
+
+    tabla = r.contribuciones
+    contribuciones = [None] * len(validos)
+    pendientes = {}
+    for k, i in enumerate(validos):
+        jugador, target_club, target_league = solicitudes[i]
+        if tabla is not None and _es_id_fila(jugador) and not target_club and not target_league:
+            contribuciones[k] = tabla[jugador]
+            continue
+        clave = X[k].tobytes()
+        contribuciones[k] = CACHE_EXPLICACIONES.get(clave)
+        if contribuciones[k] is None: pendientes.setdefault(clave, []).append(k)
+
+    if pendientes:
+        try:
+            with span("contribuciones_booster", filas=len(pendientes)):
+                calculadas = r.explicador.contribuciones(X[[ks[0] for ks in pendientes.values()]])
+        except Exception as e:
+            for i in validos: resultados[i] = {"error": f"Error matemático: {e}"}
+            return resultados
+        for (clave, ks), contribucion in zip(pendientes.items(), calculadas):
+            CACHE_EXPLICACIONES.set(clave, contribucion)
+            for k in ks: contribuciones[k] = contribucion
+
+    for k, i in enumerate(validos):
+        resultados[i] = {"contexto": str(contextos[k]), **r.explicador.resumen(contribuciones[k], X[k], top)}
+    return resultados
+
+def explicar_valoracion(r, fila, target_club=None, target_league=None, top=TOP_FACTORES):
+    """explicar_salarios_lote para un solo jugador (id de fila de r.almacen)."""
+    return explicar_salarios_lote(r, [(fila, target_club, target_league)], top)[0]
+
 # ==========================================
 # 3. HERRAMIENTA DE ANÁLISIS
 # ==========================================
@@ -217,82 +1036,178 @@ class PlayerContractAnalysis(BaseModel):
     negotiation_strategy: str = Field(description="Estrategia sugerida")
     club_context: str = Field(description="Contexto del club")
 
-def analyze_player_tool(player_name: str, client_openai=None, target_club: str = None, target_league: str = None, birth_year: int = None) -> dict:
-    if df_players.empty: return {"error": "Base de datos no disponible."}
+def _buscar_jugador(r, player_name, birth_year=None):
+    """Id de fila en r.almacen del jugador mejor puntuado o un dict {"error": ...}."""
+    if r is None or not len(r.almacen): return {"error": "Base de datos no disponible."}
     
-    matches = df_players[df_players['Player_Search'].str.contains(normalizar_texto(player_name), na=False)]
-    if matches.empty: return {"error": f"Jugador '{player_name}' no encontrado."}
+    with span("resolucion_nombre"):
+        candidatos = r.indice_jugadores.buscar(player_name, birth_year, limite=1)
+    if not candidatos: return {"error": f"Jugador '{player_name}' no encontrado."}
     
-    if birth_year:
+    return candidatos[0][0]
+
+MODEL_REPORTE = "gpt-5-mini"
+
+try:
+    CACHE_REPORTES = CacheReportes(os.path.join(CACHE_DIR, "reportes.sqlite"))
+except Exception as e:
+    logger.warning("⚠️ Caché de reportes desactivada: %s", e)
+    CACHE_REPORTES = None
+
+_EJECUTOR_REPORTES = ThreadPoolExecutor(max_workers=4, thread_name_prefix="braniac-reporte")
+_REPORTES_PENDIENTES = {}
+_LOCK_PENDIENTES = threading.Lock()
+
+def _generar_reporte(client_openai, data_text, clave):
+    """Llamada al LLM para el reporte narrativo; guarda el resultado en la caché."""
+    with span("reporte_llm", modelo=MODEL_REPORTE):
+        response = client_openai.beta.chat.completions.parse(
+            model=MODEL_REPORTE,
+            messages=[
+                {"role": "system", "content": "Eres Braniac. Genera reporte."},
+                {"role": "user", "content": data_text}
+            ],
+            response_format=PlayerContractAnalysis,
+        )
+    METRICAS.registrar_uso(MODEL_REPORTE, response.usage)
+    reporte = response.choices[0].message.parsed.model_dump()
+    if CACHE_REPORTES is not None:
+        # Un fallo de la caché no invalida un reporte ya generado
         try:
-            anio_target = int(birth_year)
-            matches_anio = matches[matches['Born'].between(anio_target - 1, anio_target + 1)]
-            if not matches_anio.empty: matches = matches_anio
-        except: pass
-    
-    player_row = matches.iloc[0]
+            CACHE_REPORTES.set(clave, reporte)
+        except Exception as e:
+            logger.warning("⚠️ No se pudo guardar el reporte en caché: %s", e)
+    return reporte
+
+# Futuros ya terminados (resultado o fallo) para obtener_reporte; no bloquean reintentos
+_REPORTES_TERMINADOS = {}
+MAX_REPORTES_TERMINADOS = 256
+
+def _lanzar_reporte(client_openai, data_text, clave):
+    """Encola la generación del reporte (una sola vez por clave en vuelo)."""
+    with _LOCK_PENDIENTES:
+        if clave in _REPORTES_PENDIENTES: return
+        futuro = enviar_con_contexto(_EJECUTOR_REPORTES, _generar_reporte, client_openai, data_text, clave)
+        _REPORTES_PENDIENTES[clave] = futuro
+    def _fin(f):
+        # Sale siempre de los pendientes: si falló, la siguiente petición con la misma clave reintenta
+        with _LOCK_PENDIENTES:
+            if _REPORTES_PENDIENTES.get(clave) is f: del _REPORTES_PENDIENTES[clave]
+            _REPORTES_TERMINADOS.pop(clave, None)
+            if len(_REPORTES_TERMINADOS) >= MAX_REPORTES_TERMINADOS: del _REPORTES_TERMINADOS[next(iter(_REPORTES_TERMINADOS))]
+            _REPORTES_TERMINADOS[clave] = f
+    futuro.add_done_callback(_fin)
+
+def obtener_reporte(reporte_id: str, timeout: float = None) -> dict:
+    """Recupera un reporte lanzado con reporte_async=True."""
+    reporte = CACHE_REPORTES.get(reporte_id) if CACHE_REPORTES is not None else None
+    if reporte is not None: return reporte
+    with _LOCK_PENDIENTES:
+        futuro = _REPORTES_PENDIENTES.get(reporte_id) or _REPORTES_TERMINADOS.get(reporte_id)
+    if futuro is None: return {"error": f"Reporte '{reporte_id}' no encontrado."}
+    try:
+        return futuro.result(timeout=timeout)
+    except TimeoutError:
+        return {"reporte_estado": "pendiente", "reporte_id": reporte_id}
+    except Exception as e:
+        return {"error": f"Error IA: {e}"}
+
+# Métrica del almacén -> nombre con que se muestra su percentil
+ETIQUETAS_PERCENTIL = {'GCA_P90': 'GCA90', 'SCA_P90': 'SCA90', 'Def_P90': 'Def_P90', 'Attack_Efficiency_Ratio': 'Eficiencia'}
+
+def _percentiles(r, fila):
+    """Percentiles del jugador frente a su posición en su liga y en las cinco ligas."""
+    liga, posicion = r.liga_fila[fila], r.almacen.pos[fila]
+    etiquetar = lambda p: {ETIQUETAS_PERCENTIL.get(m, m): v for m, v in p.items()}
+    return {
+        "percentiles_en_liga": etiquetar(r.percentiles.percentiles(r.almacen, fila, liga, posicion)),
+        "grupo_liga": f"{posicion} de {liga} ({r.percentiles.tamano(liga, posicion)} jugadores)",
+        "percentiles_5_ligas": etiquetar(r.percentiles.percentiles(r.almacen, fila, None, posicion)),
+        "grupo_5_ligas": f"{posicion} de las 5 ligas ({r.percentiles.tamano(None, posicion)} jugadores)",
+    }
+
+def _texto_factores(explicacion):
+    """Factores principales en una línea para el prompt del reporte."""
+    return " | ".join(f"{f['feature']} {f['efecto_pct']:+.1f}%" for f in explicacion['factores_principales'])
+
+def _inyectar_datos(r, final_json, fila, res, explicacion=None):
+    """Inyección de datos para mostrarlos claros."""
+    ALMACEN = r.almacen
+    # NOTA: Los valores del modelo están en millones, multiplicamos por 1,000,000 para euros
+    final_json['GCA90'] = f"{ALMACEN.valor(fila, 'GCA_P90'):.2f}"
+    final_json['SCA90'] = f"{ALMACEN.valor(fila, 'SCA_P90'):.2f}"
+    final_json['Def_P90'] = f"{ALMACEN.valor(fila, 'Def_P90'):.2f}"
+    final_json['Eficiencia'] = f"{ALMACEN.valor(fila, 'Attack_Efficiency_Ratio'):.2f}"
+    final_json['bruto_predicho_real'] = f"€{res['bruto_predicho'] * 1_000_000:,.0f}"
+    final_json['neto_central_real'] = f"€{res['neto_central'] * 1_000_000:,.0f}"
+    final_json['recommended_salary_range'] = f"€{res['neto_min'] * 1_000_000:,.0f} - €{res['neto_max'] * 1_000_000:,.0f}"
+    final_json['masa_salarial_real'] = f"€{res['masa_salarial']:,.0f}"
+    final_json['tax_rate_real'] = f"{res['tax_rate']*100:.1f}"
+    final_json['cov_factor_real'] = f"{res['cov_factor']:.2f}"
+    final_json.update(_percentiles(r, fila))
+    if explicacion:
+        final_json['factores_clave'] = explicacion['factores_principales']
+        final_json['efecto_por_grupo_pct'] = explicacion['efecto_por_grupo_pct']
+    return final_json
+
+def analyze_player_tool(player_name: str, client_openai=None, target_club: str = None, target_league: str = None, birth_year: int = None, reporte_async: bool = False) -> dict:
+    """
+    Predicción + reporte narrativo del LLM (cacheado en disco por payload).
+
+    Con reporte_async=True, si el reporte no está en caché se devuelven ya
+    las cifras con reporte_estado="pendiente" y un reporte_id para
+    obtener_reporte().
+    """
+    # Una sola foto para toda la llamada: el id de fila sólo vale en la foto que lo resolvió
+    r = _recursos()
+    fila = _buscar_jugador(r, player_name, birth_year)
+    if isinstance(fila, dict): return fila
     
-    res = predecir_salario(player_row, target_club, target_league)
+    res = predecir_salario_id(r, fila, target_club, target_league)
     if "error" in res: return res
+    ALMACEN = r.almacen
+    # Factores de la valoración: lectura de tabla o caché salvo escenarios nuevos
+    explicacion = explicar_valoracion(r, fila, target_club, target_league) if EXPLICAR_VALORACIONES else None
+    if explicacion and "error" in explicacion: explicacion = None
     
-    # DEBUG: Verificar valores retornados por predecir_salario
-    print(f"[DEBUG analyze_player_tool] Valores de res:")
-    print(f"  - bruto_predicho: {res.get('bruto_predicho', 'N/A')}")
-    print(f"  - neto_min: {res.get('neto_min', 'N/A')}")
-    print(f"  - neto_max: {res.get('neto_max', 'N/A')}")
-    print(f"  - neto_central: {res.get('neto_central', 'N/A')}")
-    print(f"  - tax_rate: {res.get('tax_rate', 'N/A')}")
-    print(f"  - cov_factor: {res.get('cov_factor', 'N/A')}")
-    print(f"  - masa_salarial: {res.get('masa_salarial', 'N/A')}")
+    logger.debug(
+        "analyze_player_tool %s: bruto=%s neto=[%s, %s, %s] tax_rate=%s cov_factor=%s masa=%s",
+        ALMACEN.player[fila], res['bruto_predicho'], res['neto_min'], res['neto_central'], res['neto_max'],
+        res['tax_rate'], res['cov_factor'], res['masa_salarial']
+    )
     
     data_text = f"""
-    JUGADOR: {player_row['Player']}
+    JUGADOR: {ALMACEN.player[fila]}
     ESCENARIO: {res['contexto']}
     INPUTS: Masa €{res['masa_salarial']:,.0f} | Tax {res['tax_rate']*100:.1f}% | COV {res['cov_factor']:.2f}
     RESULTADOS: Bruto €{res['bruto_predicho'] * 1_000_000:,.0f} | Neto €{res['neto_min'] * 1_000_000:,.0f} - €{res['neto_max'] * 1_000_000:,.0f}
     """
+    if explicacion: data_text += f"FACTORES: {_texto_factores(explicacion)}\n"
+    
+    clave = CacheReportes.clave(data_text, MODEL_REPORTE)
+    reporte = CACHE_REPORTES.get(clave) if CACHE_REPORTES is not None else None
+    
+    # Modo asíncrono: devolvemos ya los números y el reporte se rellena en segundo plano
+    if reporte is None and reporte_async:
+        _lanzar_reporte(client_openai, data_text, clave)
+        pendiente = {
+            "player_name": ALMACEN.player[fila],
+            "analysis_type": res['contexto'],
+            "reporte_estado": "pendiente",
+            "reporte_id": clave
+        }
+        return _inyectar_datos(r, pendiente, fila, res, explicacion)
     
     try:
-        response = client_openai.beta.chat.completions.parse(
-            model="gpt-5-mini",
-            messages=[
-                {"role": "system", "content": "Eres Braniac. Genera reporte."},
-                {"role": "user", "content": data_text}
-            ],
-            response_format=PlayerContractAnalysis,
-        )
-        final_json = response.choices[0].message.parsed.model_dump()
+        if reporte is None:
+            reporte = _generar_reporte(client_openai, data_text, clave)
+        final_json = _inyectar_datos(r, dict(reporte), fila, res, explicacion)
         
-        # Inyección de datos para mostrarlos claros 
-        # NOTA: Los valores del modelo están en millones, multiplicamos por 1,000,000 para euros
-        final_json['GCA90'] = f"{player_row.get('GCA_P90', 0):.2f}"
-        final_json['SCA90'] = f"{player_row.get('SCA_P90', 0):.2f}"
-        final_json['Def_P90'] = f"{player_row.get('Def_P90', 0):.2f}"
-        final_json['Eficiencia'] = f"{player_row.get('Attack_Efficiency_Ratio', 0):.2f}"
-        final_json['bruto_predicho_real'] = f"€{res['bruto_predicho'] * 1_000_000:,.0f}"
-        final_json['neto_central_real'] = f"€{res['neto_central'] * 1_000_000:,.0f}"
-        final_json['recommended_salary_range'] = f"€{res['neto_min'] * 1_000_000:,.0f} - €{res['neto_max'] * 1_000_000:,.0f}"
-        final_json['masa_salarial_real'] = f"€{res['masa_salarial']:,.0f}"
-        final_json['tax_rate_real'] = f"{res['tax_rate']*100:.1f}"
-        final_json['cov_factor_real'] = f"{res['cov_factor']:.2f}"
-        
-        # DEBUG: Verificar valores formateados
-        print(f"[DEBUG analyze_player_tool] Valores formateados en final_json:")
-        print(f"  - bruto_predicho_real: {final_json.get('bruto_predicho_real', 'N/A')}")
-        print(f"  - neto_central_real: {final_json.get('neto_central_real', 'N/A')}")
-        print(f"  - recommended_salary_range: {final_json.get('recommended_salary_range', 'N/A')}")
-        
-        # DEBUG: Verificar valores en millones y en euros
-        print(f"[DEBUG analyze_player_tool] Valores en millones (modelo):")
-        print(f"  - bruto_predicho: {res['bruto_predicho']} millones")
-        print(f"  - neto_min: {res['neto_min']} millones")
-        print(f"  - neto_max: {res['neto_max']} millones")
-        print(f"  - neto_central: {res['neto_central']} millones")
-        print(f"[DEBUG analyze_player_tool] Valores en euros (multiplicados x 1M):")
-        print(f"  - bruto_predicho: €{res['bruto_predicho'] * 1_000_000:,.0f}")
-        print(f"  - neto_min: €{res['neto_min'] * 1_000_000:,.0f}")
-        print(f"  - neto_max: €{res['neto_max'] * 1_000_000:,.0f}")
-        print(f"  - neto_central: €{res['neto_central'] * 1_000_000:,.0f}")
+        logger.debug(
+            "analyze_player_tool %s: bruto_real=%s neto_central_real=%s rango=%s",
+            ALMACEN.player[fila], final_json['bruto_predicho_real'], final_json['neto_central_real'],
+            final_json['recommended_salary_range']
+        )
         
         return final_json
     except Exception as e:
@@ -302,58 +1217,175 @@ def analyze_player_tool(player_name: str, client_openai=None, target_club: str =
 # 4. HERRAMIENTA DE CONSULTA LOOKUP
 # ==========================================
 
-def lookup_database_tool(category: str, name: str) -> dict:
-    """Consulta rápida de datos estáticos."""
-    key = name.lower().strip()
-    
+def lookup_database_tool(category: str, name: str, league: str = None, position: str = None, top_k: int = 5) -> dict:
+    """Consulta rápida de datos estáticos (cacheada en CACHE_LOOKUP)."""
+    r = _recursos()
+    clave = (category, normalizar_texto(name).strip(), league, position, top_k, r.version if r is not None else None)
+    res = CACHE_LOOKUP.get(clave)
+    if res is None:
+        res = _lookup_database(r, category, name, league, position, top_k)
+        if "error" not in res: CACHE_LOOKUP.set(clave, res)
+    return dict(res)
+
+def _lookup_database(r, category, name, league=None, position=None, top_k=5):
+    if r is None: return {"error": "Base de datos no disponible."}
     if category == 'club':
         
-        club_match = encontrar_coincidencia_difusa(name, LISTA_CLUBES)
+        club_match = r.resolver.resolver_club(name)
         if club_match:
-            masa = CLUB_DICT[club_match]
-            return {"dato": f"Masa {club_match.title()}", "valor": f"€{masa:,.0f}"}
-            
-        
-        masa = CLUB_DICT.get(key)
-        if masa: return {"dato": f"Masa {name}", "valor": f"€{masa:,.0f}"}
+            masa = r.club_dict[club_match[0]]
+            return {"dato": f"Masa {club_match[0].title()}", "valor": f"€{masa:,.0f}"}
         
         return {"error": f"Club '{name}' no encontrado."}
             
     elif category in ['country', 'league']:
-        mapa = {'españa': 'La Liga', 'italia': 'Serie A', 'inglaterra': 'Premier League', 'alemania': 'Bundesliga', 'francia': 'Ligue 1'}
-        search = mapa.get(key, name)
-        socio_lower = {k.lower(): v for k, v in SOCIO_DICT.items()}
-        res = socio_lower.get(search.lower())
-        if res: return {"entidad": search, "tax_rate_real": f"{res['Tax_Rate']*100:.1f}", "cov_factor_real": f"{res['COV_Factor']:.2f}"}
+        liga_match = r.resolver.resolver_liga(name)
+        if liga_match:
+            res = r.socio_dict[liga_match[0]]
+            return {"entidad": r.nombres_liga[liga_match[0]], "tax_rate_real": f"{res['Tax_Rate']*100:.1f}", "cov_factor_real": f"{res['COV_Factor']:.2f}"}
         return {"error": f"Liga '{name}' no encontrada."}
 
     # CONSULTA DE RENDIMIENTO
     elif category == 'rendimiento':
-        nombre_busqueda = normalizar_texto(name)
-        matches = df_players[df_players['Player_Search'].str.contains(nombre_busqueda, na=False)]
+        fila = _buscar_jugador(r, name)
         
-        if matches.empty:
+        if isinstance(fila, dict):
             return {"error": f"No encontré métricas para '{name}'."}
-        
-        p = matches.iloc[0]
+        ALMACEN = r.almacen
         
         return {
-            "jugador": p['Player'],
-            "posicion": p.get('Pos', 'N/A'),
-            "edad": int(p.get('Age', 0)),
-            "equipo": p.get('Club', 'N/A'),
+            "jugador": ALMACEN.player[fila],
+            "posicion": ALMACEN.pos[fila],
+            "edad": int(ALMACEN.valor(fila, 'Age')),
+            "equipo": ALMACEN.club[fila],
             # --- MÉTRICAS CLAVE ---
-            "GCA90 (Goles Creados)": round(p.get('GCA_P90', 0), 2),
-            "SCA90 (Creación Tiro)": round(p.get('SCA_P90', 0), 2),
-            "Def_P90 (Acciones Defensivas)": round(p.get('Def_P90', 0), 2), 
-            "Eficiencia Ofensiva": round(p.get('Attack_Efficiency_Ratio', 0), 2),
-            "Wage/Club Ratio": round(p.get('Wage_Club_Ratio', 0), 4)
+            "GCA90 (Goles Creados)": round(ALMACEN.valor(fila, 'GCA_P90'), 2),
+            "SCA90 (Creación Tiro)": round(ALMACEN.valor(fila, 'SCA_P90'), 2),
+            "Def_P90 (Acciones Defensivas)": round(ALMACEN.valor(fila, 'Def_P90'), 2), 
+            "Eficiencia Ofensiva": round(ALMACEN.valor(fila, 'Attack_Efficiency_Ratio'), 2),
+            "Wage/Club Ratio": round(ALMACEN.valor(fila, 'Wage_Club_Ratio'), 4),
+            "liga": r.liga_fila[fila],
+            # --- CONTEXTO: PERCENTIL FRENTE A SU POSICIÓN ---
+            **_percentiles(r, fila)
         }
+
+    # JUGADORES COMPARABLES
+    elif category == 'comparables':
+        return _comparables(r, name, league, position, top_k)
     
     return {"error": "Categoría inválida."}
 
+# Posición pedida (es/en) -> etiqueta del almacén
+MAPA_POSICIONES = {
+    'fw': 'FW', 'delantero': 'FW', 'atacante': 'FW', 'forward': 'FW',
+    'mf': 'MF', 'centrocampista': 'MF', 'mediocampista': 'MF', 'medio': 'MF', 'midfielder': 'MF',
+    'df': 'DF', 'defensa': 'DF', 'defensor': 'DF', 'lateral': 'DF', 'central': 'DF', 'defender': 'DF',
+    'gk': 'GK', 'portero': 'GK', 'arquero': 'GK', 'goalkeeper': 'GK',
+}
+MAX_COMPARABLES = 20
+
+def _comparables(r, name, league=None, position=None, top_k=5):
+    """Top-k jugadores con métricas P90 más parecidas, con su salario predicho."""
+    if r.comparables is None: return {"error": "Motor de comparables no disponible."}
+    fila = _buscar_jugador(r, name)
+    if isinstance(fila, dict): return fila
+
+    liga = None
+    if league:
+        liga_match = r.resolver.resolver_liga(league)
+        if not liga_match: return {"error": f"Liga '{league}' no encontrada."}
+        liga = r.nombres_liga[liga_match[0]]
+    posicion = None
+    if position:
+        posicion = MAPA_POSICIONES.get(normalizar_texto(position).strip())
+        if posicion is None: return {"error": f"Posición '{position}' no reconocida (usa FW, MF, DF o GK)."}
+    top_k = min(max(1, int(top_k or 5)), MAX_COMPARABLES)
+
+    ALMACEN = r.almacen
+    # Otras filas del mismo jugador (cambió de club en la temporada) no cuentan como comparables
+    mismo = np.flatnonzero((ALMACEN.player == ALMACEN.player[fila]) & (ALMACEN.born == ALMACEN.born[fila]))
+    with span("comparables", k=top_k):
+        vecinos = r.comparables.similares(fila, top_k, liga, posicion, excluir=mismo)
+    if not vecinos: return {"error": "No hay jugadores comparables con esos filtros."}
+
+    salarios = predecir_salarios_lote(r, [(f, None, None) for f in [fila] + [v for v, _ in vecinos]])
+    real = lambda res, campo: f"€{res[campo] * 1_000_000:,.0f}" if "error" not in res else None
+    return {
+        "jugador": ALMACEN.player[fila],
+        "posicion": ALMACEN.pos[fila],
+        "liga": r.liga_fila[fila],
+        "equipo": ALMACEN.club[fila],
+        "neto_central_real": real(salarios[0], 'neto_central'),
+        "filtros": {"liga": liga or "todas", "posicion": posicion or "todas"},
+        "comparables": [
+            {
+                "jugador": ALMACEN.player[v],
+                "equipo": ALMACEN.club[v],
+                "liga": r.liga_fila[v],
+                "posicion": ALMACEN.pos[v],
+                "edad": int(ALMACEN.valor(v, 'Age')),
+                "similitud": round(1 / (1 + distancia), 3),
+                "GCA90": round(ALMACEN.valor(v, 'GCA_P90'), 2),
+                "SCA90": round(ALMACEN.valor(v, 'SCA_P90'), 2),
+                "Def_P90": round(ALMACEN.valor(v, 'Def_P90'), 2),
+                "bruto_predicho_real": real(res, 'bruto_predicho'),
+                "neto_central_real": real(res, 'neto_central'),
+            }
+            for (v, distancia), res in zip(vecinos, salarios[1:])
+        ]
+    }
+
+# ==========================================
+# 5. HERRAMIENTA DE ESCENARIOS (CLUB x LIGA)
+# ==========================================
+
+def scenario_grid_tool(player_name: str, birth_year: int = None, top_n: int = 10) -> dict:
+    """Ranking de destinos (club x liga) donde el jugador cobraría más neto."""
+    r = _recursos()
+    fila = _buscar_jugador(r, player_name, birth_year)
+    if isinstance(fila, dict): return fila
+    
+    escenarios = simular_escenarios(r, fila)
+    if isinstance(escenarios, dict): return escenarios
+    
+    top_n = max(1, int(top_n or 10))
+    ALMACEN = r.almacen
+    return {
+        "jugador": ALMACEN.player[fila],
+        "club_actual": ALMACEN.club[fila],
+        "escenarios_evaluados": len(escenarios),
+        "ranking": [
+            {
+                "posicion": i + 1,
+                "club": e['club'],
+                "liga": e['liga'],
+                "masa_salarial_real": f"€{e['masa_salarial']:,.0f}",
+                "neto_min_real": f"€{e['neto_min'] * 1_000_000:,.0f}",
+                "neto_central_real": f"€{e['neto_central'] * 1_000_000:,.0f}",
+                "neto_max_real": f"€{e['neto_max'] * 1_000_000:,.0f}"
+            }
+            for i, e in enumerate(escenarios[:top_n])
+        ]
+    }
+
 # ==========================================
-# 5. DEFINICIÓN JSON-TOOLS
+# 6. HERRAMIENTA DE SENSIBILIDAD (MASA, IMPUESTOS, COV)
+# ==========================================
+
+def sensitivity_curve_tool(player_name: str, birth_year: int = None, rejillas: dict = None, puntos: int = PUNTOS_SENSIBILIDAD) -> dict:
+    """Curvas bruto/neto del jugador al variar masa salarial, impuestos y COV (para gráficos)."""
+    r = _recursos()
+    fila = _buscar_jugador(r, player_name, birth_year)
+    if isinstance(fila, dict): return fila
+
+    curvas = curvas_sensibilidad(r, fila, rejillas, PUNTOS_SENSIBILIDAD if puntos is None else int(puntos))
+    if "error" in curvas: return curvas
+
+    ALMACEN = r.almacen
+    return {"jugador": ALMACEN.player[fila], "club_actual": ALMACEN.club[fila], **curvas}
+
+# ==========================================
+# 7. DEFINICIÓN JSON-TOOLS
 # ==========================================
 tools_definition = [
     {
@@ -377,19 +1409,58 @@ tools_definition = [
         "type": "function",
         "function": {
             "name": "lookup_database_tool",
-            "description": "Consulta datos sueltos (Masa, Impuestos, Rendimiento).",
+            "description": "Consulta datos sueltos (Masa, Impuestos, Rendimiento, Comparables).",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "category": {
                         "type": "string", 
-                        "enum": ["club", "country", "rendimiento"],
-                        "description": "Usa 'rendimiento' para buscar stats de jugador."
+                        "enum": ["club", "country", "rendimiento", "comparables"],
+                        "description": "Usa 'rendimiento' para buscar stats de jugador y 'comparables' para jugadores de perfil similar con su salario."
                     },
-                    "name": {"type": "string"}
+                    "name": {"type": "string"},
+                    "league": {"type": "string", "description": "Sólo 'comparables': filtra por liga."},
+                    "position": {"type": "string", "description": "Sólo 'comparables': FW, MF, DF o GK."},
+                    "top_k": {"type": "integer", "description": "Sólo 'comparables': cuántos devolver (por defecto 5)."}
                 },
                 "required": ["category", "name"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "scenario_grid_tool",
+            "description": "Ranking de salario neto del jugador en todos los clubes y ligas (¿dónde cobraría más?).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "player_name": {"type": "string"},
+                    "birth_year": {"type": "integer"},
+                    "top_n": {"type": "integer", "description": "Número de destinos a devolver (por defecto 10)."}
+                },
+                "required": ["player_name"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "sensitivity_curve_tool",
+            "description": "Cómo cambia el salario (bruto y neto) del jugador al variar la masa salarial del club, los impuestos o el costo de vida, uno cada vez (¿qué pasaría si...?).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "player_name": {"type": "string"},
+                    "birth_year": {"type": "integer"},
+                    "rejillas": {
+                        "type": "object",
+                        "description": "Opcional. Parámetros a variar (Masa_Salarial_X, Tax_Rate, COV_Factor), cada uno con una lista de valores o {min, max, puntos}. Sin él se varían los tres en su rango habitual."
+                    },
+                    "puntos": {"type": "integer", "description": "Valores por curva cuando no se dan explícitos (por defecto 10)."}
+                },
+                "required": ["player_name"]
+            }
+        }
     }
 ]
\ No newline at end of file
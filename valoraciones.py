@@ -0,0 +1,62 @@
+import os
+import numpy as np
+
+from recarga import fusionar_filas
+
+# ==========================================
+# TABLA PRECALCULADA JUGADOR x ESCENARIO
+# ==========================================
+
+CAMPOS = ("masa_salarial", "bruto_predicho", "neto_min", "neto_central", "neto_max", "tax_rate", "cov_factor")
+
+
+class TablaValoraciones:
+    """
+    Valoración de cada jugador en su situación actual y en cada liga.
+
+    Cada campo de CAMPOS es un array float64 (n_jugadores x escenarios):
+    la columna 0 es la situación actual y la 1 + k la liga `ligas[k]`
+    (claves de SOCIO_DICT). `huella` identifica el contenido de los
+    artefactos con que se calculó; si no coincide, la tabla no se usa.
+    """
+
+    def __init__(self, ligas, huella, **campos):
+        self.ligas = list(ligas)
+        self.huella = huella
+        self._columna = {None: 0, **{liga: 1 + k for k, liga in enumerate(self.ligas)}}
+        self.campos = {c: np.asarray(campos[c], dtype=np.float64) for c in CAMPOS}
+
+    def __len__(self):
+        return self.campos["neto_central"].shape[0]
+
+    def columna(self, clave_liga=None):
+        """Índice de columna para una clave de liga (None = actual) o None si no está."""
+        return self._columna.get(clave_liga)
+
+    def valores(self, fila, columna):
+        return {c: float(self.campos[c][fila, columna]) for c in CAMPOS}
+
+    @classmethod
+    def fusionar(cls, anterior, origen, nuevas, huella):
+        """Tabla con las filas de `anterior` según `origen` y las de `nuevas` en los -1."""
+        return cls(anterior.ligas, huella, **{
+            c: fusionar_filas(anterior.campos[c], origen, nuevas.campos[c]) for c in CAMPOS
+        })
+
+    def guardar(self, ruta):
+        """npz atómico: se escribe en un temporal y se renombra."""
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        temporal = f"{ruta}.tmp.npz"
+        np.savez(temporal, ligas=np.array(self.ligas), huella=np.array(self.huella), **self.campos)
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta, huella):
+        """Tabla guardada si existe y corresponde a `huella`; si no, None."""
+        try:
+            with np.load(ruta, allow_pickle=False) as datos:
+                if str(datos["huella"]) != huella:
+                    return None
+                return cls([str(l) for l in datos["ligas"]], huella, **{c: datos[c] for c in CAMPOS})
+        except (OSError, KeyError, ValueError):
+            return None